@@ -0,0 +1,68 @@
+# benchmarks/bench_batch_writes.py
+"""
+Micro-benchmark for DatabaseManager.execute_batch against a loop of
+execute_write calls, using the index_composition insert from the index engine.
+
+A loop of execute_write pays a pool checkout, a statement round trip and a
+commit round trip per row. execute_batch pays one checkout and one commit per
+call, plus one pipelined round trip per batch.
+
+    python benchmarks/bench_batch_writes.py --rows 5000 --batch-size 1000
+"""
+
+import math
+import time
+import random
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from shared.db import DatabaseManager
+
+BENCH_INDEX_TYPE = "BENCH"
+
+INSERT_COMPOSITION = """
+    INSERT INTO index_composition (date, ticker, close_price, weight, market_cap, index_type)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (date, ticker, index_type, update_time) DO NOTHING;
+"""
+
+
+def synthetic_rows(rows: int, date: str) -> list:
+    return [
+        (date, f"BENCH{i:05d}", random.uniform(1, 500), 1 / rows, random.uniform(1e8, 1e12), BENCH_INDEX_TYPE)
+        for i in range(rows)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5_000)
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    try:
+        start = time.perf_counter()
+        for params in synthetic_rows(args.rows, "1999-01-04"):
+            db.execute_write(INSERT_COMPOSITION, params)
+        loop_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = db.execute_batch(INSERT_COMPOSITION, synthetic_rows(args.rows, "1999-01-05"), batch_size=args.batch_size)
+        batch_seconds = time.perf_counter() - start
+    finally:
+        db.execute_write("DELETE FROM index_composition WHERE index_type = %s", (BENCH_INDEX_TYPE,))
+
+    loop_round_trips = 2 * args.rows
+    batch_round_trips = math.ceil(args.rows / args.batch_size) + 1
+    print(f"\n{'mode':<16}{'seconds':>10}{'rows/sec':>12}{'round trips':>14}")
+    print(f"{'execute_write':<16}{loop_seconds:>10.2f}{args.rows / loop_seconds:>12,.0f}{loop_round_trips:>14,}")
+    print(f"{'execute_batch':<16}{batch_seconds:>10.2f}{args.rows / batch_seconds:>12,.0f}{batch_round_trips:>14,}")
+    print(f"\n{result}")
+    print(f"Speedup: {loop_seconds / batch_seconds:.1f}x with {loop_round_trips / batch_round_trips:,.0f}x fewer round trips")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/bench_columnar_reads.py
+"""
+Compares DatabaseManager.execute_query (row tuples -> DataFrame) with
+DatabaseManager.fetch_columns (binary COPY -> NumPy columns) on a synthetic
+price panel of --tickers x --days rows loaded into stock_prices.
+
+Two shapes are read: a numeric-only panel (date, OHLCV), which takes the
+fixed-width fast path, and the same panel with the ticker column, which takes
+the general path and still has to build one str per row.
+
+    python benchmarks/bench_columnar_reads.py --tickers 2000 --days 250
+"""
+
+import sys
+import time
+import argparse
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from shared.db import DatabaseManager
+
+BENCH_START = "1999-01-04"
+
+SEED_PANEL = """
+    INSERT INTO stock_prices (ticker, timestamp, date, open, high, low, close, volume, transactions, is_otc, is_adjusted)
+    SELECT 'BENCH' || t, d::bigint * 86400000 + t, %s::date + d,
+           c * 0.99, c * 1.02, c * 0.98, c, 1e6 + t, 100, FALSE, TRUE
+    FROM generate_series(0, %s::int - 1) AS t,
+         generate_series(0, %s::int - 1) AS d,
+         LATERAL (SELECT 10 + ((t * 7919 + d * 104729) %% 49000) / 100.0 AS c) AS price
+    ON CONFLICT DO NOTHING
+"""
+
+NUMERIC_PANEL = """
+    SELECT date, open, high, low, close, volume FROM stock_prices
+    WHERE ticker LIKE 'BENCH%%' ORDER BY date
+"""
+TICKER_PANEL = """
+    SELECT ticker, date, close, volume FROM stock_prices
+    WHERE ticker LIKE 'BENCH%%' ORDER BY date
+"""
+
+
+def measure(read, query: str):
+    start = time.perf_counter()
+    read(query, ())
+    seconds = time.perf_counter() - start
+
+    # Separate run for memory: tracemalloc slows allocation-heavy code down
+    tracemalloc.start()
+    read(query, ())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", type=int, default=2_000)
+    parser.add_argument("--days", type=int, default=250)
+    args = parser.parse_args()
+    rows = args.tickers * args.days
+
+    db = DatabaseManager()
+    try:
+        db.execute_write(SEED_PANEL, (BENCH_START, args.tickers, args.days))
+        print(f"\n{'panel':<10}{'mode':<16}{'seconds':>10}{'rows/sec':>14}{'peak MB':>10}")
+        for label, query in (("numeric", NUMERIC_PANEL), ("ticker", TICKER_PANEL)):
+            results = {}
+            for name, read in (("execute_query", db.execute_query), ("fetch_columns", db.fetch_columns)):
+                seconds, peak = measure(read, query)
+                results[name] = (seconds, peak)
+                print(f"{label:<10}{name:<16}{seconds:>10.2f}{rows / seconds:>14,.0f}{peak / 1e6:>10.1f}")
+            (row_s, row_peak), (col_s, col_peak) = results["execute_query"], results["fetch_columns"]
+            print(f"{'':<10}{'':<16}{row_s / col_s:>9.1f}x{'':>14}{row_peak / col_peak:>9.1f}x")
+    finally:
+        db.execute_write("DELETE FROM stock_prices WHERE ticker LIKE 'BENCH%%'", ())
+
+
+if __name__ == "__main__":
+    main()
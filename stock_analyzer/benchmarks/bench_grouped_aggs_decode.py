@@ -0,0 +1,49 @@
+# benchmarks/bench_grouped_aggs_decode.py
+"""
+Compares peak memory and decode time of response.json()-style decoding of a
+grouped aggregates body against the streaming columnar decoder.
+
+    python benchmarks/bench_grouped_aggs_decode.py --rows 12000
+"""
+
+import io
+import json
+import time
+import argparse
+import tracemalloc
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from services.ingestion.grouped_aggs import GroupedAggregates
+from bench_stock_price_upsert import synthetic_grouped_payload
+
+
+def measure(decode, body: bytes):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = decode(body)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=12_000, help="Rows in the synthetic grouped payload")
+    args = parser.parse_args()
+
+    body = json.dumps(synthetic_grouped_payload(args.rows)).encode()
+    _, dict_time, dict_peak = measure(json.loads, body)
+    aggs, col_time, col_peak = measure(lambda b: GroupedAggregates.parse(io.BytesIO(b)), body)
+    assert len(aggs) == args.rows
+
+    print(f"\nBody: {len(body) / 1e6:.1f} MB, {args.rows:,} rows")
+    print(f"{'decoder':<12}{'seconds':>10}{'peak MB':>10}")
+    print(f"{'json.loads':<12}{dict_time:>10.3f}{dict_peak / 1e6:>10.1f}")
+    print(f"{'columnar':<12}{col_time:>10.3f}{col_peak / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_stock_price_upsert.py
+"""
+Compares rows/sec of the original per-row stock_prices upsert loop against the
+two paths in StockDataIngester.insert_stock_prices: executemany batches
+(bulk=False) and COPY into a staging table (bulk=True).
+
+Runs against the database configured through the usual POSTGRES_* variables and
+writes synthetic BENCH* tickers on a fixed date, which are deleted afterwards.
+
+    python benchmarks/bench_stock_price_upsert.py --rows 10000
+"""
+
+import io
+import json
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from services.ingestion.main import StockDataIngester
+from services.ingestion.dead_letter import DeadLetterQueue
+from services.ingestion.grouped_aggs import GroupedAggregates
+
+BENCH_DATE = "1999-01-04"
+BENCH_TIMESTAMP = 915426000000
+
+
+def synthetic_grouped_payload(rows: int) -> dict:
+    """Builds a payload shaped like Polygon's grouped daily aggregates response."""
+    results = []
+    for i in range(rows):
+        close = random.uniform(1, 500)
+        results.append({
+            "T": f"BENCH{i:05d}", "t": BENCH_TIMESTAMP, "o": close * 0.99, "h": close * 1.02,
+            "l": close * 0.97, "c": close, "v": float(random.randint(1_000, 5_000_000)),
+            "n": random.randint(10, 50_000), "vw": close * 1.001,
+        })
+    return {"adjusted": True, "resultsCount": rows, "results": results}
+
+
+PER_ROW_UPSERT = """
+    INSERT INTO stock_prices (ticker, timestamp, date, open, high, low, close, volume, transactions, volume_weighted_avg, is_otc, is_adjusted)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (ticker, timestamp, date) DO UPDATE SET close = EXCLUDED.close;
+"""
+
+
+def time_per_row(ingester: StockDataIngester, payload: GroupedAggregates) -> float:
+    """The pre-batching loop: one pooled connection, statement and commit per row."""
+    start = time.perf_counter()
+    for params in payload.iter_rows(BENCH_DATE):
+        ingester.db.execute_write(PER_ROW_UPSERT, params)
+    return time.perf_counter() - start
+
+
+def time_insert(ingester: StockDataIngester, payload: GroupedAggregates, bulk: bool) -> float:
+    start = time.perf_counter()
+    ingester.insert_stock_prices(BENCH_DATE, payload, bulk=bulk)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="Rows in the synthetic grouped payload")
+    args = parser.parse_args()
+
+    ingester = StockDataIngester()
+    # Keep any benchmark failures out of the real dead letter queue
+    ingester.dlq = DeadLetterQueue(Path(tempfile.gettempdir()) / "bench_dead_letter.jsonl")
+    body = json.dumps(synthetic_grouped_payload(args.rows)).encode()
+    payload = GroupedAggregates.parse(io.BytesIO(body))
+
+    try:
+        timings = {
+            "per-row": time_per_row(ingester, payload),
+            "batched": time_insert(ingester, payload, bulk=False),
+            "bulk COPY": time_insert(ingester, payload, bulk=True),
+        }
+    finally:
+        ingester.db.execute_write("DELETE FROM stock_prices WHERE date = %s AND ticker LIKE 'BENCH%%'", (BENCH_DATE,))
+
+    print(f"\n{'mode':<10}{'seconds':>10}{'rows/sec':>14}{'speedup':>10}")
+    for mode, seconds in timings.items():
+        print(f"{mode:<10}{seconds:>10.2f}{args.rows / seconds:>14,.0f}{timings['per-row'] / seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
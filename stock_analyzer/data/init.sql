@@ -1,4 +1,6 @@
 -- data/init.sql
+-- Bootstrap schema for a fresh database. Later changes live in data/migrations/ and are
+-- applied by `python shared/migrations.py upgrade` or by each service on startup.
 
 CREATE TABLE IF NOT EXISTS ticker_details (
     ticker VARCHAR PRIMARY KEY,
@@ -27,9 +29,13 @@ CREATE TABLE IF NOT EXISTS ticker_details (
     sic_description VARCHAR,
     ticker_root VARCHAR,
     ticker_suffix VARCHAR,
-    weighted_shares_outstanding DOUBLE PRECISION
+    weighted_shares_outstanding DOUBLE PRECISION,
+    last_refreshed TIMESTAMP
 );
 
+-- Existing volumes predate last_refreshed; keeps re-running this file idempotent
+ALTER TABLE ticker_details ADD COLUMN IF NOT EXISTS last_refreshed TIMESTAMP;
+
 CREATE TABLE IF NOT EXISTS stock_prices (
     ticker VARCHAR,
     timestamp BIGINT,
@@ -0,0 +1,87 @@
+-- data/migrations/0002_partition_stock_prices.sql
+-- Range-partitions stock_prices by calendar year on `date`.
+--
+-- Every hot query filters on date, so the planner prunes to one yearly partition
+-- and the per-partition indexes stay the same size however much history is kept.
+-- The primary key has to contain the partition key; it now leads with date, which
+-- also makes it the (date, ticker) index the engine's per-session lookups need.
+-- Rows outside every yearly partition land in stock_prices_default until
+-- ensure_stock_prices_partition() is called for their year.
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema() AND c.relname = 'stock_prices' AND c.relkind = 'r'
+    ) THEN
+        ALTER TABLE stock_prices RENAME TO stock_prices_unpartitioned;
+        ALTER TABLE stock_prices_unpartitioned RENAME CONSTRAINT stock_prices_pkey TO stock_prices_unpartitioned_pkey;
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS stock_prices (
+    ticker VARCHAR NOT NULL,
+    timestamp BIGINT NOT NULL,
+    date DATE NOT NULL,
+    open DOUBLE PRECISION,
+    high DOUBLE PRECISION,
+    low DOUBLE PRECISION,
+    close DOUBLE PRECISION,
+    volume DOUBLE PRECISION,
+    transactions INTEGER,
+    volume_weighted_avg DOUBLE PRECISION,
+    is_otc BOOLEAN,
+    is_adjusted BOOLEAN,
+    PRIMARY KEY (date, ticker, timestamp)
+) PARTITION BY RANGE (date);
+
+CREATE TABLE IF NOT EXISTS stock_prices_default PARTITION OF stock_prices DEFAULT;
+
+-- Creates the partition for one year if it is missing. Rows for that year that
+-- already sit in the default partition are moved into it before it is attached.
+CREATE OR REPLACE FUNCTION ensure_stock_prices_partition(p_year INT) RETURNS VOID AS $$
+DECLARE
+    part TEXT := format('stock_prices_%s', p_year);
+    lower_bound DATE := make_date(p_year, 1, 1);
+    upper_bound DATE := make_date(p_year + 1, 1, 1);
+BEGIN
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN;
+    END IF;
+    -- Serialise concurrent callers (parallel backfills) for the same year
+    PERFORM pg_advisory_xact_lock(hashtext(part));
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE stock_prices INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM stock_prices_default WHERE date >= %L AND date < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved', lower_bound, upper_bound, part);
+    EXECUTE format('ALTER TABLE stock_prices ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   part, lower_bound, upper_bound);
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    first_year INT := EXTRACT(YEAR FROM CURRENT_DATE)::INT - 2;
+    partition_year INT;
+BEGIN
+    IF to_regclass('stock_prices_unpartitioned') IS NOT NULL THEN
+        SELECT LEAST(first_year, EXTRACT(YEAR FROM MIN(date))::INT) INTO first_year FROM stock_prices_unpartitioned;
+    END IF;
+
+    FOR partition_year IN first_year .. EXTRACT(YEAR FROM CURRENT_DATE)::INT + 1 LOOP
+        PERFORM ensure_stock_prices_partition(partition_year);
+    END LOOP;
+
+    IF to_regclass('stock_prices_unpartitioned') IS NOT NULL THEN
+        INSERT INTO stock_prices (ticker, timestamp, date, open, high, low, close, volume,
+                                  transactions, volume_weighted_avg, is_otc, is_adjusted)
+        SELECT ticker, timestamp, date, open, high, low, close, volume,
+               transactions, volume_weighted_avg, is_otc, is_adjusted
+        FROM stock_prices_unpartitioned;
+        DROP TABLE stock_prices_unpartitioned;
+    END IF;
+END $$;
@@ -0,0 +1,16 @@
+-- data/migrations/0003_query_indexes.sql
+-- Indexes for the engine, API and calendar read paths. `python shared/migrations.py check`
+-- EXPLAINs those queries and fails if any of them still needs a sequential scan.
+
+-- Per-ticker history (backtests, risk metrics); the primary key already leads with date
+CREATE INDEX IF NOT EXISTS idx_stock_prices_ticker_date ON stock_prices (ticker, date);
+
+-- Latest-version reads: WHERE index_type = ? AND date ... ORDER BY update_time DESC
+CREATE INDEX IF NOT EXISTS idx_index_composition_type_date
+    ON index_composition (index_type, date, update_time DESC);
+CREATE INDEX IF NOT EXISTS idx_index_performance_type_date
+    ON index_performance (index_type, date, update_time DESC);
+
+-- Top-N by market cap walks this index instead of sorting the whole table
+CREATE INDEX IF NOT EXISTS idx_ticker_details_market_cap
+    ON ticker_details (market_cap DESC) WHERE market_cap IS NOT NULL;
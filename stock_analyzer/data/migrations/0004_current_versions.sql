@@ -0,0 +1,46 @@
+-- data/migrations/0004_current_versions.sql
+-- Latest-version tables for index_composition and index_performance.
+--
+-- Every rebuild appends a new update_time version to the history tables, so reading
+-- "the current index" meant picking the newest version per date over the whole
+-- history. The engine now replaces the matching rows of these tables in the same
+-- transaction that appends to history; readers do plain primary-key lookups.
+-- The history tables are kept for auditing and compacted by the engine
+-- (INDEX_HISTORY_VERSIONS).
+
+CREATE TABLE IF NOT EXISTS index_composition_current (
+    index_type VARCHAR NOT NULL,
+    date DATE NOT NULL,
+    ticker VARCHAR NOT NULL,
+    close_price DOUBLE PRECISION NOT NULL,
+    weight DOUBLE PRECISION NOT NULL,
+    market_cap DOUBLE PRECISION,
+    update_time TIMESTAMP NOT NULL,
+    PRIMARY KEY (index_type, date, ticker)
+);
+
+CREATE TABLE IF NOT EXISTS index_performance_current (
+    index_type VARCHAR NOT NULL,
+    date DATE NOT NULL,
+    index_price DOUBLE PRECISION NOT NULL,
+    daily_return DOUBLE PRECISION NOT NULL,
+    update_time TIMESTAMP NOT NULL,
+    PRIMARY KEY (index_type, date)
+);
+
+-- Seed from the newest version already in history
+INSERT INTO index_composition_current (index_type, date, ticker, close_price, weight, market_cap, update_time)
+SELECT c.index_type, c.date, c.ticker, c.close_price, c.weight, c.market_cap, c.update_time
+FROM index_composition c
+JOIN (
+    SELECT index_type, date, MAX(update_time) AS update_time
+    FROM index_composition
+    GROUP BY index_type, date
+) latest USING (index_type, date, update_time)
+ON CONFLICT DO NOTHING;
+
+INSERT INTO index_performance_current (index_type, date, index_price, daily_return, update_time)
+SELECT DISTINCT ON (index_type, date) index_type, date, index_price, daily_return, update_time
+FROM index_performance
+ORDER BY index_type, date, update_time DESC
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,15 @@
+-- data/migrations/0005_index_level_state.sql
+-- Where the incremental level tracker (services/index_engine/performance.py) left off
+-- for each index: the last session it priced, the level and divisor at that close, and
+-- the units held since the last rebalance with their last seen close. A daily run
+-- prices only the sessions after `date` from this row.
+
+CREATE TABLE IF NOT EXISTS index_level_state (
+    index_type VARCHAR PRIMARY KEY,
+    date DATE NOT NULL,
+    index_level DOUBLE PRECISION NOT NULL,
+    divisor DOUBLE PRECISION NOT NULL,
+    -- {"ticker": [units, last_close], ...}
+    holdings JSONB NOT NULL,
+    update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
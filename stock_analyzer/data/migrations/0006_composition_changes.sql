@@ -0,0 +1,38 @@
+-- data/migrations/0006_composition_changes.sql
+-- index_composition_changes becomes one row per (index_type, date) with the explicit
+-- constituent diff against the previous session: added and removed tickers and the
+-- one-way weight turnover. symbols / prev_symbols stay as comma-joined sorted lists.
+-- Rows written before this migration were equal-weighted only; they keep their latest
+-- version per date and get added/removed derived from their symbol strings.
+
+ALTER TABLE index_composition_changes
+    ADD COLUMN IF NOT EXISTS index_type VARCHAR,
+    ADD COLUMN IF NOT EXISTS added TEXT[],
+    ADD COLUMN IF NOT EXISTS removed TEXT[],
+    ADD COLUMN IF NOT EXISTS turnover DOUBLE PRECISION;
+
+UPDATE index_composition_changes SET index_type = 'Equal Weighted' WHERE index_type IS NULL;
+
+DELETE FROM index_composition_changes c
+USING index_composition_changes newer
+WHERE newer.index_type = c.index_type AND newer.date = c.date AND newer.update_time > c.update_time;
+
+UPDATE index_composition_changes SET
+    added = ARRAY(
+        SELECT unnest(string_to_array(symbols, ','))
+        EXCEPT SELECT unnest(string_to_array(COALESCE(prev_symbols, ''), ','))
+        ORDER BY 1
+    ),
+    removed = ARRAY(
+        SELECT unnest(string_to_array(COALESCE(prev_symbols, ''), ','))
+        EXCEPT SELECT unnest(string_to_array(symbols, ','))
+        ORDER BY 1
+    )
+WHERE added IS NULL;
+
+ALTER TABLE index_composition_changes DROP CONSTRAINT IF EXISTS index_composition_changes_pkey;
+ALTER TABLE index_composition_changes
+    ALTER COLUMN index_type SET NOT NULL,
+    ALTER COLUMN added SET NOT NULL,
+    ALTER COLUMN removed SET NOT NULL,
+    ADD PRIMARY KEY (index_type, date);
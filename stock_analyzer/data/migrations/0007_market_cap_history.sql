@@ -0,0 +1,29 @@
+-- data/migrations/0007_market_cap_history.sql
+-- Point-in-time market capitalisation, one row per ticker and priced session.
+--
+-- ticker_details.market_cap is a single value that every profile refresh overwrites, so
+-- ranking historical sessions by it used today's cap. Rows here are written when a
+-- session is ingested (weighted_shares_outstanding x that day's close) and are not
+-- touched by later profile refreshes. The engine resolves caps with an as-of join:
+-- the newest row on or before each session.
+
+CREATE TABLE IF NOT EXISTS market_cap_history (
+    ticker VARCHAR NOT NULL,
+    date DATE NOT NULL,
+    market_cap DOUBLE PRECISION NOT NULL,
+    shares_outstanding DOUBLE PRECISION,
+    update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- (ticker, date) is the as-of lookup for one ticker
+    PRIMARY KEY (ticker, date)
+);
+
+-- Range reads for the engine's vectorized as-of join
+CREATE INDEX IF NOT EXISTS idx_market_cap_history_date ON market_cap_history (date);
+
+-- Seed from the prices already loaded, with the share counts known today
+INSERT INTO market_cap_history (ticker, date, market_cap, shares_outstanding)
+SELECT sp.ticker, sp.date, sp.close * td.weighted_shares_outstanding, td.weighted_shares_outstanding
+FROM stock_prices sp
+JOIN ticker_details td ON td.ticker = sp.ticker
+WHERE td.weighted_shares_outstanding IS NOT NULL AND sp.close IS NOT NULL
+ON CONFLICT (ticker, date) DO NOTHING;
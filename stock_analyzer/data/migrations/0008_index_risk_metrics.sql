@@ -0,0 +1,22 @@
+-- data/migrations/0008_index_risk_metrics.sql
+-- Precomputed risk analytics per index and session (services/index_engine/risk.py):
+-- annualised rolling volatility over 20/60/252 sessions, rolling 252-session Sharpe,
+-- rolling beta against the benchmark index, and drawdown from the running peak.
+-- peak_level and max_drawdown run from the first session, so each new session
+-- extends them from the previous row without rereading the whole history.
+
+CREATE TABLE IF NOT EXISTS index_risk_metrics (
+    index_type VARCHAR NOT NULL,
+    date DATE NOT NULL,
+    volatility_20 DOUBLE PRECISION,
+    volatility_60 DOUBLE PRECISION,
+    volatility_252 DOUBLE PRECISION,
+    sharpe_252 DOUBLE PRECISION,
+    benchmark VARCHAR,
+    beta DOUBLE PRECISION,
+    peak_level DOUBLE PRECISION NOT NULL,
+    drawdown DOUBLE PRECISION NOT NULL,
+    max_drawdown DOUBLE PRECISION NOT NULL,
+    update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (index_type, date)
+);
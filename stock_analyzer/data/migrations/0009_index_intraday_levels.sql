@@ -0,0 +1,15 @@
+-- data/migrations/0009_index_intraday_levels.sql
+-- Intraday index levels published by services/index_engine/intraday.py at the
+-- configured cadence. timestamp is the end of the minute bar the level reflects, in
+-- epoch milliseconds like stock_prices.timestamp; date is its UTC calendar date.
+
+CREATE TABLE IF NOT EXISTS index_intraday_levels (
+    index_type VARCHAR NOT NULL,
+    timestamp BIGINT NOT NULL,
+    date DATE NOT NULL,
+    index_level DOUBLE PRECISION NOT NULL,
+    update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (index_type, timestamp)
+);
+
+CREATE INDEX IF NOT EXISTS idx_index_intraday_levels_date ON index_intraday_levels (index_type, date);
@@ -0,0 +1,61 @@
+-- data/migrations/0010_universe_versions.sql
+-- Change counters for the API's in-memory universe cache
+-- (shared/universe_cache.py). Every statement that writes
+-- stock_prices or market_cap_history bumps the version of each session date it
+-- touched; any write to ticker_details bumps the 'ticker_details' scope, which
+-- covers every date. A cached session is reused while both versions are unchanged.
+-- The triggers are statement-level, so a bulk upsert of a full day costs one small
+-- upsert here, not one per row.
+
+CREATE SEQUENCE IF NOT EXISTS universe_version_seq;
+
+CREATE TABLE IF NOT EXISTS universe_versions (
+    -- A session date (YYYY-MM-DD), or 'ticker_details' for all of them
+    scope VARCHAR PRIMARY KEY,
+    version BIGINT NOT NULL,
+    update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION bump_universe_versions() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'ticker_details' THEN
+        INSERT INTO universe_versions (scope, version)
+        VALUES ('ticker_details', nextval('universe_version_seq'))
+        ON CONFLICT (scope) DO UPDATE SET version = EXCLUDED.version, update_time = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO universe_versions (scope, version)
+        SELECT scope, nextval('universe_version_seq') FROM (SELECT DISTINCT date::text AS scope FROM new_rows) d
+        ON CONFLICT (scope) DO UPDATE SET version = EXCLUDED.version, update_time = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO universe_versions (scope, version)
+        SELECT scope, nextval('universe_version_seq')
+        FROM (SELECT date::text AS scope FROM new_rows UNION SELECT date::text FROM old_rows) d
+        ON CONFLICT (scope) DO UPDATE SET version = EXCLUDED.version, update_time = CURRENT_TIMESTAMP;
+    ELSE
+        INSERT INTO universe_versions (scope, version)
+        SELECT scope, nextval('universe_version_seq') FROM (SELECT DISTINCT date::text AS scope FROM old_rows) d
+        ON CONFLICT (scope) DO UPDATE SET version = EXCLUDED.version, update_time = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER ticker_details_universe_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ticker_details
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_universe_versions();
+
+-- Transition tables allow only one event per trigger
+DO $$
+DECLARE
+    tbl TEXT;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY['stock_prices', 'market_cap_history'] LOOP
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION bump_universe_versions()', tbl || '_universe_version_insert', tbl);
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION bump_universe_versions()', tbl || '_universe_version_update', tbl);
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION bump_universe_versions()', tbl || '_universe_version_delete', tbl);
+    END LOOP;
+END;
+$$;
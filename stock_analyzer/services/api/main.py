@@ -1,25 +1,148 @@
-from fastapi import FastAPI, HTTPException, Query
-from typing import List
-from datetime import datetime, timedelta
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Query
+from typing import List, Optional
 
 # Import the shared Pydantic models
-from shared.models import IndexPerformanceResponse, IndexCompositionResponse
+from shared.models import (
+    IndexPerformanceResponse, IndexCompositionResponse, IndexSnapshotResponse, IndexTypeResponse, IndexRiskResponse
+)
+from shared.async_db import AsyncDatabaseManager
+from shared.query_stats import stats_snapshot
+from shared.rebalance import drifted_composition_query
+from shared.migrations import run_migrations
+from shared.universe import attach_volatility
+from shared.universe_cache import UniverseCache
+from shared.weighting_strategies import STRATEGIES, get_strategy, strategy_names
+
+db = AsyncDatabaseManager()
+_universe_cache: Optional[UniverseCache] = None
+
+def universe_cache() -> UniverseCache:
+    """The process-wide universe cache, created (with its sync pool) on first use."""
+    global _universe_cache
+    if _universe_cache is None:
+        _universe_cache = UniverseCache()
+    return _universe_cache
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Applies pending schema migrations, opens the async connection pool on startup and drains it on shutdown."""
+    await asyncio.to_thread(run_migrations)
+    await db.open()
+    try:
+        yield
+    finally:
+        await db.close()
 
 # Initialize the FastAPI application
 app = FastAPI(
     title="Stock Index Engine API",
     description="REST API gateway for the financial data pipeline.",
-    version="0.3.0"
+    version="0.3.0",
+    lifespan=lifespan
 )
 
+async def fetch_performance(index_type: str, start_date: str, end_date: str) -> List[IndexPerformanceResponse]:
+    # index_performance_current holds only the latest recalculation per date
+    query = """
+        SELECT date, index_price, daily_return, index_type
+        FROM index_performance_current
+        WHERE index_type = %s AND date BETWEEN %s AND %s
+        ORDER BY date
+    """
+    df = await db.execute_query(query, (index_type, start_date, end_date))
+    return [
+        IndexPerformanceResponse(
+            date=str(row.date),
+            index_price=row.index_price,
+            daily_return=row.daily_return,
+            index_type=row.index_type
+        )
+        for row in df.itertuples(index=False)
+    ]
+
+async def fetch_composition(target_date: str, index_type: str) -> List[IndexCompositionResponse]:
+    # Compositions are stored on rebalance dates only; other dates get the last one drifted with prices
+    query, params = drifted_composition_query(index_type, target_date)
+    df = await db.execute_query(query, params)
+    return [
+        IndexCompositionResponse(
+            ticker=row.ticker,
+            weight=row.weight,
+            market_cap=None if row.market_cap != row.market_cap else row.market_cap,
+            close_price=row.close_price
+        )
+        for row in df.itertuples(index=False)
+    ]
+
+async def fetch_risk(index_type: str, start_date: str, end_date: str) -> List[IndexRiskResponse]:
+    # Precomputed per session by the engine's risk stage; nothing is aggregated here
+    query = """
+        SELECT date, index_type, volatility_20, volatility_60, volatility_252, sharpe_252,
+               benchmark, beta, drawdown, max_drawdown
+        FROM index_risk_metrics
+        WHERE index_type = %s AND date BETWEEN %s AND %s
+        ORDER BY date
+    """
+    df = await db.execute_query(query, (index_type, start_date, end_date))
+    df = df.astype(object).where(df.notna(), None)
+    return [IndexRiskResponse(**{**row, 'date': str(row['date'])}) for row in df.to_dict('records')]
+
+def build_preview(target_date: str, index_type: str, top_n: int) -> List[IndexCompositionResponse]:
+    # Blocking: reads through the universe cache's sync pool, so callers run it in a thread
+    cache = universe_cache()
+    strategy = get_strategy(index_type)
+    top_stocks = cache.top_n([target_date], top_n)
+    if top_stocks.empty:
+        return []
+    if "volatility" in strategy.requires:
+        top_stocks = attach_volatility(cache.db, top_stocks)
+    top_stocks = top_stocks.assign(weight=strategy.weigh(top_stocks)).sort_values('weight', ascending=False)
+    return [
+        IndexCompositionResponse(
+            ticker=row.ticker,
+            weight=row.weight,
+            market_cap=None if row.market_cap != row.market_cap else row.market_cap,
+            close_price=row.close_price
+        )
+        for row in top_stocks.itertuples(index=False)
+    ]
+
+def index_type_param(
+    index_type: str = Query("Equal Weighted", description="Weighting strategy, one of /api/v1/index-types")
+) -> str:
+    """Rejects index types that are not in the strategy registry."""
+    if index_type not in STRATEGIES:
+        raise HTTPException(status_code=422, detail=f"Unknown index_type '{index_type}'. Available: {strategy_names()}")
+    return index_type
+
 @app.get("/", tags=["Health"])
-def health_check():
+async def health_check():
     """Simple health check endpoint to verify the API is running."""
     return {"status": "healthy", "service": "api-gateway"}
 
+@app.get("/api/v1/stats/queries", tags=["Health"])
+async def get_query_stats(
+    limit: Optional[int] = Query(20, ge=1, description="Number of statements to return"),
+    sort_by: str = Query("total_ms", description="Field to rank by, e.g. total_ms, mean_ms, max_ms, calls")
+):
+    """
+    Per-statement timings recorded by the shared DB layer in this process,
+    keyed by normalised query fingerprint.
+    """
+    return stats_snapshot(limit, sort_by)
+
+@app.get("/api/v1/index-types", response_model=List[IndexTypeResponse], tags=["Analytics"])
+async def get_index_types():
+    """
+    List the weighting strategies the engine builds; any of them is a valid index_type.
+    """
+    return [IndexTypeResponse(name=s.name, description=s.description) for s in STRATEGIES.values()]
+
 @app.get("/api/v1/performance", response_model=List[IndexPerformanceResponse], tags=["Analytics"])
-def get_index_performance(
-    index_type: str = Query("Equal Weighted", description="Type of index strategy"),
+async def get_index_performance(
+    index_type: str = Depends(index_type_param),
     start_date: str = Query(..., description="Start date in YYYY-MM-DD format"),
     end_date: str = Query(..., description="End date in YYYY-MM-DD format")
 ):
@@ -27,37 +150,72 @@ def get_index_performance(
     Retrieve historical performance data for a specific index.
     """
     try:
-        # TODO: Replace this mock data with actual call to shared.db.py when we build it
-        mock_data = [
-            IndexPerformanceResponse(
-                date=start_date,
-                index_price=100.0,
-                daily_return=0.0,
-                index_type=index_type
-            )
-        ]
-        return mock_data
+        return await fetch_performance(index_type, start_date, end_date)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/risk", response_model=List[IndexRiskResponse], tags=["Analytics"])
+async def get_index_risk(
+    index_type: str = Depends(index_type_param),
+    start_date: str = Query(..., description="Start date in YYYY-MM-DD format"),
+    end_date: str = Query(..., description="End date in YYYY-MM-DD format")
+):
+    """
+    Retrieve rolling volatility, Sharpe, beta and drawdown for an index, one row per session.
+    """
+    try:
+        return await fetch_risk(index_type, start_date, end_date)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/v1/composition", response_model=List[IndexCompositionResponse], tags=["Analytics"])
-def get_index_composition(
+async def get_index_composition(
     target_date: str = Query(..., description="Target date in YYYY-MM-DD format"),
-    index_type: str = Query("Equal Weighted", description="Type of index strategy")
+    index_type: str = Depends(index_type_param)
 ):
     """
     Retrieve the constituent weights of an index for a specific date.
     """
     try:
-         # TODO: Replace this mock data with actual call to shared.db.py when we build it
-        mock_data = [
-            IndexCompositionResponse(
-                ticker="AAPL",
-                weight=0.05,
-                market_cap=3000000000000,
-                close_price=185.50
-            )
-        ]
-        return mock_data
+        return await fetch_composition(target_date, index_type)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/snapshot", response_model=IndexSnapshotResponse, tags=["Analytics"])
+async def get_index_snapshot(
+    target_date: str = Query(..., description="Target date in YYYY-MM-DD format"),
+    index_type: str = Depends(index_type_param)
+):
+    """
+    Retrieve an index's level and constituents for one date in a single call.
+    Both queries run concurrently on separate pooled connections.
+    """
+    try:
+        performance, composition = await asyncio.gather(
+            fetch_performance(index_type, target_date, target_date),
+            fetch_composition(target_date, index_type)
+        )
+        return IndexSnapshotResponse(
+            date=target_date,
+            index_type=index_type,
+            performance=performance[0] if performance else None,
+            composition=composition
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/preview", response_model=List[IndexCompositionResponse], tags=["Analytics"])
+async def get_index_preview(
+    target_date: str = Query(..., description="Target date in YYYY-MM-DD format"),
+    index_type: str = Depends(index_type_param),
+    top_n: int = Query(5, ge=1, description="Number of constituents")
+):
+    """
+    What-if composition: rebuilds an index of any size for one session from the
+    in-memory universe cache, without storing it. Repeated requests only reread
+    sessions whose prices or market caps changed since they were cached.
+    """
+    try:
+        return await asyncio.to_thread(build_preview, target_date, index_type, top_n)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,10 +1,16 @@
 # services/dashboard/main.py
 
+import sys
 import streamlit as st
 import requests
 import pandas as pd
 import plotly.express as px
-from datetime import datetime, timedelta
+from pathlib import Path
+
+# Allow importing from the shared directory
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+from shared.trading_calendar import TradingCalendar
+from shared.weighting_strategies import strategy_names
 
 # Hardcoded for local testing. Will use Docker service name later.
 API_BASE_URL = "http://localhost:8000"
@@ -19,20 +25,24 @@ tab_dash, tab_api_docs = st.tabs(["📊 View Dashboard", "📖 API Documentation
 with tab_dash:
     with st.form("chart_generation_form"):
         st.subheader("Dashboard Parameters")
-        view_strategy = st.selectbox("Select Strategy Type:", ["Market-Cap Weighted", "Equal Weighted"])
-        comp_date = st.date_input("Index Composition Date", value=datetime.now() - timedelta(days=1))
+        strategies = strategy_names()
+        view_strategy = st.selectbox("Select Strategy Type:", strategies, index=strategies.index("Market-Cap Weighted"))
+        comp_date = st.date_input("Index Composition Date", value=TradingCalendar().previous_session())
+        what_if = st.checkbox("What-if rebuild", help="Rebuild the composition with a custom size instead of the stored index")
+        top_n = st.number_input("Constituents (what-if only)", min_value=1, value=5)
         submitted = st.form_submit_button("Fetch Data from API", type="primary")
 
     if submitted:
         date_str = comp_date.strftime('%Y-%m-%d')
         
         # Make the REST HTTP Request to your FastAPI service
-        st.info(f"Making GET request to {API_BASE_URL}/api/v1/composition...")
+        endpoint = "preview" if what_if else "composition"
+        params = {"target_date": date_str, "index_type": view_strategy}
+        if what_if:
+            params["top_n"] = int(top_n)
+        st.info(f"Making GET request to {API_BASE_URL}/api/v1/{endpoint}...")
         try:
-            response = requests.get(
-                f"{API_BASE_URL}/api/v1/composition",
-                params={"target_date": date_str, "index_type": view_strategy}
-            )
+            response = requests.get(f"{API_BASE_URL}/api/v1/{endpoint}", params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -50,6 +60,33 @@ with tab_dash:
                     st.warning(f"API returned empty list. No data generated for {date_str} yet.")
             else:
                 st.error(f"API Error: HTTP {response.status_code} - {response.text}")
+
+            # Risk figures are precomputed per session by the engine; this is a plain range read
+            risk_start = (comp_date - pd.Timedelta(days=365)).strftime('%Y-%m-%d')
+            response = requests.get(
+                f"{API_BASE_URL}/api/v1/risk",
+                params={"start_date": risk_start, "end_date": date_str, "index_type": view_strategy}
+            )
+            if response.status_code == 200 and response.json():
+                risk = pd.DataFrame(response.json())
+                latest = risk.iloc[-1]
+
+                def percent(value):
+                    return "n/a" if pd.isna(value) else f"{value:.2%}"
+
+                st.subheader(f'📉 {view_strategy} Risk (As of {latest["date"]})')
+                col1, col2, col3, col4, col5 = st.columns(5)
+                col1.metric("Volatility (20d)", percent(latest['volatility_20']))
+                col2.metric("Volatility (252d)", percent(latest['volatility_252']))
+                col3.metric("Sharpe (252d)", "n/a" if pd.isna(latest['sharpe_252']) else f"{latest['sharpe_252']:.2f}")
+                col4.metric(f"Beta vs {latest['benchmark']}", "n/a" if pd.isna(latest['beta']) else f"{latest['beta']:.2f}")
+                col5.metric("Max Drawdown", percent(latest['max_drawdown']))
+
+                fig = px.line(risk, x='date', y=['volatility_20', 'volatility_60', 'volatility_252'],
+                              title='Rolling Annualised Volatility')
+                st.plotly_chart(fig, use_container_width=True)
+            elif response.status_code != 200:
+                st.error(f"API Error: HTTP {response.status_code} - {response.text}")
                 
         except requests.exceptions.ConnectionError:
             st.error("Connection Error: Could not reach the FastAPI Gateway. Is it running on port 8000?")
@@ -0,0 +1,272 @@
+# services/index_engine/backtest.py
+
+import os
+import sys
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from datetime import timedelta
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Allow `python services/index_engine/backtest.py` from the project root
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+from shared.db import DatabaseManager
+from shared.logger_config import setup_logger
+from shared.rebalance import REBALANCE_PERIODS, rebalance_rows
+from shared.trading_calendar import to_date
+from shared.universe_cache import select_top_n
+from shared.weighting_strategies import VOLATILITY_WINDOW, get_strategy, strategy_names
+from services.index_engine.main import IndexConstructor
+
+logger = setup_logger("Backtest")
+
+TRADING_DAYS = 252
+
+
+@dataclass(frozen=True)
+class BacktestConfig:
+    strategy: str
+    top_n: int
+    rebalance: str = "D"
+
+
+class BacktestPanel:
+    """
+    Dense (sessions x tickers) matrices of everything a backtest needs, loaded once:
+    close (carried forward over missing prints), whether the ticker printed that day,
+    market cap, weighted shares outstanding and trailing volatility. Volatility is the
+    engine's statistic (see trailing_volatility), not one over the carried-forward closes.
+
+    share() copies the matrices into named shared-memory blocks; worker processes
+    attach to them with attach() and read them in place, so a grid of any size costs
+    one database read and one copy of the panel.
+    """
+    MATRICES = ("close", "printed", "market_cap", "weighted_shares_outstanding", "volatility")
+
+    def __init__(self, dates: np.ndarray, tickers: np.ndarray, matrices: Dict[str, np.ndarray]):
+        self.dates = dates
+        self.tickers = tickers
+        self.matrices = matrices
+        self._blocks: List[shared_memory.SharedMemory] = []
+
+    @classmethod
+    def load(cls, start: str, end: str, db: Optional[DatabaseManager] = None) -> "BacktestPanel":
+        # Read extra history ahead of `start` so trailing volatility is warm on day one
+        warmup_start = str(to_date(start) - timedelta(days=VOLATILITY_WINDOW * 2))
+        universe = IndexConstructor(db).load_universe(warmup_start, end, extra_columns=("weighted_shares_outstanding",))
+        if universe.empty:
+            raise ValueError(f"No priced universe between {start} and {end}.")
+
+        date_codes, dates = pd.factorize(pd.to_datetime(universe['date']), sort=True)
+        ticker_codes, tickers = pd.factorize(universe['ticker'], sort=True)
+
+        def dense(column: str) -> np.ndarray:
+            matrix = np.full((len(dates), len(tickers)), np.nan)
+            matrix[date_codes, ticker_codes] = universe[column].to_numpy(dtype=float)
+            return matrix
+
+        raw_close = dense('close_price')
+        close = pd.DataFrame(raw_close).ffill()
+        volatility = np.full(raw_close.shape, np.nan)
+        volatility[date_codes, ticker_codes] = trailing_volatility(
+            ticker_codes, date_codes, universe['close_price'].to_numpy(dtype=float)
+        )
+
+        keep = dates >= pd.Timestamp(start)
+        matrices = {
+            "close": close.to_numpy()[keep],
+            "printed": ~np.isnan(raw_close[keep]),
+            "market_cap": pd.DataFrame(dense('market_cap')).ffill().to_numpy()[keep],
+            "weighted_shares_outstanding": pd.DataFrame(dense('weighted_shares_outstanding')).ffill().to_numpy()[keep],
+            "volatility": volatility[keep],
+        }
+        logger.info(f"Loaded backtest panel: {keep.sum()} sessions x {len(tickers)} tickers.")
+        return cls(dates[keep].to_numpy(), np.asarray(tickers, dtype=object), matrices)
+
+    def share(self) -> dict:
+        """Copies the matrices into shared memory. Returns the spec attach() needs."""
+        spec = {"dates": self.dates, "tickers": self.tickers, "matrices": {}}
+        for name, matrix in self.matrices.items():
+            block = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+            view = np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=block.buf)
+            view[...] = matrix
+            self.matrices[name] = view
+            self._blocks.append(block)
+            spec["matrices"][name] = (block.name, matrix.shape, matrix.dtype.str)
+        return spec
+
+    @classmethod
+    def attach(cls, spec: dict) -> "BacktestPanel":
+        panel = cls(spec["dates"], spec["tickers"], {})
+        for name, (block_name, shape, dtype) in spec["matrices"].items():
+            block = shared_memory.SharedMemory(name=block_name)
+            if multiprocessing.get_start_method() != "fork":
+                # The parent owns the blocks; keep this process's own tracker from unlinking them at exit.
+                # Forked workers share the parent's tracker, which must keep its registration.
+                resource_tracker.unregister(block._name, "shared_memory")
+            panel._blocks.append(block)
+            panel.matrices[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        return panel
+
+    def release(self, unlink: bool = False):
+        self.matrices = {}
+        for block in self._blocks:
+            block.close()
+            if unlink:
+                block.unlink()
+        self._blocks = []
+
+
+def trailing_volatility(tickers: np.ndarray, dates: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """
+    Per-row trailing volatility, the statistic of shared.universe.VOLATILITY_CTE: log
+    returns between each ticker's consecutive positive closes (a missing session is
+    skipped, not filled with a zero return), sample standard deviation over the last
+    VOLATILITY_WINDOW of them, NaN until a third of the window is available.
+    `tickers` and `dates` only need to sort, so factorized codes will do.
+    """
+    frame = pd.DataFrame({'ticker': tickers, 'date': dates, 'close': close})
+    priced = frame[frame['close'] > 0].sort_values(['ticker', 'date'])
+    log_returns = np.log(priced['close']).groupby(priced['ticker']).diff()
+    volatility = log_returns.groupby(priced['ticker']).rolling(
+        VOLATILITY_WINDOW, min_periods=max(2, VOLATILITY_WINDOW // 3)
+    ).std()
+    out = np.full(len(frame), np.nan)
+    out[volatility.index.get_level_values(-1)] = volatility.to_numpy()
+    return out
+
+
+def target_weights(panel: BacktestPanel, config: BacktestConfig, rows: np.ndarray) -> np.ndarray:
+    """
+    (len(rows) x tickers) weights at each rebalance: the top_n printed tickers by market
+    cap, chosen with the engine's select_top_n so ties at the cut-off go the same way,
+    then weighted by the strategy over all rebalance dates in one call.
+    """
+    m = panel.matrices
+    caps = np.where(m["printed"][rows], m["market_cap"][rows], np.nan)
+    selected = [select_top_n(row_caps, panel.tickers, config.top_n) for row_caps in caps]
+    row_index = np.repeat(np.arange(len(rows)), [len(columns) for columns in selected])
+    column_index = np.concatenate(selected) if selected else np.empty(0, dtype=np.int64)
+
+    at = rows[row_index]
+    top = pd.DataFrame({
+        'date': row_index,
+        'ticker': panel.tickers[column_index],
+        'market_cap': m["market_cap"][at, column_index],
+        'close_price': m["close"][at, column_index],
+        'weighted_shares_outstanding': m["weighted_shares_outstanding"][at, column_index],
+        'volatility': m["volatility"][at, column_index],
+    })
+    weights = np.zeros(caps.shape)
+    weights[row_index, column_index] = get_strategy(config.strategy).weigh(top).to_numpy()
+    return weights
+
+
+def simulate(panel: BacktestPanel, config: BacktestConfig) -> Dict[str, float]:
+    """
+    Buys the target weights at each rebalance close and lets them drift with prices
+    until the next one. Daily returns for a holding period are one matrix-vector
+    product over its sessions; turnover compares the new targets with the drifted
+    weights they replace.
+    """
+    rows = rebalance_rows(panel.dates, config.rebalance)
+    weights = target_weights(panel, config, rows)
+    close = np.nan_to_num(panel.matrices["close"])
+    entry = close[rows]
+    units = np.divide(weights, entry, out=np.zeros_like(weights), where=weights > 0)
+
+    returns = []
+    bounds = list(rows[1:]) + [len(panel.dates) - 1]
+    for holding, (start, stop) in enumerate(zip(rows, bounds)):
+        values = close[start:stop + 1] @ units[holding]
+        returns.append(values[1:] / values[:-1] - 1)
+    returns = np.concatenate(returns) if returns else np.array([])
+
+    drifted = units[:-1] * entry[1:]
+    drifted /= np.where(drifted.sum(axis=1, keepdims=True) > 0, drifted.sum(axis=1, keepdims=True), 1)
+    turnover = 0.5 * np.abs(weights[1:] - drifted).sum(axis=1)
+
+    years = max(len(returns), 1) / TRADING_DAYS
+    levels = np.cumprod(1 + returns) if len(returns) else np.array([1.0])
+    volatility = returns.std(ddof=1) * np.sqrt(TRADING_DAYS) if len(returns) > 1 else np.nan
+    return {
+        **asdict(config),
+        "total_return": levels[-1] - 1,
+        "cagr": levels[-1] ** (1 / years) - 1,
+        "volatility": volatility,
+        "sharpe": returns.mean() * TRADING_DAYS / volatility if volatility else np.nan,
+        "max_drawdown": (levels / np.maximum.accumulate(np.r_[1.0, levels])[1:] - 1).min(),
+        "rebalances": len(rows),
+        "avg_turnover": turnover.mean() if len(turnover) else 0.0,
+        "annual_turnover": turnover.sum() / years,
+    }
+
+
+_PANEL: Optional[BacktestPanel] = None
+
+def _attach_worker(spec: dict):
+    global _PANEL
+    _PANEL = BacktestPanel.attach(spec)
+
+def _run_config(config: BacktestConfig) -> Dict[str, float]:
+    return simulate(_PANEL, config)
+
+
+def build_grid(strategies: Iterable[str], top_ns: Iterable[int], rebalances: Iterable[str]) -> List[BacktestConfig]:
+    return [BacktestConfig(strategy, top_n, rebalance)
+            for strategy, top_n, rebalance in itertools.product(strategies, top_ns, rebalances)]
+
+
+def run_backtests(start: str, end: str, grid: List[BacktestConfig], workers: Optional[int] = None,
+                  db: Optional[DatabaseManager] = None) -> pd.DataFrame:
+    """
+    Evaluates every configuration in `grid` over [start, end] and returns one row per
+    configuration, best Sharpe first. The panel is read once and shared with a pool
+    of `workers` processes (default: every core).
+    """
+    for config in grid:
+        get_strategy(config.strategy)  # fail on a typo before the expensive load
+
+    panel = BacktestPanel.load(start, end, db)
+    workers = workers or os.cpu_count() or 1
+    logger.info(f"Running {len(grid)} configurations on {workers} worker processes...")
+    if workers == 1:
+        results = [simulate(panel, config) for config in grid]
+    else:
+        spec = panel.share()
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach_worker, initargs=(spec,)) as pool:
+                results = list(pool.map(_run_config, grid))
+        finally:
+            panel.release(unlink=True)
+
+    table = pd.DataFrame(results).sort_values("sharpe", ascending=False, ignore_index=True)
+    logger.info(f"Backtest grid finished: {len(table)} configurations between {start} and {end}.")
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest weighting strategies over a grid of parameters")
+    parser.add_argument("--start", required=True, help="First session (YYYY-MM-DD)")
+    parser.add_argument("--end", required=True, help="Last session (YYYY-MM-DD)")
+    parser.add_argument("--strategies", nargs="+", default=strategy_names(), help="Registered index types")
+    parser.add_argument("--top-n", nargs="+", type=int, default=[5, 50, 100, 500])
+    parser.add_argument("--rebalance", nargs="+", default=["D", "W", "M", "Q"], choices=list(REBALANCE_PERIODS))
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--output", default=None, help="Also write the comparison table to this CSV file")
+    args = parser.parse_args()
+
+    grid = build_grid(args.strategies, args.top_n, args.rebalance)
+    table = run_backtests(args.start, args.end, grid, workers=args.workers)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(table.to_string(index=False, float_format=lambda value: f"{value:.4f}"))
+    if args.output:
+        table.to_csv(args.output, index=False)
+        logger.info(f"Wrote {args.output}")
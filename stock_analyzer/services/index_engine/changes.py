@@ -0,0 +1,133 @@
+# services/index_engine/changes.py
+
+import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from shared.db import DatabaseManager
+from shared.logger_config import setup_logger
+from shared.trading_calendar import to_date
+
+logger = setup_logger("CompositionChanges")
+
+
+class CompositionChangeDetector:
+    """
+    Diffs each session's constituents against the previous session's and stores the
+    added/removed tickers and one-way turnover (half the summed absolute weight
+    changes) in index_composition_changes.
+
+    Tickers are mapped to integer codes with one factorize over the window, and the
+    window becomes a dense (sessions x tickers) weight matrix; membership is weight > 0,
+    so additions, removals and turnover for every session fall out of one shifted
+    comparison. Runs start from the last date already stored for the index, which is
+    read again only as the baseline for the next session.
+    """
+
+    def __init__(self, db: Optional[DatabaseManager] = None):
+        self.db = db or DatabaseManager()
+
+    def last_processed(self, index_type: str) -> Optional[datetime.date]:
+        df = self.db.execute_query(
+            "SELECT MAX(date) AS date FROM index_composition_changes WHERE index_type = %s", (index_type,)
+        )
+        return None if df.empty or pd.isna(df['date'].iloc[0]) else to_date(df['date'].iloc[0])
+
+    def detect(self, index_type: str, end: Optional[str] = None) -> pd.DataFrame:
+        """Records the changes for every composition date after the last processed one, up to `end`."""
+        last = self.last_processed(index_type)
+        end = to_date(end) if end else datetime.date.max
+        compositions = self.db.execute_query(
+            """
+            SELECT date, ticker, weight FROM index_composition_current
+            WHERE index_type = %s AND date >= %s AND date <= %s
+            """,
+            (index_type, last or datetime.date.min, end)
+        )
+        if compositions.empty:
+            logger.info(f"{index_type}: no compositions after {last}.")
+            return pd.DataFrame()
+
+        changes = self.diff(compositions)
+        if last is not None:
+            # The last processed date was only read as the baseline
+            changes = changes[changes['date'] > last]
+        if changes.empty:
+            logger.info(f"{index_type}: composition changes are up to date through {last}.")
+            return changes
+
+        if not self._persist(index_type, changes):
+            return pd.DataFrame()
+        changed = changes[changes['added'].str.len() + changes['removed'].str.len() > 0]
+        logger.info(f"{index_type}: {len(changes)} sessions diffed through {changes['date'].iloc[-1]}, "
+                    f"{len(changed)} with constituent changes.")
+        return changes
+
+    def sync(self, index_type: str, rebuilt_from: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """
+        Call after compositions were (re)built from `rebuilt_from` onwards: drops the
+        stored changes from that date on, so they are diffed again against the session
+        before it, then detects as usual.
+        """
+        if rebuilt_from:
+            self.db.execute_write(
+                "DELETE FROM index_composition_changes WHERE index_type = %s AND date >= %s",
+                (index_type, rebuilt_from)
+            )
+        return self.detect(index_type, end)
+
+    @staticmethod
+    def diff(compositions: pd.DataFrame) -> pd.DataFrame:
+        """
+        (date, ticker, weight) rows -> one row per date with prev_date, symbols,
+        prev_symbols, added, removed and turnover. The first date has no previous
+        session: everything is added and turnover is NaN.
+        """
+        date_codes, dates = pd.factorize(compositions['date'], sort=True)
+        ticker_codes, tickers = pd.factorize(compositions['ticker'], sort=True)
+        tickers = np.asarray(tickers, dtype=object)
+
+        weights = np.zeros((len(dates), len(tickers)))
+        weights[date_codes, ticker_codes] = compositions['weight'].to_numpy(dtype=float)
+        previous = np.vstack([np.zeros((1, len(tickers))), weights[:-1]])
+        members, previous_members = weights > 0, previous > 0
+
+        turnover = 0.5 * np.abs(weights - previous).sum(axis=1)
+        turnover[0] = np.nan
+
+        def tickers_by_row(mask: np.ndarray) -> list:
+            rows, columns = np.nonzero(mask)  # row-major, so each row's tickers stay sorted
+            return [list(part) for part in np.split(tickers[columns], np.searchsorted(rows, np.arange(1, len(dates))))]
+
+        symbols = tickers_by_row(members)
+        return pd.DataFrame({
+            'date': [to_date(day) for day in dates],
+            'prev_date': [None] + [to_date(day) for day in dates[:-1]],
+            'symbols': [','.join(row) for row in symbols],
+            'prev_symbols': [None] + [','.join(row) for row in symbols[:-1]],
+            'added': tickers_by_row(members & ~previous_members),
+            'removed': tickers_by_row(previous_members & ~members),
+            'turnover': turnover,
+        })
+
+    def _persist(self, index_type: str, changes: pd.DataFrame) -> bool:
+        query = """
+            INSERT INTO index_composition_changes
+                (index_type, date, symbols, prev_date, prev_symbols, added, removed, turnover, update_time)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (index_type, date) DO UPDATE SET
+                symbols = EXCLUDED.symbols, prev_date = EXCLUDED.prev_date, prev_symbols = EXCLUDED.prev_symbols,
+                added = EXCLUDED.added, removed = EXCLUDED.removed, turnover = EXCLUDED.turnover,
+                update_time = EXCLUDED.update_time
+        """
+        rows = [
+            (index_type, row.date, row.symbols, row.prev_date, row.prev_symbols, row.added, row.removed,
+             None if pd.isna(row.turnover) else float(row.turnover))
+            for row in changes.itertuples(index=False)
+        ]
+        if self.db.execute_transaction([(query, rows)]) is None:
+            logger.error(f"{index_type}: failed to store {len(rows)} composition changes.")
+            return False
+        return True
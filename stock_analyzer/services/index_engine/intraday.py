@@ -0,0 +1,227 @@
+# services/index_engine/intraday.py
+
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Allow `python services/index_engine/intraday.py` from the project root
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+from shared.db import DatabaseManager
+from shared.logger_config import setup_logger
+from shared.migrations import run_migrations
+from shared.weighting_strategies import strategy_names
+
+logger = setup_logger("IntradayIndex")
+
+# Minimum seconds of bar time between two published levels
+PUBLISH_SECONDS = float(os.getenv("INTRADAY_PUBLISH_SECONDS", "60"))
+# Batches between full re-sums of the market values, so rounding in the deltas cannot accumulate
+RESUM_EVERY = int(os.getenv("INTRADAY_RESUM_EVERY", "1000"))
+
+
+@dataclass
+class BarBatch:
+    """Closes of the minute bars that arrived together, as parallel arrays."""
+    timestamp: int  # bar end, epoch milliseconds
+    tickers: np.ndarray
+    closes: np.ndarray
+
+
+def _valid_event(event: dict) -> bool:
+    close, end = event.get('c'), event.get('e')
+    return (event.get('ev', 'AM') in ('AM', 'A') and isinstance(event.get('sym'), str)
+            and isinstance(close, (int, float)) and not isinstance(close, bool)
+            and isinstance(end, int) and not isinstance(end, bool))
+
+
+def replay_feed(path: str) -> Iterator[BarBatch]:
+    """
+    Minute aggregates from a JSON-lines file of Polygon stream messages, one event or
+    a list of events per line ({"ev": "AM", "sym": ..., "c": ..., "e": ...}).
+    Consecutive events with the same bar end are one batch; malformed events are skipped.
+    """
+    timestamp, tickers, closes = None, [], []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            message = json.loads(line)
+            for event in message if isinstance(message, list) else [message]:
+                if not _valid_event(event):
+                    continue
+                if event['e'] != timestamp and tickers:
+                    yield BarBatch(timestamp, np.array(tickers, dtype=object), np.array(closes))
+                    tickers, closes = [], []
+                timestamp = event['e']
+                tickers.append(event['sym'])
+                closes.append(float(event['c']))
+    if tickers:
+        yield BarBatch(timestamp, np.array(tickers, dtype=object), np.array(closes))
+
+
+def mock_feed(tickers: Sequence[str], closes: np.ndarray, batches: int, tickers_per_batch: int,
+              interval_ms: int = 1000, start_ms: Optional[int] = None, seed: int = 0) -> Iterator[BarBatch]:
+    """Random-walk closes for `tickers_per_batch` random tickers every `interval_ms`, for demos and load tests."""
+    rng = np.random.default_rng(seed)
+    tickers = np.asarray(tickers, dtype=object)
+    prices = np.asarray(closes, dtype=float).copy()
+    timestamp = start_ms if start_ms is not None else int(time.time() * 1000)
+    size = min(tickers_per_batch, len(tickers))
+    for _ in range(batches):
+        timestamp += interval_ms
+        chosen = rng.choice(len(tickers), size=size, replace=False)
+        prices[chosen] *= np.exp(rng.normal(0.0, 0.001, size))
+        yield BarBatch(timestamp, tickers[chosen], prices[chosen])
+
+
+class IntradayCalculator:
+    """
+    Levels of several indices marked to streaming closes.
+
+    Holdings are dense arrays over the union of all constituents: units per (index,
+    ticker), the last price per ticker, and a market value and divisor per index.
+    A batch of k closes is mapped to columns with one hash lookup, and every index's
+    market value moves by units[:, columns] @ (new - old), so a batch costs
+    O(indices x k) however many constituents did not trade.
+    """
+
+    def __init__(self, index_types: Iterable[str], tickers: Sequence[str], units: np.ndarray,
+                 prices: np.ndarray, divisors: np.ndarray):
+        self.index_types = list(index_types)
+        self.columns = pd.Index(tickers)
+        self.units = units
+        self.prices = prices
+        self.divisors = divisors
+        self.market_values = units @ prices
+        self._batches = 0
+
+    @classmethod
+    def from_level_state(cls, db: Optional[DatabaseManager] = None,
+                         index_types: Optional[Iterable[str]] = None) -> "IntradayCalculator":
+        """Starts each index from its holdings and divisor after the last priced close (index_level_state)."""
+        db = db or DatabaseManager()
+        index_types = list(index_types or strategy_names())
+        state = db.execute_query(
+            "SELECT index_type, divisor, holdings FROM index_level_state WHERE index_type = ANY(%s)",
+            (index_types,)
+        )
+        if state.empty:
+            raise ValueError(f"No index_level_state for {index_types}; run the index engine first.")
+        missing = set(index_types) - set(state['index_type'])
+        if missing:
+            logger.warning(f"No priced close yet for {sorted(missing)}; they are left out.")
+
+        tickers = sorted({ticker for holdings in state['holdings'] for ticker in holdings})
+        columns = pd.Index(tickers)
+        units = np.zeros((len(state), len(tickers)))
+        prices = np.zeros(len(tickers))
+        for row, holdings in enumerate(state['holdings']):
+            positions = columns.get_indexer(list(holdings))
+            held = np.array(list(holdings.values()), dtype=float).reshape(-1, 2)
+            units[row, positions] = held[:, 0]
+            prices[positions] = held[:, 1]
+        logger.info(f"Loaded {len(state)} indices over {len(tickers)} constituents from index_level_state.")
+        return cls(state['index_type'], tickers, units, prices, state['divisor'].to_numpy(dtype=float))
+
+    def apply(self, tickers: np.ndarray, closes: np.ndarray) -> np.ndarray:
+        """Marks the batch's tickers to their new closes and returns every index's level."""
+        positions = self.columns.get_indexer(tickers)
+        closes = np.asarray(closes, dtype=float)
+        keep = (positions >= 0) & np.isfinite(closes)
+        positions, closes = positions[keep], closes[keep]
+        if len(positions):
+            # A ticker that appears twice in one batch keeps its last close
+            positions, last = np.unique(positions[::-1], return_index=True)
+            closes = closes[::-1][last]
+            self.market_values += self.units[:, positions] @ (closes - self.prices[positions])
+            self.prices[positions] = closes
+
+        self._batches += 1
+        if self._batches % RESUM_EVERY == 0:
+            self.market_values = self.units @ self.prices
+        return self.levels()
+
+    def levels(self) -> np.ndarray:
+        return self.market_values / self.divisors
+
+
+class LevelPublisher:
+    """Writes every index's level to index_intraday_levels, at most once per `cadence` seconds of bar time."""
+
+    def __init__(self, db: Optional[DatabaseManager] = None, cadence: float = PUBLISH_SECONDS):
+        self.db = db or DatabaseManager()
+        self.cadence_ms = int(cadence * 1000)
+        self.last_published: Optional[int] = None
+
+    def offer(self, timestamp: int, index_types: Sequence[str], levels: np.ndarray) -> bool:
+        """Publishes if the cadence has elapsed since the last publish. Returns whether it did."""
+        if self.last_published is not None and timestamp - self.last_published < self.cadence_ms:
+            return False
+        return self.publish(timestamp, index_types, levels)
+
+    def publish(self, timestamp: int, index_types: Sequence[str], levels: np.ndarray) -> bool:
+        query = """
+            INSERT INTO index_intraday_levels (index_type, timestamp, date, index_level, update_time)
+            SELECT index_type, %s, %s, index_level, CURRENT_TIMESTAMP
+            FROM unnest(%s::varchar[], %s::float8[]) AS l(index_type, index_level)
+            ON CONFLICT (index_type, timestamp) DO UPDATE SET
+                index_level = EXCLUDED.index_level, update_time = EXCLUDED.update_time
+        """
+        day = datetime.datetime.fromtimestamp(timestamp / 1000, tz=datetime.timezone.utc).date()
+        ok = self.db.execute_write(query, (timestamp, day, list(index_types), [float(level) for level in levels]))
+        if ok:
+            self.last_published = timestamp
+        else:
+            logger.error(f"Failed to publish intraday levels for {timestamp}.")
+        return ok
+
+
+def run_intraday(feed: Iterable[BarBatch], calculator: IntradayCalculator, publisher: LevelPublisher) -> dict:
+    """Applies every batch of the feed and publishes on cadence; the final levels are always published."""
+    started = time.perf_counter()
+    batches = bars = 0
+    last_timestamp, published = None, False
+    for batch in feed:
+        levels = calculator.apply(batch.tickers, batch.closes)
+        published = publisher.offer(batch.timestamp, calculator.index_types, levels)
+        last_timestamp = batch.timestamp
+        batches += 1
+        bars += len(batch.tickers)
+    if last_timestamp is not None and not published:
+        publisher.publish(last_timestamp, calculator.index_types, calculator.levels())
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    logger.info(f"Processed {bars} bars in {batches} batches in {elapsed:.2f}s ({bars / elapsed:,.0f} bars/s).")
+    for index_type, level in zip(calculator.index_types, calculator.levels()):
+        logger.info(f"{index_type}: {level:.4f}")
+    return {"batches": batches, "bars": bars, "seconds": elapsed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Intraday index levels from minute bars")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--replay", metavar="PATH", help="JSON-lines file of minute aggregate events")
+    source.add_argument("--mock-batches", type=int, help="Generate this many random-walk batches instead")
+    parser.add_argument("--mock-tickers-per-batch", type=int, default=1000)
+    parser.add_argument("--publish-seconds", type=float, default=PUBLISH_SECONDS,
+                        help="Bar-time seconds between published levels")
+    parser.add_argument("--index-types", nargs="+", default=None, help="Registered index types (default: all)")
+    args = parser.parse_args()
+
+    run_migrations()
+    db = DatabaseManager()
+    calculator = IntradayCalculator.from_level_state(db, args.index_types)
+    if args.replay:
+        feed = replay_feed(args.replay)
+    else:
+        feed = mock_feed(calculator.columns, calculator.prices, args.mock_batches, args.mock_tickers_per_batch)
+    run_intraday(feed, calculator, LevelPublisher(db, args.publish_seconds))
@@ -2,83 +2,179 @@
 
 import os
 import sys
+import argparse
 import requests
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import timedelta
 from pathlib import Path
+from typing import Iterable, Optional
 from dotenv import load_dotenv
 
 # Allow importing from the shared directory
 sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
 from shared.db import DatabaseManager
 from shared.logger_config import setup_logger
+from shared.migrations import run_migrations
+from shared.payload_cache import PayloadCache
+from shared.query_stats import QUERY_STATS
+from shared.rebalance import REBALANCE_PERIODS, RebalanceSchedule
+from shared.trading_calendar import TradingCalendar, to_date
+from shared.universe import UNIVERSE_COLUMNS, load_universe
+from shared.universe_cache import select_top_n
+from shared.weighting_strategies import get_strategy, required_columns, strategy_names
+from services.index_engine.changes import CompositionChangeDetector
+from services.index_engine.performance import IndexLevelTracker
+from services.index_engine.risk import RiskAnalytics
 
 logger = setup_logger("IndexEngine")
 
 class IndexConstructor:
-    def __init__(self):
-        self.db = DatabaseManager()
+    def __init__(self, db: Optional[DatabaseManager] = None, schedule: Optional[RebalanceSchedule] = None):
+        self.db = db or DatabaseManager()
+        self.schedule = schedule or RebalanceSchedule()
 
     def construct_equal_weighted_index(self, date: str, top_n: int = 5) -> pd.DataFrame:
-        query = """
-        SELECT td.market_cap, td.ticker, sp.close as close_price
-        FROM ticker_details td 
-        JOIN stock_prices sp ON td.ticker = sp.ticker
-        WHERE sp.date = %s AND td.market_cap IS NOT NULL 
-        ORDER BY td.market_cap DESC LIMIT %s
-        """
-        # .copy() prevents ChainedAssignmentErrors in Pandas 3.0+
-        top_stocks = self.db.execute_query(query, (date, top_n)).copy()
-
+        top_stocks = self.construct_range(date, date, 'Equal Weighted', top_n, sessions=[date])
         if top_stocks.empty:
             logger.warning(f"EW Construction aborted: No price/metadata overlap found for {date}.")
-            return pd.DataFrame()
-
-        # Using .loc for explicit assignment
-        equal_weight = 1 / len(top_stocks)
-        top_stocks.loc[:, 'weight'] = equal_weight
-        top_stocks.loc[:, 'date'] = date
-        top_stocks.loc[:, 'index_type'] = 'Equal Weighted'
-
-        self._bulk_insert_composition(top_stocks)
-        logger.info(f"Constructed Equal-Weighted index for {date} ({len(top_stocks)} constituents).")
         return top_stocks
 
     def construct_market_cap_weighted_index(self, date: str, top_n: int = 5) -> pd.DataFrame:
-        query = """
-        SELECT td.market_cap, td.ticker, sp.close as close_price
-        FROM ticker_details td 
-        JOIN stock_prices sp ON td.ticker = sp.ticker
-        WHERE sp.date = %s AND td.market_cap IS NOT NULL 
-        ORDER BY td.market_cap DESC LIMIT %s
+        top_stocks = self.construct_range(date, date, 'Market-Cap Weighted', top_n, sessions=[date])
+        if top_stocks.empty:
+            logger.warning(f"MCW Construction aborted: No price/metadata overlap found for {date}.")
+        return top_stocks
+
+    def load_universe(self, start: str, end: str, sessions: Optional[Iterable] = None,
+                      extra_columns: Iterable[str] = ()) -> pd.DataFrame:
+        """The (date, ticker, market_cap, close_price, ...) panel for [start, end]; see shared.universe.load_universe."""
+        return load_universe(self.db, start, end, sessions, extra_columns)
+
+    @staticmethod
+    def rank_top_n(panel: pd.DataFrame, top_n: int) -> pd.DataFrame:
+        """
+        The top_n tickers by market cap on every date, largest first; ties break on
+        ticker so reruns agree. Each date is a partial selection (select_top_n), so
+        only the winners are sorted rather than the whole universe.
         """
-        top_stocks = self.db.execute_query(query, (date, top_n)).copy()
+        if panel.empty:
+            return panel.reset_index(drop=True)
+        panel = panel.sort_values('date', kind='stable')
+        dates = panel['date'].to_numpy()
+        caps = panel['market_cap'].to_numpy(dtype=float)
+        names = panel['ticker'].to_numpy(dtype=object)
+        bounds = np.flatnonzero(dates[1:] != dates[:-1]) + 1
+        rows = [start + select_top_n(caps[start:stop], names[start:stop], top_n)
+                for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(panel)])]
+        return panel.iloc[np.concatenate(rows)].reset_index(drop=True)
+
+    def construct_range(self, start: str, end: str, index_type: str, top_n: int = 5,
+                        sessions: Optional[Iterable] = None) -> pd.DataFrame:
+        """Builds one index type on every rebalance date in [start, end] (or just `sessions`)."""
+        return self.construct_all_indices(start, end, top_n, index_types=[index_type], sessions=sessions)
 
+    def construct_all_indices(self, start: str, end: str, top_n: int = 5,
+                              index_types: Optional[Iterable[str]] = None,
+                              sessions: Optional[Iterable] = None) -> pd.DataFrame:
+        """
+        Builds every registered weighting strategy in `index_types` (default: all of
+        them) on every priced rebalance date of the schedule in [start, end], or just
+        `sessions`. The universe is read and ranked once, with the extra columns the
+        chosen strategies need; each strategy only adds a weight column to the same
+        top-N panel, and all of the compositions are written in one transaction. A full
+        range build also clears compositions left in it by an earlier schedule.
+        Returns the compositions stacked, with an `index_type` column.
+        """
+        replace_range = None
+        if sessions is None:
+            sessions = self.schedule.dates(start, end)
+            replace_range = (start, end)
+        strategies = [get_strategy(name) for name in (strategy_names() if index_types is None else index_types)]
+        extra_columns = required_columns(strategy.name for strategy in strategies)
+
+        top_stocks = self.rank_top_n(self.load_universe(start, end, sessions, extra_columns), top_n)
         if top_stocks.empty:
-            logger.warning(f"MCW Construction aborted: No price/metadata overlap found for {date}.")
+            logger.warning(f"Construction aborted: no price/metadata overlap between {start} and {end}.")
             return pd.DataFrame()
+        top_stocks['date'] = pd.to_datetime(top_stocks['date']).dt.date
 
-        total_market_cap = top_stocks['market_cap'].sum()
-        
-        # Using .loc to ensure we are modifying the copy properly
-        top_stocks.loc[:, 'weight'] = top_stocks['market_cap'] / total_market_cap
-        top_stocks.loc[:, 'date'] = date
-        top_stocks.loc[:, 'index_type'] = 'Market-Cap Weighted'
-
-        self._bulk_insert_composition(top_stocks)
-        logger.info(f"Constructed Market-Cap Weighted index for {date} ({len(top_stocks)} constituents).")
-        return top_stocks
+        compositions = pd.concat(
+            [top_stocks[UNIVERSE_COLUMNS].assign(weight=strategy.weigh(top_stocks), index_type=strategy.name)
+             for strategy in strategies],
+            ignore_index=True
+        )
+        self._bulk_insert_composition(compositions, replace_range)
+        logger.info(f"Constructed {', '.join(s.name for s in strategies)} for {top_stocks['date'].nunique()} sessions "
+                    f"between {start} and {end} ({len(compositions)} constituent rows).")
+        return compositions
 
-    def _bulk_insert_composition(self, df: pd.DataFrame):
-        """Helper to insert index composition data into PostgreSQL."""
-        insert_query = """
+    def _bulk_insert_composition(self, df: pd.DataFrame, replace_range: Optional[tuple] = None):
+        """
+        Appends the new version to index_composition and replaces the same
+        (index_type, date) in index_composition_current, in one transaction.
+        With replace_range=(start, end), every current row of those index types in the
+        range is replaced instead, so dates that are no longer rebalances drop out.
+        Each statement ships whole columns as arrays and unnests them server-side,
+        so a year of constituents is three statements rather than three per row.
+        """
+        composition_arrays = """
+            unnest(%s::date[], %s::varchar[], %s::float8[], %s::float8[], %s::float8[], %s::varchar[])
+                AS c(date, ticker, close_price, weight, market_cap, index_type)
+        """
+        insert_query = f"""
             INSERT INTO index_composition (date, ticker, close_price, weight, market_cap, index_type)
-            VALUES (%s, %s, %s, %s, %s, %s)
+            SELECT * FROM {composition_arrays}
             ON CONFLICT (date, ticker, index_type, update_time) DO NOTHING;
         """
-        for _, row in df.iterrows():
-            params = (row['date'], row['ticker'], row['close_price'], row['weight'], row['market_cap'], row['index_type'])
-            self.db.execute_write(insert_query, params)
+        clear_current = """
+            DELETE FROM index_composition_current cur
+            USING unnest(%s::varchar[], %s::date[]) AS k(index_type, date)
+            WHERE cur.index_type = k.index_type AND cur.date = k.date
+        """
+        # CURRENT_TIMESTAMP is the transaction start, so it matches the history rows' update_time
+        insert_current = f"""
+            INSERT INTO index_composition_current (date, ticker, close_price, weight, market_cap, index_type, update_time)
+            SELECT *, CURRENT_TIMESTAMP FROM {composition_arrays};
+        """
+        columns = tuple(
+            df[column].astype(object).where(df[column].notna(), None).tolist()
+            for column in ['date', 'ticker', 'close_price', 'weight', 'market_cap', 'index_type']
+        )
+        if replace_range:
+            clear_current = """
+                DELETE FROM index_composition_current
+                WHERE index_type = ANY(%s) AND date BETWEEN %s AND %s
+            """
+            clear_params = (df['index_type'].unique().tolist(), *replace_range)
+        else:
+            keys = df[['index_type', 'date']].drop_duplicates()
+            clear_params = (keys['index_type'].tolist(), keys['date'].tolist())
+        if self.db.execute_transaction([(insert_query, [columns]), (clear_current, [clear_params]),
+                                        (insert_current, [columns])]) is None:
+            logger.error(f"{len(df)} composition rows failed to insert.")
+
+    def compact_history(self, start: str, end: str, keep_versions: Optional[int] = None):
+        """
+        Retention for the append-only history tables: keeps the newest keep_versions
+        builds per (index_type, date) in [start, end] and deletes older ones. The
+        *_current tables are untouched, since they only hold the newest build.
+        """
+        keep_versions = max(1, keep_versions or int(os.getenv("INDEX_HISTORY_VERSIONS", "3")))
+        for table in ("index_composition", "index_performance"):
+            query = f"""
+                DELETE FROM {table} h
+                USING (
+                    SELECT index_type, date, update_time,
+                           DENSE_RANK() OVER (PARTITION BY index_type, date ORDER BY update_time DESC) AS version
+                    FROM (SELECT DISTINCT index_type, date, update_time FROM {table}
+                          WHERE date BETWEEN %s AND %s) v
+                ) old
+                WHERE old.version > %s
+                  AND h.index_type = old.index_type AND h.date = old.date AND h.update_time = old.update_time
+            """
+            if not self.db.execute_write(query, (start, end, keep_versions)):
+                logger.error(f"Compaction of {table} between {start} and {end} failed.")
 
 
 def seed_test_ticker_details():
@@ -86,55 +182,114 @@ def seed_test_ticker_details():
     load_dotenv()
     api_key = os.getenv("POLYGON_API_KEY")
     db = DatabaseManager()
+    cache = PayloadCache()
     tickers = ["AAPL", "MSFT", "NVDA", "GOOGL", "AMZN"]
     
     logger.info("Seeding test metadata for JOIN dependencies...")
+    query = """
+        INSERT INTO ticker_details (ticker, active, name, market, market_cap)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (ticker) DO UPDATE SET market_cap = EXCLUDED.market_cap;
+    """
+    rows = []
     for ticker in tickers:
-        url = f"https://api.polygon.io/v3/reference/tickers/{ticker}?apiKey={api_key}"
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json().get('results', {})
-            query = """
-                INSERT INTO ticker_details (ticker, active, name, market, market_cap)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (ticker) DO UPDATE SET market_cap = EXCLUDED.market_cap;
-            """
-            params = (data.get('ticker'), data.get('active'), data.get('name'), data.get('market'), data.get('market_cap'))
-            db.execute_write(query, params)
-    logger.info("Metadata seeding complete.")
+        # Same cache key as the ingestion service, so either one can warm it
+        payload = cache.get_json("ticker_details", {"ticker": ticker})
+        if payload is None:
+            url = f"https://api.polygon.io/v3/reference/tickers/{ticker}?apiKey={api_key}"
+            response = requests.get(url)
+            if response.status_code == 200:
+                cache.put("ticker_details", {"ticker": ticker}, response.content)
+                payload = response.json()
+        if payload is not None:
+            data = payload.get('results', {})
+            rows.append((data.get('ticker'), data.get('active'), data.get('name'), data.get('market'), data.get('market_cap')))
+    # Skip rows that are already current: every write bumps the universe version and
+    # would invalidate the API's universe cache for nothing
+    existing = db.execute_query(
+        "SELECT ticker, market_cap FROM ticker_details WHERE ticker = ANY(%s)", ([row[0] for row in rows],)
+    )
+    current = {} if existing.empty else dict(zip(existing['ticker'], existing['market_cap']))
+    rows = [row for row in rows
+            if row[0] not in current or current[row[0]] is None or row[4] is None
+            or float(current[row[0]]) != float(row[4])]
+    if not rows:
+        logger.info("Test metadata already up to date; nothing to seed.")
+        return
+    result = db.execute_batch(query, rows)
+    logger.info(f"Metadata seeding complete ({result.succeeded}/{len(rows)} tickers upserted).")
 
 if __name__ == "__main__":
-    engine = IndexConstructor()
+    parser = argparse.ArgumentParser(description="Index construction engine")
+    parser.add_argument("--start", help="Rebuild every priced session from this date (YYYY-MM-DD) and exit")
+    parser.add_argument("--end", help="Last session of the rebuild (default: previous session)")
+    parser.add_argument("--top-n", type=int, default=5, help="Constituents per index")
+    parser.add_argument("--rebalance", choices=list(REBALANCE_PERIODS), default=None,
+                        help="Reconstitution frequency (default: INDEX_REBALANCE_FREQUENCY)")
+    args = parser.parse_args()
+
+    run_migrations()
+    engine = IndexConstructor(schedule=RebalanceSchedule(args.rebalance))
     
     try:
         # 1. Seed the metadata table
         seed_test_ticker_details()
         
-        # 2. Get target date
-        today = datetime.now()
-        if today.weekday() == 5: target_date = today - timedelta(days=1)
-        elif today.weekday() == 6: target_date = today - timedelta(days=2)
-        elif today.weekday() == 0: target_date = today - timedelta(days=3)
-        else: target_date = today - timedelta(days=1)
-        
-        date_str = target_date.strftime("%Y-%m-%d")
-        
-        # 3. Run the engine
-        logger.info(f"Triggering Engine for date: {date_str}")
-        
-        ew_df = engine.construct_equal_weighted_index(date_str, top_n=5)
-        mcw_df = engine.construct_market_cap_weighted_index(date_str, top_n=5)
+        # 2. Find rebalance dates that have prices but no composition yet
+        calendar = TradingCalendar()
+        end = calendar.previous_session() if args.end is None else to_date(args.end)
+        if args.start:
+            # Explicit range: rebuild every index type in it from one panel read
+            engine.construct_all_indices(args.start, str(end), top_n=args.top_n)
+            tracker, changes = IndexLevelTracker(engine.db), CompositionChangeDetector(engine.db)
+            for index_type in strategy_names():
+                tracker.sync(index_type, rebuilt_from=args.start, end=str(end))
+                changes.sync(index_type, rebuilt_from=args.start, end=str(end))
+            # After every level is priced, so betas see the whole benchmark series
+            risk = RiskAnalytics(engine.db)
+            for index_type in strategy_names():
+                risk.sync(index_type, rebuilt_from=args.start, end=str(end))
+            engine.compact_history(args.start, str(end))
+            sys.exit(0)
+
+        start = end - timedelta(days=int(os.getenv("ENGINE_LOOKBACK_DAYS", "10")))
+        priced_sessions = calendar.present_dates(engine.db, "stock_prices", start, end)
         
-        if not ew_df.empty:
-            print("\n--- Equal Weighted Output ---")
-            print(ew_df[['ticker', 'weight', 'close_price']])
+        # 3. Run the engine only for those sessions; between rebalances the weights just drift
+        rebalance_dates = set(engine.schedule.dates(start, end))
+        pending = sorted({
+            day
+            for index_type in strategy_names()
+            for day in calendar.missing_sessions(engine.db, "index_composition_current", start, end, index_type)
+            if day in priced_sessions and day in rebalance_dates
+        })
+        if not pending:
+            logger.info(f"Compositions are up to date through {end} ({engine.schedule.frequency} rebalances).")
+        else:
+            # Every scheme is rebuilt for any session one of them is missing; they share the same read
+            logger.info(f"Triggering Engine on {len(pending)} sessions ({pending[0]} -> {pending[-1]})")
+            df = engine.construct_all_indices(str(pending[0]), str(pending[-1]), top_n=args.top_n, sessions=pending)
+            if not df.empty:
+                for (index_type, day), constituents in df.groupby(['index_type', 'date']):
+                    print(f"\n--- {index_type} Output ({day}) ---")
+                    print(constituents[['ticker', 'weight', 'market_cap', 'close_price']])
+
+        # 4. Extend each index level, change log and risk series from where the last run left off
+        tracker, changes = IndexLevelTracker(engine.db), CompositionChangeDetector(engine.db)
+        rebuilt_from = str(pending[0]) if pending else None
+        for index_type in strategy_names():
+            tracker.sync(index_type, rebuilt_from=rebuilt_from, end=str(end))
+            changes.sync(index_type, rebuilt_from=rebuilt_from, end=str(end))
+        risk = RiskAnalytics(engine.db)
+        for index_type in strategy_names():
+            risk.sync(index_type, rebuilt_from=rebuilt_from, end=str(end))
 
-        if not mcw_df.empty:
-            print("\n--- Market-Cap Weighted Output ---")
-            print(mcw_df[['ticker', 'weight', 'market_cap']])
+        # 5. Drop superseded builds so the history tables stop growing with every rerun
+        engine.compact_history(str(start), str(end))
 
     finally:
+        QUERY_STATS.log_summary()
         if hasattr(engine.db, '_connection_pool') and engine.db._connection_pool:
             logger.info("Closing database connection pool...")
             # Change .closeall() to .close() for psycopg 3
-            engine.db._connection_pool.close()
\ No newline at end of file
+            engine.db._connection_pool.close()
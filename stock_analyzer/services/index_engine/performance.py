@@ -0,0 +1,192 @@
+# services/index_engine/performance.py
+
+import datetime
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import pandas as pd
+from psycopg.types.json import Jsonb
+
+from shared.db import DatabaseManager
+from shared.logger_config import setup_logger
+from shared.trading_calendar import to_date
+
+logger = setup_logger("IndexPerformance")
+
+BASE_LEVEL = 100.0
+
+
+@dataclass
+class LevelState:
+    """An index at one close: level = sum(units * close) / divisor."""
+    index_type: str
+    date: datetime.date
+    level: float
+    divisor: float
+    # ticker -> [units held since the last rebalance, last seen close]
+    holdings: Dict[str, List[float]] = field(default_factory=dict)
+
+    def market_value(self) -> float:
+        return sum(units * close for units, close in self.holdings.values())
+
+
+class IndexLevelTracker:
+    """
+    Divisor-based index levels, computed incrementally.
+
+    Each composition in index_composition_current is a rebalance at that session's
+    close: the new weights are turned into units (weight / close), and the divisor is
+    reset so the level is unchanged by the switch. Between rebalances the level moves
+    only with the held constituents' closes. The level, divisor and holdings after the
+    last priced session are kept in index_level_state, so a daily run reads the new
+    sessions' compositions and prices and nothing older.
+    """
+
+    def __init__(self, db: Optional[DatabaseManager] = None):
+        self.db = db or DatabaseManager()
+
+    def load_state(self, index_type: str) -> Optional[LevelState]:
+        df = self.db.execute_query(
+            "SELECT date, index_level, divisor, holdings FROM index_level_state WHERE index_type = %s",
+            (index_type,)
+        )
+        if df.empty:
+            return None
+        row = df.iloc[0]
+        return LevelState(index_type, to_date(row['date']), row['index_level'], row['divisor'], dict(row['holdings']))
+
+    def update(self, index_type: str, end: Optional[str] = None) -> pd.DataFrame:
+        """
+        Prices every session after the stored state up to `end` (default: all available)
+        and persists the new levels and state in one transaction. Without a stored
+        state the index starts at BASE_LEVEL on its first composition date.
+        Returns the new (date, index_price, daily_return) rows.
+        """
+        state = self.load_state(index_type)
+        after = state.date if state else datetime.date.min
+        end = to_date(end) if end else datetime.date.max
+
+        compositions = self.db.execute_query(
+            """
+            SELECT date, ticker, weight, close_price FROM index_composition_current
+            WHERE index_type = %s AND date > %s AND date <= %s
+            """,
+            (index_type, after, end)
+        )
+        tickers = set(state.holdings) if state else set()
+        if not compositions.empty:
+            tickers |= set(compositions['ticker'])
+        if not tickers:
+            logger.info(f"{index_type}: no compositions to price after {after}.")
+            return pd.DataFrame()
+
+        prices = self.db.execute_query(
+            """
+            SELECT date, ticker, close FROM stock_prices
+            WHERE date > %s AND date <= %s AND ticker = ANY(%s) AND close IS NOT NULL
+            """,
+            (after, end, sorted(tickers))
+        )
+        closes_by_date = {
+            to_date(day): dict(zip(group['ticker'], group['close']))
+            for day, group in (prices.groupby('date') if not prices.empty else [])
+        }
+        rebalances = {
+            to_date(day): group
+            for day, group in (compositions.groupby('date') if not compositions.empty else [])
+        }
+
+        rows = []
+        for day in sorted(set(closes_by_date) | set(rebalances)):
+            if state is None:
+                if day not in rebalances:
+                    continue  # not started yet
+                level, daily_return = BASE_LEVEL, 0.0
+            else:
+                level, daily_return = self._advance(state, closes_by_date.get(day, {}))
+
+            if day in rebalances:
+                holdings, divisor = self._rebalance(rebalances[day], level)
+            else:
+                holdings, divisor = state.holdings, state.divisor
+            state = LevelState(index_type, day, level, divisor, holdings)
+            rows.append((day, level, daily_return))
+
+        if not rows:
+            logger.info(f"{index_type}: level is up to date through {after}.")
+            return pd.DataFrame()
+
+        if not self._persist(state, rows):
+            return pd.DataFrame()
+        logger.info(f"{index_type}: priced {len(rows)} sessions through {state.date} (level {state.level:.4f}).")
+        return pd.DataFrame(rows, columns=['date', 'index_price', 'daily_return']).assign(index_type=index_type)
+
+    def rebuild(self, index_type: str, end: Optional[str] = None) -> pd.DataFrame:
+        """Discards the stored state and current levels, then prices the whole history again."""
+        cleared = self.db.execute_transaction([
+            ("DELETE FROM index_level_state WHERE index_type = %s", [(index_type,)]),
+            ("DELETE FROM index_performance_current WHERE index_type = %s", [(index_type,)]),
+        ])
+        if cleared is None:
+            return pd.DataFrame()
+        return self.update(index_type, end)
+
+    def sync(self, index_type: str, rebuilt_from: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """
+        Call after compositions were (re)built from `rebuilt_from` onwards: rebuilds the
+        levels if that reaches back into already priced sessions, otherwise updates.
+        """
+        state = self.load_state(index_type)
+        if state and rebuilt_from and to_date(rebuilt_from) <= state.date:
+            logger.info(f"{index_type}: compositions from {rebuilt_from} were rebuilt, repricing from the start.")
+            return self.rebuild(index_type, end)
+        return self.update(index_type, end)
+
+    @staticmethod
+    def _advance(state: LevelState, closes: Dict[str, float]):
+        """Marks the holdings to today's closes; a ticker with no print keeps its last close."""
+        for ticker, position in state.holdings.items():
+            if ticker in closes:
+                position[1] = float(closes[ticker])
+        level = state.market_value() / state.divisor
+        return level, level / state.level - 1
+
+    @staticmethod
+    def _rebalance(composition: pd.DataFrame, level: float):
+        """New units from the weights at this close, and the divisor that keeps `level` unchanged."""
+        holdings = {
+            ticker: [float(weight) / float(close), float(close)]
+            for ticker, weight, close in composition[['ticker', 'weight', 'close_price']].itertuples(index=False)
+        }
+        market_value = sum(units * close for units, close in holdings.values())
+        return holdings, market_value / level
+
+    def _persist(self, state: LevelState, rows: list) -> bool:
+        dates, levels, returns = (list(column) for column in zip(*rows))
+        performance_arrays = """
+            unnest(%s::date[], %s::float8[], %s::float8[]) AS p(date, index_price, daily_return)
+        """
+        statements = [
+            (f"""
+                INSERT INTO index_performance (date, index_price, daily_return, index_type)
+                SELECT date, index_price, daily_return, %s FROM {performance_arrays}
+            """, [(state.index_type, dates, levels, returns)]),
+            (f"""
+                INSERT INTO index_performance_current (index_type, date, index_price, daily_return, update_time)
+                SELECT %s, date, index_price, daily_return, CURRENT_TIMESTAMP FROM {performance_arrays}
+                ON CONFLICT (index_type, date) DO UPDATE SET
+                    index_price = EXCLUDED.index_price, daily_return = EXCLUDED.daily_return,
+                    update_time = EXCLUDED.update_time
+            """, [(state.index_type, dates, levels, returns)]),
+            ("""
+                INSERT INTO index_level_state (index_type, date, index_level, divisor, holdings, update_time)
+                VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (index_type) DO UPDATE SET
+                    date = EXCLUDED.date, index_level = EXCLUDED.index_level, divisor = EXCLUDED.divisor,
+                    holdings = EXCLUDED.holdings, update_time = EXCLUDED.update_time
+            """, [(state.index_type, state.date, state.level, state.divisor, Jsonb(state.holdings))]),
+        ]
+        if self.db.execute_transaction(statements) is None:
+            logger.error(f"{state.index_type}: failed to persist {len(rows)} index levels.")
+            return False
+        return True
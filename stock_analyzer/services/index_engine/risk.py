@@ -0,0 +1,187 @@
+# services/index_engine/risk.py
+
+import datetime
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from shared.db import DatabaseManager
+from shared.logger_config import setup_logger
+from shared.trading_calendar import to_date
+
+logger = setup_logger("RiskAnalytics")
+
+TRADING_DAYS = 252
+# Rolling volatility windows, in sessions; each has its own column in index_risk_metrics
+VOLATILITY_WINDOWS = (20, 60, 252)
+SHARPE_WINDOW = 252
+# Index the rolling beta is measured against, and over how many sessions
+RISK_BENCHMARK = os.getenv("INDEX_RISK_BENCHMARK", "Market-Cap Weighted")
+BETA_WINDOW = int(os.getenv("INDEX_BETA_WINDOW", "60"))
+# Annual risk-free rate subtracted from daily returns in the Sharpe ratio
+RISK_FREE_RATE = float(os.getenv("RISK_FREE_RATE", "0.0"))
+
+METRIC_COLUMNS = [f"volatility_{window}" for window in VOLATILITY_WINDOWS] + [
+    "sharpe_252", "beta", "peak_level", "drawdown", "max_drawdown"
+]
+
+
+class RiskAnalytics:
+    """
+    Rolling risk figures for every index series, stored per session in
+    index_risk_metrics so the API serves them without touching the full history.
+
+    Every metric is a vectorized pandas pass (rolling std/mean/cov, cummax) over one
+    read of index_performance_current. A daily run only reads back the longest window
+    before the last stored session; the running peak and max drawdown carry on from
+    that session's row.
+    """
+
+    def __init__(self, db: Optional[DatabaseManager] = None, benchmark: str = RISK_BENCHMARK):
+        self.db = db or DatabaseManager()
+        self.benchmark = benchmark
+
+    def last_row(self, index_type: str) -> Optional[pd.Series]:
+        df = self.db.execute_query(
+            """
+            SELECT date, peak_level, max_drawdown FROM index_risk_metrics
+            WHERE index_type = %s ORDER BY date DESC LIMIT 1
+            """,
+            (index_type,)
+        )
+        return None if df.empty else df.iloc[0]
+
+    def update(self, index_type: str, end: Optional[str] = None) -> pd.DataFrame:
+        """Computes and stores the metrics of every priced session after the last stored one, up to `end`."""
+        last = self.last_row(index_type)
+        last_date = to_date(last['date']) if last is not None else None
+        end = to_date(end) if end else datetime.date.max
+
+        start = self._lookback_start(index_type, last_date) if last_date else datetime.date.min
+        performance = self._read_performance(index_type, start, end)
+        if performance.empty or (last_date and performance['date'].iloc[-1] <= last_date):
+            logger.info(f"{index_type}: risk metrics are up to date through {last_date}.")
+            return pd.DataFrame()
+
+        benchmark = None
+        if index_type != self.benchmark:
+            benchmark = self._read_performance(self.benchmark, start, end)
+
+        # Sessions up to the last stored one were only read to fill the windows
+        history_rows = int((performance['date'] <= last_date).sum()) if last_date else 0
+        metrics = self.compute(
+            performance, benchmark, history_rows=history_rows,
+            peak_level=None if last is None else last['peak_level'],
+            max_drawdown=None if last is None else last['max_drawdown']
+        )
+        if not self._persist(index_type, metrics):
+            return pd.DataFrame()
+        logger.info(f"{index_type}: stored risk metrics for {len(metrics)} sessions through {metrics['date'].iloc[-1]}.")
+        return metrics
+
+    def sync(self, index_type: str, rebuilt_from: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """
+        Call after index levels were (re)priced from `rebuilt_from` onwards: drops the
+        stored metrics from that date on, then updates as usual.
+        """
+        if rebuilt_from:
+            self.db.execute_write(
+                "DELETE FROM index_risk_metrics WHERE index_type = %s AND date >= %s",
+                (index_type, rebuilt_from)
+            )
+        return self.update(index_type, end)
+
+    def compute(self, performance: pd.DataFrame, benchmark: Optional[pd.DataFrame] = None, history_rows: int = 0,
+                peak_level: Optional[float] = None, max_drawdown: Optional[float] = None) -> pd.DataFrame:
+        """
+        (date, index_price, daily_return) rows, oldest first -> one row of metrics per
+        date after the first `history_rows`, which only fill the rolling windows.
+        Windows that are not yet full are NaN. peak_level / max_drawdown are the running
+        values before the first returned row, when continuing a stored series.
+        """
+        returns = performance['daily_return'].astype(float).reset_index(drop=True)
+        levels = performance['index_price'].astype(float).to_numpy()
+        metrics = pd.DataFrame({'date': performance['date'].to_numpy()})
+
+        for window in VOLATILITY_WINDOWS:
+            metrics[f"volatility_{window}"] = returns.rolling(window).std() * np.sqrt(TRADING_DAYS)
+
+        excess = returns - RISK_FREE_RATE / TRADING_DAYS
+        rolling = excess.rolling(SHARPE_WINDOW)
+        metrics['sharpe_252'] = rolling.mean() / rolling.std().replace(0.0, np.nan) * np.sqrt(TRADING_DAYS)
+
+        metrics['benchmark'] = self.benchmark
+        if benchmark is None:
+            # The benchmark itself
+            metrics['beta'] = np.where(returns.rolling(BETA_WINDOW).count() >= BETA_WINDOW, 1.0, np.nan)
+        else:
+            aligned = metrics[['date']].merge(benchmark[['date', 'daily_return']], on='date', how='left')
+            benchmark_returns = aligned['daily_return'].astype(float)
+            variance = benchmark_returns.rolling(BETA_WINDOW).var().replace(0.0, np.nan)
+            metrics['beta'] = returns.rolling(BETA_WINDOW).cov(benchmark_returns) / variance
+
+        metrics = metrics.iloc[history_rows:].reset_index(drop=True)
+        levels = levels[history_rows:]
+        peak = np.maximum.accumulate(levels)
+        if peak_level is not None:
+            peak = np.maximum(peak, peak_level)
+        drawdown = levels / peak - 1
+        worst = np.minimum.accumulate(drawdown)
+        if max_drawdown is not None:
+            worst = np.minimum(worst, max_drawdown)
+        metrics['peak_level'], metrics['drawdown'], metrics['max_drawdown'] = peak, drawdown, worst
+        return metrics
+
+    def _lookback_start(self, index_type: str, last_date: datetime.date) -> datetime.date:
+        """The session far enough before `last_date` to fill the longest window for the next one."""
+        df = self.db.execute_query(
+            """
+            SELECT date FROM index_performance_current
+            WHERE index_type = %s AND date <= %s
+            ORDER BY date DESC OFFSET %s LIMIT 1
+            """,
+            (index_type, last_date, max(VOLATILITY_WINDOWS + (SHARPE_WINDOW, BETA_WINDOW)))
+        )
+        return datetime.date.min if df.empty else to_date(df['date'].iloc[0])
+
+    def _read_performance(self, index_type: str, start: datetime.date, end: datetime.date) -> pd.DataFrame:
+        df = self.db.execute_query(
+            """
+            SELECT date, index_price, daily_return FROM index_performance_current
+            WHERE index_type = %s AND date BETWEEN %s AND %s
+            ORDER BY date
+            """,
+            (index_type, start, end)
+        )
+        if not df.empty:
+            df['date'] = df['date'].map(to_date)
+        return df
+
+    def _persist(self, index_type: str, metrics: pd.DataFrame) -> bool:
+        def column(name: str) -> list:
+            return [None if pd.isna(value) else float(value) for value in metrics[name]]
+
+        query = """
+            INSERT INTO index_risk_metrics
+                (index_type, date, benchmark, volatility_20, volatility_60, volatility_252, sharpe_252,
+                 beta, peak_level, drawdown, max_drawdown, update_time)
+            SELECT %s, date, %s, volatility_20, volatility_60, volatility_252, sharpe_252,
+                   beta, peak_level, drawdown, max_drawdown, CURRENT_TIMESTAMP
+            FROM unnest(%s::date[], %s::float8[], %s::float8[], %s::float8[], %s::float8[],
+                        %s::float8[], %s::float8[], %s::float8[], %s::float8[])
+                AS m(date, volatility_20, volatility_60, volatility_252, sharpe_252,
+                     beta, peak_level, drawdown, max_drawdown)
+            ON CONFLICT (index_type, date) DO UPDATE SET
+                benchmark = EXCLUDED.benchmark, volatility_20 = EXCLUDED.volatility_20,
+                volatility_60 = EXCLUDED.volatility_60, volatility_252 = EXCLUDED.volatility_252,
+                sharpe_252 = EXCLUDED.sharpe_252, beta = EXCLUDED.beta, peak_level = EXCLUDED.peak_level,
+                drawdown = EXCLUDED.drawdown, max_drawdown = EXCLUDED.max_drawdown,
+                update_time = EXCLUDED.update_time
+        """
+        params = (index_type, self.benchmark, list(metrics['date']), *(column(name) for name in METRIC_COLUMNS))
+        if self.db.execute_transaction([(query, [params])]) is None:
+            logger.error(f"{index_type}: failed to store {len(metrics)} sessions of risk metrics.")
+            return False
+        return True
@@ -0,0 +1,141 @@
+# services/ingestion/dead_letter.py
+
+import os
+import json
+import fcntl
+import datetime
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+from shared.logger_config import setup_logger
+
+logger = setup_logger("DeadLetterQueue")
+
+class DeadLetterQueue:
+    """
+    Buffered writer for the ingestion dead letter queue (JSON lines).
+
+    Failed rows are grouped in memory by (date, adjusted) and appended as one
+    record per group, so a day that fails wholesale costs one line and one fsync
+    instead of an open/write/close per row. Older one-row-per-line records written
+    by earlier versions are still understood by replay().
+    """
+
+    def __init__(self, path: Path, batch_size: int = 5000):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self._buffer: Dict[Tuple[str, bool], List[dict]] = {}
+        self._buffered_rows = 0
+        self._lock = threading.Lock()
+
+    def add(self, date: str, rows: List[dict], adjusted: bool = False):
+        """Queues failed grouped-aggregate rows; flushes once batch_size rows are pending."""
+        if not rows:
+            return
+        with self._lock:
+            self._buffer.setdefault((date, adjusted), []).extend(rows)
+            self._buffered_rows += len(rows)
+            should_flush = self._buffered_rows >= self.batch_size
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """Appends every buffered group and fsyncs once for the whole batch."""
+        with self._lock:
+            buffer, self._buffer = self._buffer, {}
+            row_count, self._buffered_rows = self._buffered_rows, 0
+        if not buffer:
+            return
+
+        written_at = datetime.datetime.now().isoformat()
+        lines = "".join(
+            json.dumps({"date": date, "timestamp": written_at, "adjusted": adjusted, "rows": rows}) + "\n"
+            for (date, adjusted), rows in buffer.items()
+        )
+        with self._file_lock():
+            with open(self.path, "a") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+        logger.warning(f"{row_count} rows across {len(buffer)} dates written to Dead Letter Queue (DLQ).")
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialises writers and replay across processes sharing the DLQ file."""
+        with open(self.path.with_name(self.path.name + ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_groups(self) -> Dict[Tuple[str, bool], Dict[tuple, dict]]:
+        """Loads the DLQ into {(date, adjusted): {(ticker, t): row}}; later records win."""
+        groups: Dict[Tuple[str, bool], Dict[tuple, dict]] = {}
+        if not self.path.exists():
+            return groups
+
+        with open(self.path) as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.error(f"Skipping corrupt DLQ line {line_no}.")
+                    continue
+                if "rows" in record:
+                    rows = record["rows"]
+                else:
+                    # Legacy format: {"date", "timestamp", "data": {"ticker", "payload"}}
+                    rows = [record.get("data", {}).get("payload", {})]
+                group = groups.setdefault((record["date"], record.get("adjusted", False)), {})
+                for row in rows:
+                    group[(row.get("T"), row.get("t"))] = row
+        return groups
+
+    def replay(self, upsert: Callable[[str, List[dict], bool], List[dict]]) -> Tuple[int, int]:
+        """
+        Re-ingests every queued row, one bulk upsert per date.
+
+        `upsert(date, rows, adjusted)` must return the rows it could not write.
+        Those are kept; everything else is compacted out of the file.
+        Returns (replayed_rows, remaining_rows).
+        """
+        self.flush()
+        with self._file_lock():
+            groups = self._read_groups()
+            if not groups:
+                logger.info("Dead Letter Queue is empty. Nothing to replay.")
+                return 0, 0
+
+            replayed, remaining = 0, {}
+            for (date, adjusted), rows_by_key in sorted(groups.items()):
+                rows = list(rows_by_key.values())
+                failed = upsert(date, rows, adjusted)
+                replayed += len(rows) - len(failed)
+                if failed:
+                    remaining[(date, adjusted)] = failed
+
+            written_at = datetime.datetime.now().isoformat()
+            tmp_path = self.path.with_name(self.path.name + ".compact")
+            with open(tmp_path, "w") as f:
+                for (date, adjusted), rows in remaining.items():
+                    f.write(json.dumps({"date": date, "timestamp": written_at, "adjusted": adjusted, "rows": rows}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+        remaining_rows = sum(len(rows) for rows in remaining.values())
+        logger.info(f"DLQ replay complete: {replayed} rows re-ingested, {remaining_rows} rows still queued.")
+        return replayed, remaining_rows
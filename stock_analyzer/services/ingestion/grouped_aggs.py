@@ -0,0 +1,155 @@
+# services/ingestion/grouped_aggs.py
+
+import math
+from array import array
+from typing import BinaryIO, Iterator, List, Optional
+
+import ijson
+
+# Sentinel for a missing integer field ('n'); typed arrays cannot hold None
+MISSING_INT = -(2 ** 63)
+
+FLOAT_FIELDS = ('o', 'h', 'l', 'c', 'v', 'vw')
+
+# Top-level scalars Polygon emits ahead of 'results'
+HEADER_FIELDS = ('adjusted', 'resultsCount')
+
+
+def invalid_price_reason(stock: dict) -> Optional[str]:
+    """Returns why a grouped-aggregate row cannot be loaded, or None if it is fine."""
+    if not isinstance(stock.get('T'), str) or not stock.get('T'):
+        return "missing ticker"
+    if not isinstance(stock.get('t'), int) or isinstance(stock.get('t'), bool):
+        return "missing or non-integer timestamp"
+    for field in FLOAT_FIELDS:
+        value = stock.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            return f"non-numeric '{field}'"
+    if stock.get('n') is not None and (isinstance(stock.get('n'), bool) or not isinstance(stock.get('n'), int)):
+        return "non-integer 'n'"
+    return None
+
+
+class GroupedAggregates:
+    """
+    Columnar form of a Polygon grouped daily aggregates response.
+
+    Each field lives in one typed array (ticker, t, o, h, l, c, v, n, vw, otc),
+    so a full-market day costs a few hundred KB of machine values instead of a
+    dict of boxed Python objects per row. Missing floats are NaN and a missing
+    'n' is MISSING_INT. Rows that fail validation never reach the columns; they
+    are kept as raw dicts in `rejected` so they can be sent to the DLQ.
+    """
+
+    def __init__(self, adjusted: bool = False, results_count: Optional[int] = None):
+        self.adjusted = adjusted
+        # resultsCount as reported by Polygon, when the body carried one
+        self.results_count = results_count
+        self.ticker: List[str] = []
+        self.t = array('q')
+        self.o = array('d')
+        self.h = array('d')
+        self.l = array('d')
+        self.c = array('d')
+        self.v = array('d')
+        self.n = array('q')
+        self.vw = array('d')
+        self.otc = array('b')
+        self.rejected: List[dict] = []
+
+    def __len__(self) -> int:
+        return len(self.ticker)
+
+    def __bool__(self) -> bool:
+        return bool(self.ticker) or bool(self.rejected)
+
+    @property
+    def total_rows(self) -> int:
+        return len(self.ticker) + len(self.rejected)
+
+    def is_complete(self) -> bool:
+        """True when the body had rows and every row Polygon counted was decoded."""
+        return self.total_rows > 0 and self.results_count in (None, self.total_rows)
+
+    def append_row(self, stock: dict):
+        if invalid_price_reason(stock):
+            self.rejected.append(stock)
+            return
+        get = stock.get
+        nan = math.nan
+        self.ticker.append(stock['T'])
+        self.t.append(stock['t'])
+        o, h, l, c, v, vw, n = get('o'), get('h'), get('l'), get('c'), get('v'), get('vw'), get('n')
+        self.o.append(nan if o is None else o)
+        self.h.append(nan if h is None else h)
+        self.l.append(nan if l is None else l)
+        self.c.append(nan if c is None else c)
+        self.v.append(nan if v is None else v)
+        self.vw.append(nan if vw is None else vw)
+        self.n.append(MISSING_INT if n is None else n)
+        self.otc.append(1 if get('otc', False) else 0)
+
+    @classmethod
+    def from_results(cls, results: List[dict], adjusted: bool = False) -> "GroupedAggregates":
+        """Builds the columns from already-decoded rows (e.g. a DLQ replay)."""
+        aggs = cls(adjusted)
+        for stock in results:
+            aggs.append_row(stock)
+        return aggs
+
+    @classmethod
+    def parse(cls, stream: BinaryIO) -> "GroupedAggregates":
+        """
+        Stream-decodes a grouped aggregates JSON body straight into columns.
+        Rows are pulled one at a time by ijson's C backend, so peak memory is the
+        columns themselves rather than the whole decoded document. `stream` must be
+        seekable: the top-level 'adjusted' flag and 'resultsCount' are read in a
+        short first pass that stops where 'results' begins.
+        """
+        start = stream.tell()
+        header = {}
+        for prefix, event, value in ijson.parse(stream, use_float=True):
+            if prefix == 'results':
+                break
+            if prefix in HEADER_FIELDS and event in ('boolean', 'number'):
+                header[prefix] = value
+        count = header.get('resultsCount')
+        aggs = cls(adjusted=bool(header.get('adjusted', False)),
+                   results_count=int(count) if isinstance(count, (int, float)) else None)
+        stream.seek(start)
+        for stock in ijson.items(stream, 'results.item', use_float=True):
+            aggs.append_row(stock)
+        return aggs
+
+    def iter_rows(self, date: str) -> Iterator[tuple]:
+        """Yields stock_prices rows in PRICE_COLUMNS order, converting sentinels back to NULL."""
+        ticker, t, o, h, l, c, v, n, vw, otc = (
+            self.ticker, self.t, self.o, self.h, self.l, self.c, self.v, self.n, self.vw, self.otc
+        )
+        adjusted = self.adjusted
+        for i in range(len(ticker)):
+            yield (
+                ticker[i], t[i], date, _nullable(o[i]), _nullable(h[i]), _nullable(l[i]),
+                _nullable(c[i]), _nullable(v[i]), None if n[i] == MISSING_INT else n[i],
+                _nullable(vw[i]), bool(otc[i]), adjusted
+            )
+
+    def to_dicts(self) -> List[dict]:
+        """Rebuilds Polygon-shaped row dicts for every valid row, e.g. to dead-letter a failed batch."""
+        rows = []
+        for i in range(len(self.ticker)):
+            row = {'T': self.ticker[i], 't': self.t[i]}
+            for field in FLOAT_FIELDS:
+                value = getattr(self, field)[i]
+                if not math.isnan(value):
+                    row[field] = value
+            if self.n[i] != MISSING_INT:
+                row['n'] = self.n[i]
+            if self.otc[i]:
+                row['otc'] = True
+            rows.append(row)
+        return rows
+
+
+def _nullable(value: float) -> Optional[float]:
+    return None if value != value else value
@@ -2,11 +2,13 @@
 
 import os
 import sys
-import json
-import time
+import argparse
 import datetime
 import requests
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from apscheduler.schedulers.blocking import BlockingScheduler
@@ -15,113 +17,363 @@ from apscheduler.schedulers.blocking import BlockingScheduler
 sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
 from shared.db import DatabaseManager
 from shared.logger_config import setup_logger
+from shared.market_caps import MarketCapHistory
+from shared.migrations import MigrationRunner, run_migrations
+from shared.payload_cache import PayloadCache
+from shared.query_stats import QUERY_STATS
+from shared.trading_calendar import TradingCalendar
+from services.ingestion.rate_limiter import TokenBucketRateLimiter
+from services.ingestion.dead_letter import DeadLetterQueue
+from services.ingestion.grouped_aggs import GroupedAggregates, invalid_price_reason
+from services.ingestion.universe_sync import TickerUniverseSync
 
 logger = setup_logger("IngestionService")
 
 class PolygonRateLimitError(Exception):
     pass
 
+PRICE_COLUMNS = ("ticker", "timestamp", "date", "open", "high", "low", "close", "volume",
+                 "transactions", "volume_weighted_avg", "is_otc", "is_adjusted")
+# stock_prices is partitioned by date, so its primary key (and any conflict target) must include it
+PRICE_CONFLICT_COLUMNS = ("ticker", "timestamp", "date")
+PRICE_UPDATE_COLUMNS = ("open", "high", "low", "close", "volume", "transactions", "volume_weighted_avg")
+
+
 class StockDataIngester:
+    # One limiter and cache per process so concurrent fetches share the plan's request budget
+    _rate_limiter = None
+    _payload_cache = None
+
     def __init__(self):
         load_dotenv()
         self.api_key = os.getenv("POLYGON_API_KEY")
         self.db = DatabaseManager()
+        if StockDataIngester._rate_limiter is None:
+            StockDataIngester._rate_limiter = TokenBucketRateLimiter(
+                requests_per_minute=float(os.getenv("POLYGON_REQUESTS_PER_MINUTE", "5")),
+                burst=int(os.getenv("POLYGON_RATE_LIMIT_BURST", "1"))
+            )
+        self.rate_limiter = StockDataIngester._rate_limiter
+        if StockDataIngester._payload_cache is None:
+            StockDataIngester._payload_cache = PayloadCache()
+        self.cache = StockDataIngester._payload_cache
         self.api_base_url = "https://api.polygon.io"
         self.dlq_path = Path(__file__).resolve().parent / "dead_letter.jsonl"
+        self.dlq = DeadLetterQueue(self.dlq_path, batch_size=int(os.getenv("DLQ_BATCH_SIZE", "5000")))
         
         if not self.api_key or self.api_key == "your_actual_polygon_api_key_here":
             logger.error("POLYGON_API_KEY is missing or invalid.")
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10), retry=retry_if_exception_type(requests.exceptions.RequestException))
-    def fetch_symbols(self, limit: int = 1000) -> list:
-        """Fetches active stock symbols with exponential backoff on network failures."""
+    def fetch_symbols(self, limit: int = 1000, max_pages: Optional[int] = None) -> list:
+        """
+        Fetches every active stock symbol, following Polygon's next_url cursor
+        until the listing is exhausted (or max_pages pages have been read).
+        `limit` is the page size, capped at 1000 by Polygon.
+        """
         url = f"{self.api_base_url}/v3/reference/tickers"
-        params = {"market": "stocks", "active": "true", "limit": limit, "apiKey": self.api_key}
-        
-        logger.info(f"Fetching up to {limit} ticker symbols from Polygon...")
-        response = requests.get(url, params=params)
+        params = {"market": "stocks", "active": "true", "limit": limit}
+
+        symbols, pages = [], 0
+        while url and (max_pages is None or pages < max_pages):
+            page = self._fetch_reference_page(url, params)
+            symbols.extend(ticker['ticker'] for ticker in page.get('results', []))
+            pages += 1
+            # next_url already carries the cursor and filters, but not the API key
+            url, params = page.get('next_url'), {}
+
+        logger.info(f"Retrieved {len(symbols)} active ticker symbols across {pages} pages.")
+        return symbols
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10), retry=retry_if_exception_type(requests.exceptions.RequestException))
+    def _fetch_reference_page(self, url: str, params: dict) -> dict:
+        """Fetches one page of /v3/reference/tickers with exponential backoff on network failures."""
+        cache_params = {"url": url, **params}
+        cached = self.cache.get_json("tickers", cache_params)
+        if cached is not None:
+            return cached
+
+        self.rate_limiter.acquire()
+        response = requests.get(url, params={**params, "apiKey": self.api_key})
+        if response.status_code == 429:
+            self._back_off(response)
         response.raise_for_status()
-        return [ticker['ticker'] for ticker in response.json().get('results', [])]
+        self.rate_limiter.on_success()
+        self.cache.put("tickers", cache_params, response.content)
+        return response.json()
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10), retry=retry_if_exception_type(requests.exceptions.RequestException))
+    def fetch_ticker_details(self, ticker: str) -> Optional[dict]:
+        """Fetches the reference profile (market cap, shares outstanding, ...) for one ticker."""
+        url = f"{self.api_base_url}/v3/reference/tickers/{ticker}"
+        params = {"ticker": ticker}
+
+        cached = self.cache.get_json("ticker_details", params)
+        if cached is None:
+            self.rate_limiter.acquire()
+            response = requests.get(url, params={"apiKey": self.api_key})
+            if response.status_code == 404:
+                self.rate_limiter.on_success()
+                logger.warning(f"No reference data found for {ticker}.")
+                return None
+            if response.status_code == 429:
+                self._back_off(response)
+            response.raise_for_status()
+            self.rate_limiter.on_success()
+            self.cache.put("ticker_details", params, response.content)
+            cached = response.json()
+        return cached.get('results')
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=2, min=12, max=60))
-    def fetch_ohlcv(self, date: str) -> dict:
-        """Fetches OHLCV data. Backs off significantly if rate limited."""
-        logger.info(f"Rate Limiting: Sleeping 12s before fetching OHLCV for {date}")
-        time.sleep(12) 
-        
+    def fetch_ohlcv(self, date: str) -> GroupedAggregates:
+        """Fetches OHLCV data as columns. Backs off significantly if rate limited."""
         url = f"{self.api_base_url}/v2/aggs/grouped/locale/us/market/stocks/{date}"
         params = {"apiKey": self.api_key, "adjusted": "true"}
+        cache_params = {"date": date, "adjusted": "true"}
+
+        # Only sessions before the latest completed one are final; Polygon may still revise that one and today
+        is_final = datetime.datetime.strptime(date, "%Y-%m-%d").date() < TradingCalendar().previous_session()
+        cached = self.cache.get("grouped_aggs", cache_params, ttl=None if is_final else 15 * 60)
+        if cached is not None:
+            logger.info(f"Cache hit: grouped OHLCV for {date}")
+            return GroupedAggregates.parse(BytesIO(cached))
+
+        self.rate_limiter.acquire()
+        logger.info(f"Fetching grouped OHLCV for {date}")
         response = requests.get(url, params=params)
         
         if response.status_code == 429:
             logger.warning("Polygon Rate Limit Hit! Triggering Tenacity backoff.")
+            self._back_off(response)
             raise PolygonRateLimitError("Rate limited by Polygon.")
             
         response.raise_for_status()
-        return response.json()
+        self.rate_limiter.on_success()
+        # Decode the raw body straight into typed columns instead of a list of dicts
+        aggs = GroupedAggregates.parse(BytesIO(response.content))
+        # An empty or short body (published before the session settled) must be fetched again next time
+        if aggs.is_complete():
+            self.cache.put("grouped_aggs", cache_params, response.content)
+        else:
+            logger.warning(f"Not caching grouped OHLCV for {date}: {aggs.total_rows} rows, "
+                           f"resultsCount {aggs.results_count}.")
+        return aggs
+
+    def _back_off(self, response: requests.Response):
+        """Tells the shared limiter about a 429 so every worker slows down, not just this one."""
+        retry_after = response.headers.get("Retry-After")
+        self.rate_limiter.on_rate_limited(float(retry_after) if retry_after and retry_after.isdigit() else None)
 
-    def write_to_dlq(self, date: str, payload: dict):
-        """Saves failed payloads to a Dead Letter Queue file to prevent data loss."""
-        with open(self.dlq_path, "a") as f:
-            dlq_record = {"date": date, "timestamp": datetime.datetime.now().isoformat(), "data": payload}
-            f.write(json.dumps(dlq_record) + "\n")
-        logger.warning(f"Data for {date} written to Dead Letter Queue (DLQ).")
-
-    def insert_stock_prices(self, date: str, stock_prices: dict):
-        """Translates Python dicts to Postgres SQL and executes the write."""
-        results = stock_prices.get('results', [])
-        if not results:
+    def write_to_dlq(self, date: str, rows: list, adjusted: bool = False):
+        """Queues failed rows in the buffered Dead Letter Queue to prevent data loss."""
+        self.dlq.add(date, rows, adjusted)
+
+    def insert_stock_prices(self, date: str, prices: GroupedAggregates, bulk: bool = True):
+        """
+        Upserts a columnar grouped-aggregates payload into stock_prices.
+        bulk=True streams the columns through COPY in one transaction;
+        bulk=False sends a parameterised upsert in executemany batches.
+        """
+        if not prices:
             logger.info(f"No price results found for {date}.")
             return
 
+        if bulk:
+            failed = self._bulk_upsert_stock_prices(date, prices)
+        else:
+            failed = self._upsert_stock_prices_batched(date, prices)
+
+        if failed:
+            self.write_to_dlq(date, failed, prices.adjusted)
+            # One group write + fsync per day rather than per failed row
+            self.dlq.flush()
+        logger.info(f"Successfully UPSERTED {prices.total_rows - len(failed)}/{prices.total_rows} price records for {date}.")
+
+    def replay_stock_prices(self, date: str, rows: list, adjusted: bool = False) -> list:
+        """
+        Bulk-upserts dead-lettered rows for one date and returns the rows still not
+        written. Unlike insert_stock_prices it never writes to the DLQ, so it can be
+        passed straight to DeadLetterQueue.replay, which keeps the failures itself.
+        """
+        return self._bulk_upsert_stock_prices(date, GroupedAggregates.from_results(rows, adjusted))
+
+    def _upsert_stock_prices_batched(self, date: str, prices: GroupedAggregates) -> list:
+        """Parameterised upsert sent in pipelined executemany batches. Returns the failed rows."""
         query = """
             INSERT INTO stock_prices (ticker, timestamp, date, open, high, low, close, volume, transactions, volume_weighted_avg, is_otc, is_adjusted)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (ticker, timestamp) DO UPDATE SET
+            ON CONFLICT (ticker, timestamp, date) DO UPDATE SET
                 open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
                 close = EXCLUDED.close, volume = EXCLUDED.volume, transactions = EXCLUDED.transactions,
                 volume_weighted_avg = EXCLUDED.volume_weighted_avg;
         """
-        
-        success_count = 0
-        for stock in results:
-            timestamp = stock.get('t')
-            params = (
-                stock.get('T'), timestamp, date, stock.get('o'), stock.get('h'), 
-                stock.get('l'), stock.get('c'), stock.get('v'), stock.get('n'), 
-                stock.get('vw'), stock.get('otc', False), stock_prices.get('adjusted', False)
-            )
-            # Utilizing the shared DatabaseManager
-            if self.db.execute_write(query, params):
-                success_count += 1
-            else:
-                self.write_to_dlq(date, {"ticker": stock.get('T'), "payload": stock})
-                
-        logger.info(f"Successfully UPSERTED {success_count}/{len(results)} price records for {date}.")
+        failed = list(prices.rejected)
+        result = self.db.execute_batch(query, prices.iter_rows(date))
+        if result.failed_rows:
+            rows = prices.to_dicts()
+            failed.extend(rows[i] for i in result.failed_rows)
+        return failed
+
+    def _bulk_upsert_stock_prices(self, date: str, prices: GroupedAggregates) -> list:
+        """
+        Upserts every valid row in one COPY transaction. Malformed rows were already
+        rejected while decoding, so one bad record cannot abort the batch. Returns the
+        rows that were not written: the rejected ones, plus the whole batch if the
+        transaction fails.
+        """
+        failed = list(prices.rejected)
+        for stock in prices.rejected:
+            logger.warning(f"Rejected price row for {stock.get('T')} on {date}: {invalid_price_reason(stock)}")
+        if not len(prices):
+            return failed
+
+        upserted = self.db.copy_upsert("stock_prices", PRICE_COLUMNS, prices.iter_rows(date),
+                                       conflict_columns=PRICE_CONFLICT_COLUMNS,
+                                       update_columns=PRICE_UPDATE_COLUMNS)
+        if upserted is None:
+            failed.extend(prices.to_dicts())
+        return failed
 
 def run_daily_ingestion():
-    """The main job triggered by the scheduler."""
+    """
+    The main job triggered by the scheduler. Loads every trading session in the
+    lookback window that has no rows in stock_prices yet, so holidays cost no
+    API calls and sessions missed while the service was down are caught up.
+    """
     logger.info("--- Starting Daily Ingestion Job ---")
     ingester = StockDataIngester()
-    
-    # Calculate target date (yesterday, skipping weekends)
-    today = datetime.datetime.now()
-    if today.weekday() == 5: target_date = today - datetime.timedelta(days=1)
-    elif today.weekday() == 6: target_date = today - datetime.timedelta(days=2)
+    calendar = TradingCalendar()
+
+    end = calendar.previous_session()
+    start = end - datetime.timedelta(days=int(os.getenv("INGESTION_LOOKBACK_DAYS", "10")))
+    try:
+        missing = calendar.missing_sessions(ingester.db, "stock_prices", start, end)
+    except Exception as e:
+        logger.error(f"Gap detection failed, falling back to the previous session only: {e}")
+        missing = [end]
+
+    if not missing:
+        logger.info(f"stock_prices is up to date through {end}.")
+        return
+    _ingest_sessions(ingester, [day.strftime("%Y-%m-%d") for day in missing],
+                     max_in_flight=int(os.getenv("BACKFILL_CONCURRENCY", "4")))
+    QUERY_STATS.log_summary()
+
+def run_backfill(start_date: str, end_date: str, max_in_flight: int = 4, only_missing: bool = False):
+    """
+    Loads grouped OHLCV for every trading session in [start_date, end_date],
+    or only for the sessions with no stock_prices rows when only_missing is set.
+    """
+    ingester = StockDataIngester()
+    calendar = TradingCalendar()
+    if only_missing:
+        sessions = calendar.missing_sessions(ingester.db, "stock_prices", start_date, end_date)
     else:
-        target_date = today - datetime.timedelta(days=1)
-        if target_date.weekday() == 6: target_date = target_date - datetime.timedelta(days=2)
+        sessions = calendar.sessions(start_date, end_date)
+    dates = [day.strftime("%Y-%m-%d") for day in sessions]
+    logger.info(f"--- Starting backfill of {len(dates)} sessions ({start_date} -> {end_date}), {max_in_flight} in flight ---")
+    return _ingest_sessions(ingester, dates, max_in_flight)
 
-    date_str = target_date.strftime("%Y-%m-%d")
-    
+def _ingest_sessions(ingester: StockDataIngester, dates: list, max_in_flight: int) -> list:
+    """
+    Up to max_in_flight fetches run on worker threads, gated by the shared rate
+    limiter, while this thread upserts whichever day finished first. Fetching
+    the next day therefore overlaps with writing the previous one.
+    Returns the dates that failed.
+    """
+    # Sessions older than the partitions created at migration time would otherwise land in the default partition
+    MigrationRunner().ensure_partitions({int(date_str[:4]) for date_str in dates})
+
+    failed_dates = []
+    pending_dates = iter(dates)
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        in_flight = {}
+
+        def submit_next():
+            date_str = next(pending_dates, None)
+            if date_str is not None:
+                in_flight[pool.submit(ingester.fetch_ohlcv, date_str)] = date_str
+
+        for _ in range(max_in_flight):
+            submit_next()
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                date_str = in_flight.pop(future)
+                # Refill the window before writing so the fetchers never sit idle
+                submit_next()
+                try:
+                    prices = future.result()
+                    if prices:
+                        ingester.insert_stock_prices(date_str, prices)
+                except Exception as e:
+                    logger.error(f"Ingestion failed for {date_str}: {e}")
+                    failed_dates.append(date_str)
+
+    loaded = sorted(set(dates) - set(failed_dates))
+    if loaded:
+        # Point-in-time caps for the sessions just written, in one INSERT ... SELECT
+        MarketCapHistory(ingester.db).refresh(loaded[0], loaded[-1])
+
+    if failed_dates:
+        logger.warning(f"Ingestion finished with {len(failed_dates)} failed sessions: {sorted(failed_dates)}")
+    else:
+        logger.info(f"Ingestion finished: {len(dates)} sessions loaded.")
+    return failed_dates
+
+def run_universe_sync(max_detail_calls: Optional[int] = None):
+    """Nightly job: follow the full ticker listing and refresh only new, delisted or stale profiles."""
+    logger.info("--- Starting Ticker Universe Sync ---")
+    ingester = StockDataIngester()
+    sync = TickerUniverseSync(
+        ingester,
+        max_age_days=int(os.getenv("TICKER_DETAILS_MAX_AGE_DAYS", "30")),
+        batch_size=int(os.getenv("TICKER_DETAILS_BATCH_SIZE", "200"))
+    )
     try:
-        prices = ingester.fetch_ohlcv(date_str)
-        if prices:
-            ingester.insert_stock_prices(date_str, prices)
+        return sync.run(max_detail_calls=max_detail_calls)
     except Exception as e:
-        logger.error(f"Ingestion job failed for {date_str}: {e}")
+        logger.error(f"Ticker universe sync failed: {e}")
+
+def replay_dead_letters():
+    """Re-ingests everything in the DLQ with one bulk upsert per date and compacts the file."""
+    logger.info("--- Replaying Dead Letter Queue ---")
+    ingester = StockDataIngester()
+    return ingester.dlq.replay(ingester.replay_stock_prices)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Polygon OHLCV ingestion service")
+    parser.add_argument("--backfill", nargs=2, metavar=("START_DATE", "END_DATE"),
+                        help="Load a date range (YYYY-MM-DD YYYY-MM-DD) and exit instead of scheduling")
+    parser.add_argument("--only-missing", action="store_true",
+                        help="With --backfill, skip sessions that already have stock_prices rows")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BACKFILL_CONCURRENCY", "4")),
+                        help="Maximum number of Polygon requests in flight during a backfill")
+    parser.add_argument("--replay-dlq", action="store_true",
+                        help="Re-ingest rows from the dead letter queue and exit")
+    parser.add_argument("--sync-universe", action="store_true",
+                        help="Sync ticker_details against Polygon's active ticker listing and exit")
+    parser.add_argument("--max-detail-calls", type=int, default=None,
+                        help="Cap on ticker detail requests for one universe sync")
+    args = parser.parse_args()
+
+    run_migrations()
+
+    if args.sync_universe:
+        run_universe_sync(max_detail_calls=args.max_detail_calls)
+        QUERY_STATS.log_summary()
+        sys.exit(0)
+
+    if args.replay_dlq:
+        replay_dead_letters()
+        QUERY_STATS.log_summary()
+        sys.exit(0)
+
+    if args.backfill:
+        run_backfill(*args.backfill, max_in_flight=args.concurrency, only_missing=args.only_missing)
+        QUERY_STATS.log_summary()
+        sys.exit(0)
+
     logger.info("Ingestion Service Booting Up...")
     
     # Run once immediately on startup
@@ -130,5 +382,6 @@ if __name__ == "__main__":
     # Then schedule to run every day at 18:00 (6 PM)
     scheduler = BlockingScheduler()
     scheduler.add_job(run_daily_ingestion, 'cron', hour=18, minute=0)
+    scheduler.add_job(run_universe_sync, 'cron', hour=2, minute=0)
     logger.info("Scheduler configured. Waiting for next run at 18:00...")
     scheduler.start()
\ No newline at end of file
@@ -0,0 +1,62 @@
+# services/ingestion/rate_limiter.py
+
+import threading
+import time
+from typing import Optional
+
+from shared.logger_config import setup_logger
+
+logger = setup_logger("RateLimiter")
+
+class TokenBucketRateLimiter:
+    """
+    Thread-safe token bucket shared by every Polygon call in the process.
+
+    Tokens refill continuously at the plan's requests/minute, so the first call
+    goes out immediately and later calls only wait as long as they have to.
+    A 429 halves the refill rate and pauses every caller; successful calls then
+    recover the rate additively until it is back at the configured ceiling.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int = 1):
+        self.max_rate = requests_per_minute / 60.0
+        self.min_rate = self.max_rate / 16
+        self.rate = self.max_rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        # Nothing accrues while a 429 pause is in force, so the pause cannot bank a burst
+        elapsed = max(0.0, now - max(self.updated_at, self.blocked_until))
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """Blocks until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """Backs off after a 429, honouring Retry-After when Polygon sends one."""
+        with self._lock:
+            self.rate = max(self.rate / 2, self.min_rate)
+            self.tokens = 0.0
+            pause = retry_after if retry_after else 1 / self.rate
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+        logger.warning(f"Rate limited: pausing {pause:.1f}s, refill lowered to {self.rate * 60:.2f} req/min.")
+
+    def on_success(self):
+        """Creeps back toward the configured rate after a backoff."""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
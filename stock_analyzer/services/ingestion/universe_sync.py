@@ -0,0 +1,127 @@
+# services/ingestion/universe_sync.py
+
+import datetime
+from dataclasses import dataclass, field
+from typing import List, Optional
+from shared.logger_config import setup_logger
+
+logger = setup_logger("UniverseSync")
+
+TICKER_DETAIL_COLUMNS = (
+    "ticker", "active", "name", "market", "locale", "primary_exchange", "type", "currency_name",
+    "cik", "description", "homepage_url", "list_date", "market_cap", "phone_number",
+    "total_employees", "address1", "address2", "city", "state", "postal_code",
+    "branding_icon_url", "branding_logo_url", "sic_code", "sic_description",
+    "ticker_root", "ticker_suffix", "weighted_shares_outstanding", "last_refreshed",
+)
+
+
+def flatten_ticker_details(details: dict, refreshed_at: datetime.datetime) -> tuple:
+    """Maps a /v3/reference/tickers/{ticker} result onto a ticker_details row."""
+    address = details.get('address') or {}
+    branding = details.get('branding') or {}
+    return (
+        details.get('ticker'), details.get('active'), details.get('name'), details.get('market'),
+        details.get('locale'), details.get('primary_exchange'), details.get('type'),
+        details.get('currency_name'), details.get('cik'), details.get('description'),
+        details.get('homepage_url'), details.get('list_date'), details.get('market_cap'),
+        details.get('phone_number'), details.get('total_employees'), address.get('address1'),
+        address.get('address2'), address.get('city'), address.get('state'), address.get('postal_code'),
+        branding.get('icon_url'), branding.get('logo_url'), details.get('sic_code'),
+        details.get('sic_description'), details.get('ticker_root'), details.get('ticker_suffix'),
+        details.get('weighted_shares_outstanding'), refreshed_at,
+    )
+
+
+@dataclass
+class UniverseDiff:
+    """Tickers that need a details call, by reason."""
+    new: List[str] = field(default_factory=list)
+    delisted: List[str] = field(default_factory=list)
+    stale: List[str] = field(default_factory=list)
+
+    @property
+    def to_refresh(self) -> List[str]:
+        # New listings first, then delistings, then the oldest stale profiles
+        return self.new + self.delisted + self.stale
+
+
+class TickerUniverseSync:
+    """
+    Keeps ticker_details in step with Polygon's active stock universe.
+
+    The full paginated listing is diffed against ticker_details, and detail calls
+    are only spent on tickers that are new, have dropped out of the active list,
+    or whose last_refreshed timestamp is older than max_age_days. Profiles are
+    upserted in batches of batch_size through the bulk COPY path.
+    """
+
+    def __init__(self, ingester, max_age_days: int = 30, batch_size: int = 200):
+        self.ingester = ingester
+        self.db = ingester.db
+        self.max_age = datetime.timedelta(days=max_age_days)
+        self.batch_size = batch_size
+
+    def plan(self, active_symbols: List[str]) -> UniverseDiff:
+        local = self.db.execute_query("SELECT ticker, active, last_refreshed FROM ticker_details")
+        remote = set(active_symbols)
+        if local.empty:
+            return UniverseDiff(new=sorted(remote))
+
+        known = set(local['ticker'])
+        locally_active = local[local['active'].fillna(False).astype(bool)]
+        cutoff = datetime.datetime.now() - self.max_age
+        stale = locally_active[
+            locally_active['ticker'].isin(remote)
+            & (locally_active['last_refreshed'].isna() | (locally_active['last_refreshed'] < cutoff))
+        ].sort_values('last_refreshed', na_position='first')
+
+        return UniverseDiff(
+            new=sorted(remote - known),
+            delisted=sorted(set(locally_active['ticker']) - remote),
+            stale=stale['ticker'].tolist(),
+        )
+
+    def run(self, max_detail_calls: Optional[int] = None) -> UniverseDiff:
+        symbols = self.ingester.fetch_symbols()
+        if not symbols:
+            logger.error("Polygon returned an empty ticker universe; refusing to mark every ticker delisted.")
+            return UniverseDiff()
+
+        diff = self.plan(symbols)
+        logger.info(f"Universe diff: {len(diff.new)} new, {len(diff.delisted)} delisted, {len(diff.stale)} stale.")
+
+        to_refresh = diff.to_refresh[:max_detail_calls] if max_detail_calls is not None else diff.to_refresh
+        batch, refreshed, failed = [], 0, []
+        for ticker in to_refresh:
+            try:
+                details = self.ingester.fetch_ticker_details(ticker)
+            except Exception as e:
+                # One ticker exhausting its retries must not cost the batch or the delisting pass
+                logger.error(f"Ticker details for {ticker} failed, deferring it to the next run: {e}")
+                failed.append(ticker)
+                continue
+            if details:
+                batch.append(flatten_ticker_details(details, datetime.datetime.now()))
+            if len(batch) >= self.batch_size:
+                refreshed += self._upsert(batch)
+                batch = []
+        refreshed += self._upsert(batch)
+
+        if diff.delisted:
+            # Catch delistings whose detail call failed or still reported them active
+            self.db.execute_write(
+                "UPDATE ticker_details SET active = FALSE, last_refreshed = NOW() WHERE ticker = ANY(%s)",
+                (diff.delisted,)
+            )
+
+        deferred = len(diff.to_refresh) - len(to_refresh) + len(failed)
+        logger.info(f"Universe sync complete: {refreshed}/{len(to_refresh)} profiles refreshed "
+                    f"({deferred} deferred to the next run).")
+        return diff
+
+    def _upsert(self, rows: List[tuple]) -> int:
+        if not rows:
+            return 0
+        upserted = self.db.copy_upsert("ticker_details", TICKER_DETAIL_COLUMNS, rows, conflict_columns=("ticker",))
+        return len(rows) if upserted is not None else 0
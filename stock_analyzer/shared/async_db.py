@@ -0,0 +1,168 @@
+# shared/async_db.py
+
+import os
+import psycopg
+import pandas as pd
+from itertools import islice
+from contextlib import asynccontextmanager
+from typing import Iterable
+from psycopg import sql
+from psycopg_pool import AsyncConnectionPool
+from .db import BatchWriteResult, build_conninfo
+from .query_stats import QUERY_STATS
+from .logger_config import setup_logger
+
+logger = setup_logger("AsyncDatabaseManager")
+
+class AsyncDatabaseManager:
+    """
+    asyncio sibling of DatabaseManager for the API gateway.
+
+    Same query surface (execute_query / execute_write / execute_batch), but every
+    call awaits a connection from a class-level AsyncConnectionPool instead of
+    blocking a threadpool worker. Unlike DatabaseManager, a failed read raises
+    instead of returning an empty DataFrame, so a route can tell "no rows" from
+    "database down" and answer 500 for the latter. The pool is created closed; the owning service
+    opens it on startup and closes it on shutdown (see services/api/main.py).
+    """
+    _connection_pool = None
+
+    def __init__(self):
+        self._ensure_pool()
+
+    @staticmethod
+    def _ensure_pool():
+        """Creates the (closed) class-level pool if there is none, e.g. after close()."""
+        if AsyncDatabaseManager._connection_pool is None:
+            AsyncDatabaseManager._connection_pool = AsyncConnectionPool(
+                build_conninfo(),
+                min_size=int(os.getenv("API_DB_POOL_MIN", "2")),
+                max_size=int(os.getenv("API_DB_POOL_MAX", "20")),
+                timeout=float(os.getenv("API_DB_POOL_TIMEOUT", "30")),
+                open=False,
+            )
+
+    async def open(self):
+        # A closed pool cannot be reopened, so a later lifespan starts from a fresh one
+        self._ensure_pool()
+        await AsyncDatabaseManager._connection_pool.open(wait=True)
+        logger.info("Async PostgreSQL connection pool opened (psycopg 3).")
+
+    async def close(self):
+        if AsyncDatabaseManager._connection_pool is not None:
+            await AsyncDatabaseManager._connection_pool.close()
+            AsyncDatabaseManager._connection_pool = None
+            logger.info("Async PostgreSQL connection pool closed.")
+
+    @asynccontextmanager
+    async def get_connection(self):
+        """Yields a connection from the pool and ensures it is returned."""
+        async with AsyncDatabaseManager._connection_pool.connection() as conn:
+            yield conn
+
+    async def execute_query(self, query: str, params: tuple = None) -> pd.DataFrame:
+        """
+        Executes a SELECT query and returns a pandas DataFrame. Errors are logged and re-raised.
+        """
+        timer = QUERY_STATS.start(query)
+        try:
+            async with self.get_connection() as conn:
+                timer.mark("pool_wait")
+                async with conn.cursor() as cur:
+                    await cur.execute(query, params)
+                    timer.mark("execute")
+                    data = await cur.fetchall()
+                    columns = [desc.name for desc in cur.description] if data else []
+                # Clear the transaction state so the pool stays quiet
+                await conn.rollback()
+                timer.mark("fetch")
+            df = pd.DataFrame(data, columns=columns) if data else pd.DataFrame()
+            timer.mark("materialize")
+
+        except Exception as e:
+            timer.fail()
+            logger.error(f"Read operation failed: {e} | Query: {query}")
+            raise
+
+        if timer.finish(rows=len(df)):
+            await self._explain(query, params)
+        return df
+
+    async def execute_write(self, query: str, params: tuple) -> bool:
+        """
+        Executes an INSERT, UPDATE, or DELETE operation.
+        """
+        timer = QUERY_STATS.start(query)
+        try:
+            async with self.get_connection() as conn:
+                timer.mark("pool_wait")
+                async with conn.cursor() as cursor:
+                    await cursor.execute(query, params)
+                    rowcount = max(cursor.rowcount, 0)
+                await conn.commit()
+                timer.mark("execute")
+        except Exception as e:
+            timer.fail()
+            logger.error(f"Write operation failed: {e} | Query: {query}")
+            return False
+
+        if timer.finish(rows=rowcount):
+            await self._explain(query, params)
+        return True
+
+    async def execute_batch(self, query: str, params_seq: Iterable[tuple], batch_size: int = 1000) -> BatchWriteResult:
+        """
+        Async counterpart of DatabaseManager.execute_batch: one transaction, one
+        pipelined executemany per batch, each batch inside its own savepoint.
+        """
+        result = BatchWriteResult()
+        params_iter = iter(params_seq)
+        consumed = 0
+        first_params = None
+        timer = QUERY_STATS.start(query)
+        try:
+            async with self.get_connection() as conn:
+                timer.mark("pool_wait")
+                async with conn.transaction():
+                    async with conn.cursor() as cur:
+                        while True:
+                            batch = list(islice(params_iter, batch_size))
+                            if not batch:
+                                break
+                            consumed += len(batch)
+                            result.batches += 1
+                            if first_params is None:
+                                first_params = batch[0]
+                            try:
+                                async with conn.transaction():
+                                    await cur.executemany(query, batch)
+                                result.succeeded += len(batch)
+                            except psycopg.Error as e:
+                                logger.error(f"Batch {result.batches} ({len(batch)} rows) rolled back: {e}")
+                                result.failed += len(batch)
+                                result.failed_batches += 1
+                                result.failed_rows.extend(range(consumed - len(batch), consumed))
+                timer.mark("execute")
+        except Exception as e:
+            timer.fail()
+            logger.error(f"Batch write failed: {e} | Query: {query}")
+            total = consumed + sum(1 for _ in params_iter)
+            return BatchWriteResult(failed=total, batches=result.batches, failed_batches=result.batches,
+                                    failed_rows=list(range(total)))
+
+        if timer.finish(rows=result.succeeded) and first_params is not None:
+            await self._explain(query, first_params)
+        return result
+
+    async def _explain(self, query, params):
+        """Logs the plan of a slow statement. EXPLAIN without ANALYZE never executes it."""
+        statement = sql.SQL("EXPLAIN ") + (query if isinstance(query, sql.Composable) else sql.SQL(query))
+        try:
+            async with self.get_connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(statement, params)
+                    plan = [row[0] for row in await cur.fetchall()]
+                await conn.rollback()
+            QUERY_STATS.log_plan(query, plan)
+        except Exception as e:
+            logger.warning(f"Could not EXPLAIN slow query: {e}")
@@ -0,0 +1,198 @@
+# shared/binary_copy.py
+
+import struct
+from array import array
+from typing import Dict, List, Tuple
+
+import numpy as np
+from psycopg import pq, OperationalError
+
+# Header of PostgreSQL's binary COPY format: signature, int32 flags, int32 extension length
+SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+HEADER_SIZE = len(SIGNATURE) + 8
+
+# Binary dates and timestamps count from 2000-01-01 rather than the Unix epoch
+PG_EPOCH_DAYS = 10957
+PG_EPOCH_MICROS = PG_EPOCH_DAYS * 86400 * 1000000
+
+# Fixed-width types by OID: big-endian wire dtype
+FIXED_TYPES = {
+    16: np.dtype("?"),      # bool
+    21: np.dtype(">i2"),    # int2
+    23: np.dtype(">i4"),    # int4
+    20: np.dtype(">i8"),    # int8
+    700: np.dtype(">f4"),   # float4
+    701: np.dtype(">f8"),   # float8
+    1082: np.dtype(">i4"),  # date
+    1114: np.dtype(">i8"),  # timestamp
+    1184: np.dtype(">i8"),  # timestamptz (returned as naive UTC)
+}
+TEXT_TYPES = {19, 25, 1042, 1043}  # name, text, bpchar, varchar
+
+# Text columns up to this many bytes wide are decoded once per distinct value
+TEXT_GATHER_MAX_WIDTH = 32
+
+_int32 = struct.Struct(">i")
+_INT32_WIRE = np.dtype(">i4")
+
+
+def check_supported(names: List[str], oids: List[int]):
+    for name, oid in zip(names, oids):
+        if oid not in FIXED_TYPES and oid not in TEXT_TYPES:
+            raise TypeError(f"Column '{name}' has unsupported type OID {oid}; cast it in SQL "
+                            f"(e.g. ::float8 or ::text) to read it as columns.")
+
+
+def copy_out(conn, statement: str) -> Tuple[bytearray, array]:
+    """
+    Runs a COPY ... TO STDOUT on `conn` and returns (stream, message_sizes).
+
+    The server sends one CopyData message per row (the header rides along with
+    the first one, the trailer comes alone), so the message sizes double as row
+    boundaries for decode(). psycopg's Copy iterator costs a generator round trip
+    per message, which dominates on millions of narrow rows, so the messages are
+    drained straight from the libpq connection into one buffer instead.
+    `statement` must already have its parameters bound.
+    """
+    pgconn = conn.pgconn
+    pgconn.send_query(statement.encode(conn.info.encoding))
+    result = pgconn.get_result()
+    if result.status != pq.ExecStatus.COPY_OUT:
+        while pgconn.get_result() is not None:
+            pass
+        raise OperationalError(result.error_message.decode(errors="replace").strip())
+
+    buf, sizes = bytearray(), array("q")
+    extend, record_size, get_copy_data = buf.extend, sizes.append, pgconn.get_copy_data
+    while True:
+        nbytes, data = get_copy_data(0)  # blocking read of one CopyData message
+        if nbytes < 0:
+            break
+        extend(data)
+        record_size(nbytes)
+
+    error = None
+    while (result := pgconn.get_result()) is not None:
+        if result.status != pq.ExecStatus.COMMAND_OK:
+            error = result.error_message.decode(errors="replace").strip()
+    if error:
+        raise OperationalError(error)
+    return buf, sizes
+
+
+def decode(buf: bytearray, message_sizes: array, names: List[str], oids: List[int]) -> Dict[str, np.ndarray]:
+    """
+    Decodes a COPY ... (FORMAT BINARY) stream into one NumPy array per column.
+
+    When every column is fixed-width and no value is NULL, each tuple has the same
+    size and the whole body is reinterpreted as a structured array in one call.
+    Otherwise fields are located column by column across all rows at once, using
+    the per-row message boundaries from copy_out(); only text columns create
+    Python objects (one str per value).
+    """
+    if buf[:len(SIGNATURE)] != SIGNATURE:
+        raise ValueError("Not a PostgreSQL binary COPY stream.")
+    (extension_length,) = _int32.unpack_from(buf, len(SIGNATURE) + 4)
+    header_size = HEADER_SIZE + extension_length
+
+    # Body runs up to the int16 -1 trailer
+    columns = _decode_fixed_width(memoryview(buf)[header_size:len(buf) - 2], names, oids)
+    if columns is None:
+        ends = np.cumsum(np.frombuffer(message_sizes, dtype=np.int64))
+        # With no rows, header and trailer share the only message
+        row_starts = np.concatenate(([header_size], ends[:-2])) if len(ends) > 1 else np.empty(0, dtype=np.int64)
+        columns = _decode_general(buf, row_starts, names, oids)
+    return columns
+
+
+def _decode_fixed_width(body: memoryview, names: List[str], oids: List[int]):
+    if not all(oid in FIXED_TYPES for oid in oids):
+        return None
+    fields = [("_count", ">i2")]
+    for i, (name, oid) in enumerate(zip(names, oids)):
+        fields += [(f"_len{i}", ">i4"), (f"f{i}", FIXED_TYPES[oid])]
+    record = np.dtype(fields)
+    if len(body) % record.itemsize:
+        return None
+
+    records = np.frombuffer(body, dtype=record)
+    if (records["_count"] != len(names)).any():
+        return None
+    for i, oid in enumerate(oids):
+        # A NULL (length -1) anywhere shifts every later field, so this also rules them out
+        if (records[f"_len{i}"] != FIXED_TYPES[oid].itemsize).any():
+            return None
+    return {name: _to_native(records[f"f{i}"], oid) for i, (name, oid) in enumerate(zip(names, oids))}
+
+
+def _gather(raw: np.ndarray, starts: np.ndarray, wire: np.dtype) -> np.ndarray:
+    """Reads one big-endian value of type `wire` at each offset in `starts`."""
+    # Byte by byte, so the temporary index is one int64 per row rather than one per byte
+    out = np.empty((len(starts), wire.itemsize), dtype=np.uint8)
+    for k in range(wire.itemsize):
+        out[:, k] = raw[starts + k]
+    return out.view(wire).ravel()
+
+
+def _decode_general(buf: bytearray, row_starts: np.ndarray, names: List[str], oids: List[int]) -> Dict[str, np.ndarray]:
+    raw = np.frombuffer(buf, dtype=np.uint8)
+    pos = row_starts + 2  # skip each tuple's int16 field count
+    columns = {}
+    for name, oid in zip(names, oids):
+        sizes = _gather(raw, pos, _INT32_WIRE).astype(np.int64)
+        starts = pos + 4
+        pos = starts + np.maximum(sizes, 0)
+        valid = sizes >= 0
+
+        if oid in TEXT_TYPES:
+            columns[name] = _decode_text(buf, raw, starts, sizes)
+            continue
+
+        values = _to_native(_gather(raw, starts[valid], FIXED_TYPES[oid]), oid)
+        columns[name] = values if valid.all() else _with_nulls(values, valid, oid)
+    return columns
+
+
+def _decode_text(buf: bytearray, raw: np.ndarray, starts: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """
+    Short strings (tickers, index types) repeat across a panel, so they are gathered
+    into a fixed-width bytes array and only the distinct values are decoded.
+    Long free text is decoded value by value.
+    """
+    width = int(sizes.max(initial=0))
+    if width > TEXT_GATHER_MAX_WIDTH:
+        return np.array(
+            [buf[s:s + n].decode("utf-8") if n >= 0 else None for s, n in zip(starts.tolist(), sizes.tolist())],
+            dtype=object
+        )
+
+    padded = np.zeros((len(starts), max(width, 1)), dtype=np.uint8)
+    for k in range(width):
+        present = sizes > k
+        padded[present, k] = raw[starts[present] + k]
+    # PostgreSQL text cannot contain NUL, so the 'S' dtype's NUL padding is unambiguous
+    distinct, inverse = np.unique(padded.view(f"S{max(width, 1)}").ravel(), return_inverse=True)
+    values = np.array([value.decode("utf-8") for value in distinct.tolist()], dtype=object)[inverse.ravel()]
+    values[sizes < 0] = None
+    return values
+
+
+def _to_native(values: np.ndarray, oid: int) -> np.ndarray:
+    if oid == 1082:
+        return (values.astype(np.int64) + PG_EPOCH_DAYS).astype("datetime64[D]")
+    if oid in (1114, 1184):
+        return (values.astype(np.int64) + PG_EPOCH_MICROS).view("datetime64[us]")
+    return values.astype(values.dtype.newbyteorder("="))
+
+
+def _with_nulls(values: np.ndarray, valid: np.ndarray, oid: int) -> np.ndarray:
+    """Scatters non-NULL values into a full-length column: NaN/NaT for numbers and dates, None for bools."""
+    if oid == 16:
+        out = np.full(len(valid), None, dtype=object)
+    elif values.dtype.kind == "M":
+        out = np.full(len(valid), np.datetime64("NaT"), dtype=values.dtype)
+    else:
+        # Integers with NULLs widen to float64, as pandas does
+        out = np.full(len(valid), np.nan, dtype=np.float64 if values.dtype.kind in "iu" else values.dtype)
+    out[valid] = values
+    return out
@@ -1,17 +1,43 @@
 # shared/db.py
 
 import os
+import numpy as np
 import pandas as pd
+from itertools import count, islice
 from contextlib import contextmanager
+from dataclasses import dataclass, field
 import psycopg # Changed from psycopg2
+from psycopg import sql
 from psycopg_pool import ConnectionPool # Changed from psycopg2.pool
-from typing import Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+from . import binary_copy
+from .query_stats import QUERY_STATS
 from .logger_config import setup_logger
 
 logger = setup_logger("DatabaseManager")
 
+def build_conninfo() -> str:
+    """psycopg 3 uses a single conninfo string, assembled from the POSTGRES_* variables."""
+    return f"dbname={ os.getenv('POSTGRES_DB', 'stock_data')} user={os.getenv('POSTGRES_USER', 'sudouser')} password={os.getenv('POSTGRES_PASSWORD', 'sudopass')} host={os.getenv('POSTGRES_HOST', 'localhost')} port={os.getenv('POSTGRES_PORT', '5432')}"
+
+@dataclass
+class BatchWriteResult:
+    """Outcome of DatabaseManager.execute_batch."""
+    succeeded: int = 0
+    failed: int = 0
+    batches: int = 0
+    failed_batches: int = 0
+    # Positions (in input order) of the rows whose batch was rolled back
+    failed_rows: List[int] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.failed == 0
+
 class DatabaseManager:
     _connection_pool = None
+    # Server-side cursor names only need to be unique per connection; a counter keeps them readable in pg_cursors
+    _cursor_ids = count(1)
 
     def __init__(self):
         self._initialize_pool()
@@ -19,9 +45,7 @@ class DatabaseManager:
     def _initialize_pool(self):
         if DatabaseManager._connection_pool is None:
             try:
-                # psycopg 3 uses a single conninfo string
-                conninfo = f"dbname={ os.getenv('POSTGRES_DB', 'stock_data')} user={os.getenv('POSTGRES_USER', 'sudouser')} password={os.getenv('POSTGRES_PASSWORD', 'sudopass')} host={os.getenv('POSTGRES_HOST', 'localhost')} port={os.getenv('POSTGRES_PORT', '5432')}"
-                DatabaseManager._connection_pool = ConnectionPool(conninfo, min_size=1, max_size=20)
+                DatabaseManager._connection_pool = ConnectionPool(build_conninfo(), min_size=1, max_size=20)
                 logger.info("PostgreSQL connection pool initialized successfully (psycopg 3).")
             except Exception as e:
                 logger.error(f"Failed to initialize PostgreSQL connection pool: {e}")
@@ -38,43 +62,305 @@ class DatabaseManager:
 
     def execute_query(self, query: str, params: tuple = None) -> pd.DataFrame:
         """Executes a SELECT query and returns a pandas DataFrame."""
+        timer = QUERY_STATS.start(query)
         try:
             with self.get_connection() as conn:
+                timer.mark("pool_wait")
                 with conn.cursor() as cur:
                     cur.execute(query, params)
+                    timer.mark("execute")
                     data = cur.fetchall()
-                    
-                    if not data:
-                        # Clear state before returning early
-                        conn.rollback() 
-                        return pd.DataFrame()
-                        
-                    columns = [desc.name for desc in cur.description]
-                
+                    columns = [desc.name for desc in cur.description] if data else []
+
                 # Clear the transaction state so the pool stays quiet
-                conn.rollback() 
-                return pd.DataFrame(data, columns=columns)
-                    
+                conn.rollback()
+                timer.mark("fetch")
+
+            # Built after the connection is back in the pool
+            df = pd.DataFrame(data, columns=columns) if data else pd.DataFrame()
+            timer.mark("materialize")
+
         except Exception as e:
+            timer.fail()
             logger.error(f"Read operation failed: {e} | Query: {query}")
             return pd.DataFrame()
 
+        if timer.finish(rows=len(df)):
+            self._explain(query, params)
+        return df
+
+    def execute_query_chunked(self, query: str, params: tuple = None, chunk_size: int = 50000,
+                              as_records: bool = False) -> Iterator[Union[pd.DataFrame, np.recarray]]:
+        """
+        Streams a SELECT through a named server-side cursor, yielding chunk_size rows
+        at a time as DataFrames (or NumPy record arrays with as_records=True).
+        Only one chunk is ever held client-side, so memory stays flat however large
+        the result is. The connection stays checked out until the generator is
+        exhausted or closed. Unlike execute_query, errors are logged and re-raised:
+        a stream that stopped early must not look like a complete result.
+        """
+        timer = QUERY_STATS.start(query)
+        total_rows = 0
+        try:
+            with self.get_connection() as conn:
+                timer.mark("pool_wait")
+                try:
+                    with conn.cursor(name=f"chunked_{next(DatabaseManager._cursor_ids)}") as cur:
+                        cur.itersize = chunk_size
+                        cur.execute(query, params)
+                        timer.mark("execute")
+                        columns = None
+                        while True:
+                            rows = cur.fetchmany(chunk_size)
+                            timer.mark("fetch")
+                            if not rows:
+                                break
+                            total_rows += len(rows)
+                            if columns is None:
+                                columns = [desc.name for desc in cur.description]
+                            if as_records:
+                                chunk = np.rec.fromrecords(rows, names=columns)
+                            else:
+                                chunk = pd.DataFrame(rows, columns=columns)
+                            timer.mark("materialize")
+                            yield chunk
+                            # Time spent by the consumer is not the query's
+                            timer.resume()
+                finally:
+                    # Read-only; closes the cursor's transaction whether we finished or were abandoned
+                    conn.rollback()
+        except GeneratorExit:
+            timer.finish(rows=total_rows)
+            raise
+        except Exception as e:
+            timer.fail()
+            logger.error(f"Streaming read failed: {e} | Query: {query}")
+            raise
+
+        if timer.finish(rows=total_rows):
+            self._explain(query, params)
+
+    def fetch_columns(self, query: str, params: tuple = None, as_arrow: bool = False) -> Union[Dict[str, np.ndarray], "pyarrow.Table"]:
+        """
+        Columnar read for analytical queries. Runs COPY (query) TO STDOUT (FORMAT BINARY)
+        and decodes the stream straight into one NumPy array per column (see
+        shared.binary_copy), so numeric columns never become per-row Python objects.
+        Returns {column: ndarray} or, with as_arrow=True, a pyarrow.Table.
+        Columns must be bool/int/float/date/timestamp/text; cast anything else in SQL.
+        Returns an empty dict if the read fails.
+        """
+        query = query.strip().rstrip(";")
+        describe = sql.SQL("SELECT * FROM ({}) AS q LIMIT 0").format(sql.SQL(query))
+        copy_statement = sql.SQL("COPY ({}) TO STDOUT (FORMAT BINARY)").format(sql.SQL(query))
+        timer = QUERY_STATS.start(query)
+        try:
+            with self.get_connection() as conn:
+                timer.mark("pool_wait")
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(describe, params)
+                        names = [desc.name for desc in cur.description]
+                        oids = [desc.type_code for desc in cur.description]
+                        binary_copy.check_supported(names, oids)
+                    statement = psycopg.ClientCursor(conn).mogrify(copy_statement, params)
+                    timer.mark("execute")
+                    buf, message_sizes = binary_copy.copy_out(conn, statement)
+                    timer.mark("fetch")
+                finally:
+                    conn.rollback()
+            columns = binary_copy.decode(buf, message_sizes, names, oids)
+            timer.mark("materialize")
+        except TypeError:
+            timer.fail()
+            raise
+        except Exception as e:
+            timer.fail()
+            logger.error(f"Columnar read failed: {e} | Query: {query}")
+            return {}
+
+        if timer.finish(rows=len(message_sizes) - 1 if len(message_sizes) > 1 else 0):
+            self._explain(query, params)
+
+        if as_arrow:
+            import pyarrow as pa  # optional; only needed for Arrow output
+            return pa.table({name: pa.array(values, from_pandas=True) for name, values in columns.items()})
+        return columns
+
     def execute_write(self, query: str, params: tuple) -> bool:
         """
         Executes an INSERT, UPDATE, or DELETE operation.
         """
+        timer = QUERY_STATS.start(query)
         try:
             with self.get_connection() as conn:
+                timer.mark("pool_wait")
                 with conn.cursor() as cursor:
                     cursor.execute(query, params)
+                    rowcount = max(cursor.rowcount, 0)
                 conn.commit()
-                return True
+                timer.mark("execute")
         except Exception as e:
+            timer.fail()
             logger.error(f"Write operation failed: {e} | Query: {query}")
             return False
+
+        if timer.finish(rows=rowcount):
+            self._explain(query, params)
+        return True
+
+    def execute_batch(self, query: str, params_seq: Iterable[tuple], batch_size: int = 1000) -> BatchWriteResult:
+        """
+        Executes one INSERT/UPDATE/DELETE for many parameter sets on a single
+        connection and transaction. Each batch of batch_size rows goes through
+        executemany (which psycopg 3 pipelines, so a batch costs one round trip
+        rather than one per row) inside its own savepoint: a failing batch is
+        rolled back and counted without discarding the others.
+        """
+        result = BatchWriteResult()
+        params_iter = iter(params_seq)
+        consumed = 0
+        first_params = None
+        timer = QUERY_STATS.start(query)
+        try:
+            with self.get_connection() as conn:
+                timer.mark("pool_wait")
+                with conn.transaction():
+                    with conn.cursor() as cur:
+                        while True:
+                            batch = list(islice(params_iter, batch_size))
+                            if not batch:
+                                break
+                            consumed += len(batch)
+                            result.batches += 1
+                            if first_params is None:
+                                first_params = batch[0]
+                            try:
+                                with conn.transaction():
+                                    cur.executemany(query, batch)
+                                result.succeeded += len(batch)
+                            except psycopg.Error as e:
+                                logger.error(f"Batch {result.batches} ({len(batch)} rows) rolled back: {e}")
+                                result.failed += len(batch)
+                                result.failed_batches += 1
+                                result.failed_rows.extend(range(consumed - len(batch), consumed))
+                timer.mark("execute")
+        except Exception as e:
+            # The outer transaction never committed, so nothing in this call was written
+            timer.fail()
+            logger.error(f"Batch write failed: {e} | Query: {query}")
+            total = consumed + sum(1 for _ in params_iter)
+            return BatchWriteResult(failed=total, batches=result.batches, failed_batches=result.batches,
+                                    failed_rows=list(range(total)))
+
+        if timer.finish(rows=result.succeeded) and first_params is not None:
+            self._explain(query, first_params)
+        return result
+
+    def execute_transaction(self, statements: Sequence[tuple]) -> Optional[List[int]]:
+        """
+        Runs (query, params_seq) pairs in order on one connection and commits them
+        together, so readers see all of the statements or none of them. Each query is
+        pipelined over its parameter sets with executemany; an empty params_seq skips it.
+        Returns the number of affected rows per statement, or None if it was rolled back.
+        """
+        rowcounts = []
+        timers = []
+        try:
+            with self.get_connection() as conn:
+                with conn.transaction():
+                    with conn.cursor() as cur:
+                        for query, params_seq in statements:
+                            timer = QUERY_STATS.start(query)
+                            timers.append(timer)
+                            params_seq = list(params_seq)
+                            if params_seq:
+                                cur.executemany(query, params_seq, returning=False)
+                            rowcounts.append(max(cur.rowcount, 0) if params_seq else 0)
+                            timer.mark("execute")
+        except Exception as e:
+            for timer in timers:
+                timer.fail()
+            logger.error(f"Transaction rolled back after {len(timers)} of {len(statements)} statements: {e}")
+            return None
+
+        for timer, rows in zip(timers, rowcounts):
+            timer.finish(rows=rows)
+        return rowcounts
+
+    def copy_upsert(self, table: str, columns: Sequence[str], rows: Iterable[tuple],
+                    conflict_columns: Sequence[str], update_columns: Optional[Sequence[str]] = None) -> Optional[int]:
+        """
+        Streams rows into a temporary staging table with COPY, then merges them into
+        `table` with a single INSERT ... ON CONFLICT statement. Everything runs in one
+        transaction, so the target table sees either the whole batch or none of it.
+        Returns the number of upserted rows, or None if the batch was rolled back.
+        """
+        if update_columns is None:
+            update_columns = [c for c in columns if c not in conflict_columns]
+
+        staging = sql.Identifier(f"_staging_{table}")
+        column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+        conflict_list = sql.SQL(", ").join(map(sql.Identifier, conflict_columns))
+        if update_columns:
+            conflict_action = sql.SQL("DO UPDATE SET {}").format(sql.SQL(", ").join(
+                sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c)) for c in update_columns
+            ))
+        else:
+            conflict_action = sql.SQL("DO NOTHING")
+
+        create_staging = sql.SQL("CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(
+            staging, sql.Identifier(table))
+        copy_into_staging = sql.SQL("COPY {} ({}) FROM STDIN").format(staging, column_list)
+        # DISTINCT ON guards against "ON CONFLICT DO UPDATE command cannot affect row a second time"
+        merge = sql.SQL("""
+            INSERT INTO {table} ({columns})
+            SELECT DISTINCT ON ({keys}) {columns} FROM {staging}
+            ON CONFLICT ({keys}) {action}
+        """).format(table=sql.Identifier(table), columns=column_list, keys=conflict_list,
+                    staging=staging, action=conflict_action)
+
+        timer = QUERY_STATS.start(merge)
+        try:
+            with self.get_connection() as conn:
+                timer.mark("pool_wait")
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(create_staging)
+                        with cur.copy(copy_into_staging) as copy:
+                            for row in rows:
+                                copy.write_row(row)
+                        cur.execute(merge)
+                        upserted = cur.rowcount
+                    conn.commit()
+                    timer.mark("execute")
+                except Exception:
+                    conn.rollback()
+                    raise
+        except Exception as e:
+            timer.fail()
+            logger.error(f"Bulk COPY upsert into {table} failed: {e}")
+            return None
+
+        # The staging table is gone by now, so there is nothing to EXPLAIN
+        timer.finish(rows=upserted)
+        return upserted
+
+    def _explain(self, query, params):
+        """Logs the plan of a slow statement. EXPLAIN without ANALYZE never executes it."""
+        statement = sql.SQL("EXPLAIN ") + (query if isinstance(query, sql.Composable) else sql.SQL(query))
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(statement, params)
+                    plan = [row[0] for row in cur.fetchall()]
+                conn.rollback()
+            QUERY_STATS.log_plan(query, plan)
+        except Exception as e:
+            logger.warning(f"Could not EXPLAIN slow query: {e}")
             
     def close_all_connections(self):
         """Closes all connections in the pool. Used during graceful shutdown."""
         if DatabaseManager._connection_pool:
-            DatabaseManager._connection_pool.closeall()
+            DatabaseManager._connection_pool.close()
+            DatabaseManager._connection_pool = None
             logger.info("All PostgreSQL connections closed.")
\ No newline at end of file
@@ -0,0 +1,106 @@
+# shared/export.py
+
+import os
+import sys
+import argparse
+from pathlib import Path
+from typing import Optional
+
+# Allow `python shared/export.py` from the project root
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from shared.db import DatabaseManager
+from shared.logger_config import setup_logger
+from shared.rebalance import drifted_composition_query
+
+logger = setup_logger("DataExporter")
+
+DEFAULT_EXPORT_DIR = Path(__file__).resolve().parent.parent / "data" / "csv"
+
+class DataExporter:
+    """
+    Streams query results to CSV one chunk at a time.
+
+    Built on DatabaseManager.execute_query_chunked, so exporting years of
+    stock_prices holds a single chunk in memory rather than the whole table.
+    """
+
+    def __init__(self, db: Optional[DatabaseManager] = None, export_dir: Optional[Path] = None,
+                 chunk_size: Optional[int] = None):
+        self.db = db or DatabaseManager()
+        self.export_dir = Path(export_dir or os.getenv("EXPORT_DIR", DEFAULT_EXPORT_DIR))
+        self.chunk_size = chunk_size or int(os.getenv("EXPORT_CHUNK_SIZE", "50000"))
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+
+    def export_query(self, query: str, params: tuple, filename: str) -> str:
+        """Writes the query result to export_dir/filename. Returns the path, or "" on failure."""
+        file_path = self.export_dir / filename
+        tmp_path = file_path.with_name(file_path.name + ".part")
+        rows = 0
+        try:
+            with open(tmp_path, "w", newline="") as f:
+                for chunk in self.db.execute_query_chunked(query, params, chunk_size=self.chunk_size):
+                    chunk.to_csv(f, index=False, header=rows == 0)
+                    rows += len(chunk)
+        except Exception as e:
+            logger.error(f"Export to {filename} failed after {rows} rows: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return ""
+
+        if rows == 0:
+            logger.warning(f"Query returned no rows. Aborting export for {filename}.")
+            tmp_path.unlink(missing_ok=True)
+            return ""
+
+        os.replace(tmp_path, file_path)
+        logger.info(f"Successfully exported {rows} rows to {filename}.")
+        return str(file_path)
+
+    def export_stock_prices(self, start_date: str, end_date: str) -> str:
+        query = """
+            SELECT ticker, date, open, high, low, close, volume, volume_weighted_avg, transactions
+            FROM stock_prices
+            WHERE date BETWEEN %s AND %s
+            ORDER BY date, ticker
+        """
+        return self.export_query(query, (start_date, end_date), f"stock_prices_{start_date}_{end_date}.csv")
+
+    def export_performance(self, index_type: str, start_date: str, end_date: str) -> str:
+        query = """
+            SELECT date, index_price, daily_return, index_type
+            FROM index_performance_current
+            WHERE index_type = %s AND date BETWEEN %s AND %s
+            ORDER BY date
+        """
+        formatted_index = index_type.lower().replace(' ', '_')
+        filename = f"performance_{formatted_index}_{start_date}_{end_date}.csv"
+        return self.export_query(query, (index_type, start_date, end_date), filename)
+
+    def export_composition(self, date: str, index_type: str) -> str:
+        # The last rebalance's weights drifted to `date`; identical to the stored rows on a rebalance date
+        query, params = drifted_composition_query(index_type, date)
+        formatted_index = index_type.lower().replace(' ', '_')
+        filename = f"composition_{formatted_index}_{date}.csv"
+        return self.export_query(query, params, filename)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream tables to CSV under data/csv.")
+    parser.add_argument("--prices", nargs=2, metavar=("START", "END"), help="Export stock_prices for a date range.")
+    parser.add_argument("--performance", nargs=3, metavar=("INDEX_TYPE", "START", "END"),
+                        help="Export an index's performance history.")
+    parser.add_argument("--composition", nargs=2, metavar=("INDEX_TYPE", "DATE"),
+                        help="Export an index's constituents on one date.")
+    args = parser.parse_args()
+
+    exporter = DataExporter()
+    try:
+        if args.prices:
+            exporter.export_stock_prices(*args.prices)
+        if args.performance:
+            exporter.export_performance(*args.performance)
+        if args.composition:
+            index_type, date = args.composition
+            exporter.export_composition(date, index_type)
+    finally:
+        exporter.db.close_all_connections()
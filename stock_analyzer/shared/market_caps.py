@@ -0,0 +1,80 @@
+# shared/market_caps.py
+
+import os
+from typing import Optional
+
+import pandas as pd
+
+from .db import DatabaseManager
+from .logger_config import setup_logger
+
+logger = setup_logger("MarketCapHistory")
+
+# How stale an as-of cap may be before the profile's market_cap is used instead
+MARKET_CAP_MAX_AGE_DAYS = int(os.getenv("MARKET_CAP_MAX_AGE_DAYS", "31"))
+
+
+class MarketCapHistory:
+    """
+    Point-in-time market caps in market_cap_history.
+
+    refresh() derives a session's caps from weighted_shares_outstanding x close with
+    one INSERT ... SELECT, so filling a day or a decade is a single statement.
+    as_of() attaches, to every (date, ticker) row of a panel, the newest cap on or
+    before that date, using one range read and one pandas merge_asof.
+    """
+
+    def __init__(self, db: Optional[DatabaseManager] = None):
+        self.db = db or DatabaseManager()
+
+    def refresh(self, start: str, end: Optional[str] = None) -> bool:
+        """(Re)computes the caps of every priced ticker with a known share count in [start, end]."""
+        query = """
+            INSERT INTO market_cap_history (ticker, date, market_cap, shares_outstanding)
+            SELECT sp.ticker, sp.date, sp.close * td.weighted_shares_outstanding, td.weighted_shares_outstanding
+            FROM stock_prices sp
+            JOIN ticker_details td ON td.ticker = sp.ticker
+            WHERE sp.date BETWEEN %s AND %s
+              AND td.weighted_shares_outstanding IS NOT NULL AND sp.close IS NOT NULL
+            ON CONFLICT (ticker, date) DO UPDATE SET
+                market_cap = EXCLUDED.market_cap, shares_outstanding = EXCLUDED.shares_outstanding,
+                update_time = CURRENT_TIMESTAMP
+        """
+        ok = self.db.execute_write(query, (start, end or start))
+        if not ok:
+            logger.error(f"Market cap history refresh failed for {start} -> {end or start}.")
+        return ok
+
+    def as_of(self, panel: pd.DataFrame, fallback_column: Optional[str] = None) -> pd.Series:
+        """
+        Point-in-time caps for a panel with `date` and `ticker` columns, aligned to its
+        index. Rows with no cap within MARKET_CAP_MAX_AGE_DAYS take `fallback_column`
+        (e.g. the profile's current market_cap) if given, else NaN.
+        """
+        fallback = panel[fallback_column] if fallback_column else pd.Series(float('nan'), index=panel.index)
+        if panel.empty:
+            return fallback
+
+        dates = pd.to_datetime(panel['date'])
+        start = dates.min() - pd.Timedelta(days=MARKET_CAP_MAX_AGE_DAYS)
+        try:
+            history = self.db.fetch_columns(
+                "SELECT ticker, date, market_cap FROM market_cap_history WHERE date BETWEEN %s AND %s",
+                (start.date(), dates.max().date())
+            )
+        except TypeError as e:
+            logger.error(f"Market cap history read failed: {e}")
+            history = {}
+        if not history or len(history['ticker']) == 0:
+            return fallback
+
+        history = pd.DataFrame(history)
+        history['date'] = pd.to_datetime(history['date'])
+        left = pd.DataFrame({'date': dates, 'ticker': panel['ticker'].to_numpy(), '_row': range(len(panel))})
+        merged = pd.merge_asof(
+            left.sort_values('date'), history.sort_values('date'),
+            on='date', by='ticker', direction='backward',
+            tolerance=pd.Timedelta(days=MARKET_CAP_MAX_AGE_DAYS)
+        ).sort_values('_row')
+        caps = pd.Series(merged['market_cap'].to_numpy(), index=panel.index)
+        return caps.fillna(fallback)
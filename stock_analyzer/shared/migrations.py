@@ -0,0 +1,300 @@
+# shared/migrations.py
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import datetime
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import psycopg
+
+# Allow `python shared/migrations.py` from the project root
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from shared.db import build_conninfo
+from shared.logger_config import setup_logger
+from shared.rebalance import drifted_composition_query
+
+logger = setup_logger("Migrations")
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "data" / "migrations"
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+# Any fixed key works; it only has to be the same for every service
+ADVISORY_LOCK_KEY = 0x5374_6B41  # "StkA"
+
+CREATE_SCHEMA_MIGRATIONS = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        checksum VARCHAR NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    path: Path
+
+    @property
+    def sql(self) -> str:
+        return self.path.read_text()
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.path.read_bytes()).hexdigest()
+
+
+@dataclass
+class IndexCheck:
+    """A hot query and the tables it must reach through an index."""
+    name: str
+    query: str
+    params: tuple
+    # Tables (or partition prefixes) that must not be sequentially scanned
+    indexed_tables: tuple
+    # Upper bound on stock_prices partitions in the plan; None means not checked
+    max_partitions: Optional[int] = None
+    plan: List[str] = field(default_factory=list)
+    problems: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+
+def index_checks(sample_date: str) -> List[IndexCheck]:
+    """The engine, API and calendar read paths, as they are issued by the services."""
+    return [
+        IndexCheck(
+            "engine: universe panel for one session",
+            """
+            SELECT sp.date, td.ticker, td.market_cap as profile_market_cap, sp.close as close_price
+            FROM ticker_details td
+            JOIN stock_prices sp ON td.ticker = sp.ticker
+            WHERE sp.date BETWEEN %s AND %s AND sp.close IS NOT NULL
+            """,
+            (sample_date, sample_date), ("stock_prices",), max_partitions=1),
+        IndexCheck(
+            "engine: point-in-time market caps",
+            "SELECT ticker, date, market_cap FROM market_cap_history WHERE date BETWEEN %s AND %s",
+            (sample_date, sample_date), ("market_cap_history",)),
+        IndexCheck(
+            "calendar: priced sessions in a window",
+            "SELECT DISTINCT date FROM stock_prices WHERE date BETWEEN %s AND %s",
+            (sample_date, sample_date), ("stock_prices",), max_partitions=1),
+        IndexCheck(
+            "backtest: one ticker's history",
+            "SELECT date, close FROM stock_prices WHERE ticker = %s AND date BETWEEN %s AND %s",
+            ("AAPL", sample_date, sample_date), ("stock_prices",), max_partitions=1),
+        IndexCheck(
+            "api: composition drifted from the last rebalance",
+            *drifted_composition_query("Equal Weighted", sample_date),
+            ("index_composition_current", "stock_prices")),
+        IndexCheck(
+            "api: performance history",
+            """
+            SELECT date, index_price, daily_return, index_type
+            FROM index_performance_current
+            WHERE index_type = %s AND date BETWEEN %s AND %s
+            ORDER BY date
+            """,
+            ("Equal Weighted", sample_date, sample_date), ("index_performance_current",)),
+        IndexCheck(
+            "api: risk metrics history",
+            """
+            SELECT date, index_type, volatility_20, volatility_60, volatility_252, sharpe_252,
+                   benchmark, beta, drawdown, max_drawdown
+            FROM index_risk_metrics
+            WHERE index_type = %s AND date BETWEEN %s AND %s
+            ORDER BY date
+            """,
+            ("Equal Weighted", sample_date, sample_date), ("index_risk_metrics",)),
+        IndexCheck(
+            "engine: history compaction",
+            """
+            SELECT DISTINCT index_type, date, update_time FROM index_composition
+            WHERE date BETWEEN %s AND %s
+            """,
+            (sample_date, sample_date), ("index_composition",)),
+    ]
+
+
+class MigrationRunner:
+    """
+    Applies the numbered SQL files in data/migrations in order, each in its own
+    transaction, and records them in schema_migrations. A session advisory lock
+    serialises services that start at the same time; whoever gets it first
+    migrates and the others find nothing left to do.
+    """
+
+    def __init__(self, migrations_dir: Path = MIGRATIONS_DIR, conninfo: Optional[str] = None):
+        self.migrations_dir = Path(migrations_dir)
+        self.conninfo = conninfo or build_conninfo()
+
+    def discover(self) -> List[Migration]:
+        migrations = []
+        for path in sorted(self.migrations_dir.glob("*.sql")):
+            match = MIGRATION_FILE.match(path.name)
+            if not match:
+                logger.warning(f"Ignoring {path.name}: migration files are named NNNN_description.sql")
+                continue
+            migrations.append(Migration(int(match.group(1)), match.group(2), path))
+
+        versions = [m.version for m in migrations]
+        if len(versions) != len(set(versions)):
+            raise RuntimeError(f"Duplicate migration versions in {self.migrations_dir}")
+        return migrations
+
+    def _applied(self, conn) -> dict:
+        conn.execute(CREATE_SCHEMA_MIGRATIONS)
+        rows = conn.execute("SELECT version, checksum FROM schema_migrations").fetchall()
+        return dict(rows)
+
+    def upgrade(self, target: Optional[int] = None) -> List[Migration]:
+        """Applies every pending migration (up to `target`). Returns the ones applied."""
+        applied_now = []
+        with psycopg.connect(self.conninfo, autocommit=True) as conn:
+            conn.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_KEY,))
+            try:
+                applied = self._applied(conn)
+                for migration in self.discover():
+                    if target is not None and migration.version > target:
+                        break
+                    if migration.version in applied:
+                        if applied[migration.version] != migration.checksum:
+                            logger.warning(f"Migration {migration.path.name} was edited after it was applied.")
+                        continue
+
+                    logger.info(f"Applying migration {migration.path.name}...")
+                    with conn.transaction():
+                        conn.execute(migration.sql)
+                        conn.execute(
+                            "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                            (migration.version, migration.name, migration.checksum)
+                        )
+                    applied_now.append(migration)
+            finally:
+                conn.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_KEY,))
+
+        if applied_now:
+            logger.info(f"Applied {len(applied_now)} migration(s); schema is at version {applied_now[-1].version}.")
+        else:
+            logger.info("Schema is up to date.")
+        return applied_now
+
+    def status(self) -> List[dict]:
+        with psycopg.connect(self.conninfo, autocommit=True) as conn:
+            applied = {
+                version: (checksum, applied_at)
+                for version, checksum, applied_at in conn.execute(
+                    "SELECT version, checksum, applied_at FROM schema_migrations"
+                ).fetchall()
+            } if conn.execute("SELECT to_regclass('schema_migrations')").fetchone()[0] else {}
+
+        report = []
+        for migration in self.discover():
+            checksum, applied_at = applied.get(migration.version, (None, None))
+            if applied_at is None:
+                state = "pending"
+            elif checksum != migration.checksum:
+                state = "modified"
+            else:
+                state = "applied"
+            report.append({"version": migration.version, "name": migration.name,
+                           "state": state, "applied_at": applied_at})
+        return report
+
+    def ensure_partitions(self, years: Optional[Iterable[int]] = None):
+        """Creates any missing yearly stock_prices partitions (default: this year and next)."""
+        this_year = datetime.date.today().year
+        years = sorted(set(years)) if years is not None else [this_year, this_year + 1]
+        with psycopg.connect(self.conninfo, autocommit=True) as conn:
+            if conn.execute("SELECT to_regproc('ensure_stock_prices_partition')").fetchone()[0] is None:
+                # Migration 0002 not applied yet
+                return
+            for year in years:
+                conn.execute("SELECT ensure_stock_prices_partition(%s)", (year,))
+
+    def check_indexes(self, sample_date: Optional[str] = None) -> List[IndexCheck]:
+        """
+        EXPLAINs the hot read paths with sequential scans disabled. A plan that still
+        contains a Seq Scan on a checked table has no usable index for that query, and
+        a date-filtered stock_prices query must touch at most one yearly partition.
+        """
+        sample_date = sample_date or str(datetime.date.today())
+        checks = index_checks(sample_date)
+        with psycopg.connect(self.conninfo) as conn:
+            for check in checks:
+                with conn.transaction(force_rollback=True):
+                    conn.execute("SET LOCAL enable_seqscan = off")
+                    (plan,) = conn.execute("EXPLAIN (FORMAT JSON) " + check.query, check.params).fetchone()
+                    text = conn.execute("EXPLAIN " + check.query, check.params).fetchall()
+                check.plan = [row[0] for row in text]
+                self._evaluate(check, plan if isinstance(plan, list) else json.loads(plan))
+        return checks
+
+    @staticmethod
+    def _evaluate(check: IndexCheck, plan: list):
+        nodes, stack = [], [plan[0]["Plan"]]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(node.get("Plans", []))
+
+        partitions = set()
+        for node in nodes:
+            relation = node.get("Relation Name")
+            if not relation:
+                continue
+            if relation.startswith("stock_prices"):
+                partitions.add(relation)
+            if node["Node Type"] == "Seq Scan" and any(relation.startswith(t) for t in check.indexed_tables):
+                check.problems.append(f"sequential scan on {relation}")
+        if check.max_partitions is not None and len(partitions) > check.max_partitions:
+            check.problems.append(f"scans {len(partitions)} stock_prices partitions: {sorted(partitions)}")
+
+
+def run_migrations():
+    """Called by every service on startup; AUTO_MIGRATE=false leaves the schema to the CLI."""
+    if os.getenv("AUTO_MIGRATE", "true").lower() != "true":
+        return
+    runner = MigrationRunner()
+    runner.upgrade()
+    runner.ensure_partitions()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Versioned schema migrations for the stock analyzer database.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = subcommands.add_parser("upgrade", help="Apply pending migrations")
+    upgrade_parser.add_argument("--target", type=int, default=None, help="Stop after this version")
+    subcommands.add_parser("status", help="List migrations and whether they are applied")
+    check_parser = subcommands.add_parser("check", help="EXPLAIN the hot queries and verify they use indexes")
+    check_parser.add_argument("--date", default=None, help="Session date to plan for (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    runner = MigrationRunner()
+    if args.command == "upgrade":
+        runner.upgrade(args.target)
+        runner.ensure_partitions()
+    elif args.command == "status":
+        for row in runner.status():
+            print(f"{row['version']:04d}  {row['state']:<9} {row['name']:<32} {row['applied_at'] or ''}")
+    elif args.command == "check":
+        results = runner.check_indexes(args.date)
+        for check in results:
+            print(f"[{'PASS' if check.ok else 'FAIL'}] {check.name}")
+            for problem in check.problems:
+                print(f"    - {problem}")
+            if not check.ok:
+                print("\n".join(f"      {line}" for line in check.plan))
+        sys.exit(0 if all(check.ok for check in results) else 1)
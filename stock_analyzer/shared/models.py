@@ -1,16 +1,43 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 class IndexPerformanceResponse(BaseModel):
     """Schema for returning index performance data."""
     date: str = Field(..., description="The trading date (YYYY-MM-DD)")
     index_price: float = Field(..., description="Calculated price of the index")
     daily_return: float = Field(..., description="Percentage return from previous day")
-    index_type: str = Field(..., description="e.g., 'Equal Weighted' or 'Market-Cap Weighted'")
+    index_type: str = Field(..., description="A registered weighting strategy, see /api/v1/index-types")
 
 class IndexCompositionResponse(BaseModel):
     """Schema for returning index composition weights."""
     ticker: str = Field(..., description="Stock ticker symbol")
     weight: float = Field(..., description="Calculated weight of the stock in the index")
     market_cap: Optional[float] = Field(None, description="Company market capitalization")
-    close_price: float = Field(..., description="Closing price on the given date")
\ No newline at end of file
+    close_price: float = Field(..., description="Closing price on the given date")
+
+class IndexSnapshotResponse(BaseModel):
+    """Schema for returning an index's level and constituents for one date."""
+    date: str = Field(..., description="The trading date (YYYY-MM-DD)")
+    index_type: str = Field(..., description="A registered weighting strategy, see /api/v1/index-types")
+    performance: Optional[IndexPerformanceResponse] = Field(None, description="Index level on the date, if calculated")
+    composition: List[IndexCompositionResponse] = Field(default_factory=list, description="Constituent weights on the date")
+
+
+class IndexTypeResponse(BaseModel):
+    """Schema for returning a registered weighting strategy."""
+    name: str = Field(..., description="Value to pass as index_type")
+    description: str = Field(..., description="How constituents are weighted")
+
+
+class IndexRiskResponse(BaseModel):
+    """Schema for returning an index's precomputed risk metrics for one date."""
+    date: str = Field(..., description="The trading date (YYYY-MM-DD)")
+    index_type: str = Field(..., description="A registered weighting strategy, see /api/v1/index-types")
+    volatility_20: Optional[float] = Field(None, description="Annualised volatility of the last 20 daily returns")
+    volatility_60: Optional[float] = Field(None, description="Annualised volatility of the last 60 daily returns")
+    volatility_252: Optional[float] = Field(None, description="Annualised volatility of the last 252 daily returns")
+    sharpe_252: Optional[float] = Field(None, description="Annualised Sharpe ratio over the last 252 sessions")
+    benchmark: Optional[str] = Field(None, description="Index the beta is measured against")
+    beta: Optional[float] = Field(None, description="Rolling beta against the benchmark")
+    drawdown: float = Field(..., description="Decline from the running peak level, as a fraction")
+    max_drawdown: float = Field(..., description="Largest drawdown since the first session, as a fraction")
@@ -0,0 +1,137 @@
+# shared/payload_cache.py
+
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional
+from .logger_config import setup_logger
+
+logger = setup_logger("PayloadCache")
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / "data" / "cache" / "polygon"
+
+# Seconds an entry stays fresh, per endpoint. None means it never expires:
+# grouped aggregates for a session before the latest one are final once published.
+DEFAULT_TTLS = {
+    "grouped_aggs": None,
+    "tickers": 24 * 3600,
+    "ticker_details": 7 * 24 * 3600,
+}
+
+# Sentinel so callers can pass ttl=None ("never expires") explicitly
+_ENDPOINT_TTL = object()
+
+class PayloadCache:
+    """
+    Content-addressed on-disk cache for raw Polygon response bodies.
+
+    Entries are keyed by a SHA-256 of the endpoint name and its request parameters
+    (the API key is never part of the key) and stored gzip-compressed under
+    <cache_dir>/<endpoint>/<hh>/<hash>.json.gz. Reads refresh an entry's mtime, and
+    once the cache grows past max_bytes the least recently used files are evicted.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_bytes: Optional[int] = None,
+                 ttls: Optional[dict] = None, enabled: Optional[bool] = None):
+        self.cache_dir = Path(cache_dir or os.getenv("POLYGON_CACHE_DIR", DEFAULT_CACHE_DIR))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("POLYGON_CACHE_MAX_MB", "1024")) * 1024 * 1024
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.enabled = enabled if enabled is not None else os.getenv("POLYGON_CACHE_ENABLED", "true").lower() == "true"
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+
+        if self.enabled:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._total_bytes = sum(p.stat().st_size for p in self.cache_dir.rglob("*.json.gz"))
+            logger.info(f"Payload cache at {self.cache_dir} ({self._total_bytes / 1e6:.1f} MB).")
+
+    @staticmethod
+    def make_key(endpoint: str, params: Optional[dict] = None) -> str:
+        clean = {k: v for k, v in (params or {}).items() if k != "apiKey"}
+        material = json.dumps({"endpoint": endpoint, "params": clean}, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, endpoint: str, key: str) -> Path:
+        return self.cache_dir / endpoint / key[:2] / f"{key}.json.gz"
+
+    def get(self, endpoint: str, params: Optional[dict] = None, ttl=_ENDPOINT_TTL) -> Optional[bytes]:
+        """Returns the cached raw body, or None on a miss or an expired entry."""
+        if not self.enabled:
+            return None
+        if ttl is _ENDPOINT_TTL:
+            ttl = self.ttls.get(endpoint)
+
+        path = self._path(endpoint, self.make_key(endpoint, params))
+        try:
+            age = time.time() - path.stat().st_mtime
+            if ttl is not None and age > ttl:
+                return None
+            body = gzip.decompress(path.read_bytes())
+            os.utime(path)
+            return body
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, gzip.BadGzipFile) as e:
+            logger.warning(f"Discarding unreadable cache entry {path.name}: {e}")
+            self._remove(path)
+            return None
+
+    def get_json(self, endpoint: str, params: Optional[dict] = None, ttl=_ENDPOINT_TTL) -> Optional[dict]:
+        body = self.get(endpoint, params, ttl)
+        return json.loads(body) if body is not None else None
+
+    def put(self, endpoint: str, params: Optional[dict], body: bytes):
+        """Stores a raw response body. Writes are atomic, so readers never see partial files."""
+        if not self.enabled:
+            return
+        path = self._path(endpoint, self.make_key(endpoint, params))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        compressed = gzip.compress(body, compresslevel=6)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            previous = path.stat().st_size if path.exists() else 0
+            tmp_path.write_bytes(compressed)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry for {endpoint}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            self._total_bytes += len(compressed) - previous
+            over_budget = self._total_bytes > self.max_bytes
+        if over_budget:
+            self._evict()
+
+    def _remove(self, path: Path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        with self._lock:
+            self._total_bytes -= size
+
+    def _evict(self):
+        """Drops least recently used entries until the cache is back under 90% of its budget."""
+        entries = []
+        for path in self.cache_dir.rglob("*.json.gz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, _, path in entries:
+            if self._total_bytes <= target:
+                break
+            self._remove(path)
+            evicted += 1
+        logger.info(f"Evicted {evicted} cache entries; cache now {self._total_bytes / 1e6:.1f} MB.")
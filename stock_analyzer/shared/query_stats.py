@@ -0,0 +1,195 @@
+# shared/query_stats.py
+
+import os
+import re
+import time
+import threading
+from functools import lru_cache
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from .logger_config import setup_logger
+
+logger = setup_logger("QueryStats")
+
+PHASES = ("pool_wait", "execute", "fetch", "materialize")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(query) -> str:
+    """
+    Normalises a statement so every execution of the same query shape shares one key:
+    literals and placeholders become '?', IN-lists collapse, whitespace is squeezed.
+    """
+    if not isinstance(query, str):
+        # psycopg.sql.Composable; identifiers are quoted without needing a connection
+        try:
+            query = query.as_string(None)
+        except Exception:
+            query = str(query)
+    return _normalise(query)
+
+
+@lru_cache(maxsize=4096)
+def _normalise(query: str) -> str:
+    text = _STRING_LITERAL.sub("?", query)
+    text = _PLACEHOLDER.sub("?", text)
+    text = _NUMBER_LITERAL.sub("?", text)
+    text = _IN_LIST.sub("(?)", text)
+    return _WHITESPACE.sub(" ", text).strip().rstrip(";")
+
+
+@dataclass
+class QueryStats:
+    """Running totals for one fingerprint. Times are in seconds."""
+    fingerprint: str
+    calls: int = 0
+    errors: int = 0
+    rows: int = 0
+    slow_calls: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    phases: Dict[str, float] = field(default_factory=lambda: dict.fromkeys(PHASES, 0.0))
+    last_explained: float = 0.0
+
+    def to_dict(self) -> dict:
+        calls = max(self.calls, 1)
+        return {
+            "fingerprint": self.fingerprint,
+            "calls": self.calls,
+            "errors": self.errors,
+            "slow_calls": self.slow_calls,
+            "rows": self.rows,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total * 1000 / calls, 3),
+            "max_ms": round(self.max * 1000, 3),
+            **{f"{phase}_ms": round(seconds * 1000, 3) for phase, seconds in self.phases.items()},
+        }
+
+
+class QueryTimer:
+    """
+    Times one statement. Call mark(phase) as each phase ends; the time since the
+    previous mark is charged to that phase. finish()/fail() record the totals.
+    """
+
+    def __init__(self, registry: "QueryStatsRegistry", query):
+        self.registry = registry
+        self.query = query
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self._last = time.perf_counter()
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases[phase] += now - self._last
+        self._last = now
+
+    def resume(self):
+        """Restarts the clock without charging the gap, e.g. while a generator's consumer ran."""
+        self._last = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return sum(self.phases.values())
+
+    def finish(self, rows: int = 0) -> bool:
+        """Records a successful call. Returns True if it was slow and is due an EXPLAIN."""
+        return self.registry.record(self, rows=rows, failed=False)
+
+    def fail(self):
+        self.registry.record(self, rows=0, failed=True)
+
+
+class QueryStatsRegistry:
+    """
+    In-process registry of per-fingerprint statement timings.
+
+    Every DatabaseManager / AsyncDatabaseManager call records into the module's
+    QUERY_STATS instance. Calls slower than DB_SLOW_QUERY_MS are logged with their
+    phase breakdown, and the caller is asked to attach an EXPLAIN at most once per
+    DB_SLOW_QUERY_EXPLAIN_INTERVAL seconds per fingerprint.
+    """
+
+    def __init__(self, slow_query_ms: Optional[float] = None, explain: Optional[bool] = None,
+                 explain_interval: Optional[float] = None, max_fingerprints: int = 1000):
+        self.slow_query_seconds = (slow_query_ms if slow_query_ms is not None
+                                   else float(os.getenv("DB_SLOW_QUERY_MS", "500"))) / 1000
+        self.explain = explain if explain is not None else os.getenv("DB_SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+        self.explain_interval = explain_interval if explain_interval is not None else float(
+            os.getenv("DB_SLOW_QUERY_EXPLAIN_INTERVAL", "300"))
+        self.max_fingerprints = max_fingerprints
+        self._stats: Dict[str, QueryStats] = {}
+        self._lock = threading.Lock()
+
+    def start(self, query) -> QueryTimer:
+        return QueryTimer(self, query)
+
+    def record(self, timer: QueryTimer, rows: int, failed: bool) -> bool:
+        elapsed = timer.elapsed
+        key = fingerprint(timer.query)
+        slow = elapsed >= self.slow_query_seconds
+        explain_due = False
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    # Unbounded ad-hoc SQL must not grow the registry forever; drop the cheapest entry
+                    del self._stats[min(self._stats.values(), key=lambda s: s.total).fingerprint]
+                stats = self._stats[key] = QueryStats(key)
+            stats.calls += 1
+            stats.rows += rows
+            stats.total += elapsed
+            stats.max = max(stats.max, elapsed)
+            for phase, seconds in timer.phases.items():
+                stats.phases[phase] += seconds
+            if failed:
+                stats.errors += 1
+            if slow:
+                stats.slow_calls += 1
+                now = time.monotonic()
+                if self.explain and not failed and now - stats.last_explained >= self.explain_interval:
+                    stats.last_explained = now
+                    explain_due = True
+
+        if slow:
+            breakdown = ", ".join(f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in timer.phases.items())
+            logger.warning(f"Slow query ({elapsed * 1000:.1f}ms, {rows} rows; {breakdown}): {key[:500]}")
+        return explain_due
+
+    def log_plan(self, query, plan_lines: List[str]):
+        logger.warning(f"EXPLAIN for slow query {fingerprint(query)[:200]}:\n" + "\n".join(plan_lines))
+
+    def snapshot(self, limit: Optional[int] = None, sort_by: str = "total_ms") -> List[dict]:
+        """Per-fingerprint stats, most expensive first."""
+        with self._lock:
+            rows = [stats.to_dict() for stats in self._stats.values()]
+        rows.sort(key=lambda row: row.get(sort_by, 0), reverse=True)
+        return rows[:limit] if limit is not None else rows
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def log_summary(self, limit: int = 10):
+        """Logs the most expensive statements; batch jobs call this before exiting."""
+        top = self.snapshot(limit)
+        if not top:
+            return
+        lines = [
+            f"{row['total_ms']:>12.1f}ms total {row['calls']:>7} calls {row['mean_ms']:>9.2f}ms mean "
+            f"(wait {row['pool_wait_ms']:.0f} / exec {row['execute_ms']:.0f} / fetch {row['fetch_ms']:.0f} / "
+            f"build {row['materialize_ms']:.0f}) {row['fingerprint'][:120]}"
+            for row in top
+        ]
+        logger.info("Top statements by total time:\n" + "\n".join(lines))
+
+
+QUERY_STATS = QueryStatsRegistry()
+
+
+def stats_snapshot(limit: Optional[int] = None, sort_by: str = "total_ms") -> List[dict]:
+    return QUERY_STATS.snapshot(limit, sort_by)
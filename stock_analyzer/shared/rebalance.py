@@ -0,0 +1,92 @@
+# shared/rebalance.py
+
+import datetime
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .trading_calendar import DateLike, TradingCalendar, to_date
+
+# How often the engine reconstitutes the indices: D(aily), W(eekly), M(onthly) or Q(uarterly)
+REBALANCE_FREQUENCY = os.getenv("INDEX_REBALANCE_FREQUENCY", "M")
+# Rebalance frequency -> pandas period; the first session of each period is a rebalance
+REBALANCE_PERIODS = {"D": None, "W": "W", "M": "M", "Q": "Q"}
+
+
+def rebalance_rows(dates: np.ndarray, frequency: str) -> np.ndarray:
+    """Row positions of the first session of every period (every session for "D")."""
+    if frequency not in REBALANCE_PERIODS:
+        raise ValueError(f"Unknown rebalance frequency '{frequency}'. Use one of {list(REBALANCE_PERIODS)}.")
+    if REBALANCE_PERIODS[frequency] is None:
+        return np.arange(len(dates))
+    periods = pd.DatetimeIndex(dates).to_period(REBALANCE_PERIODS[frequency]).asi8
+    return np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+
+
+class RebalanceSchedule:
+    """
+    Reconstitution dates on the exchange calendar: the first session of every week,
+    month or quarter (every session for "D"). The engine only builds compositions on
+    these dates; in between, the index holds the same units and its weights drift
+    with prices.
+    """
+
+    def __init__(self, frequency: Optional[str] = None, calendar: Optional[TradingCalendar] = None):
+        self.frequency = frequency or REBALANCE_FREQUENCY
+        if self.frequency not in REBALANCE_PERIODS:
+            raise ValueError(f"Unknown rebalance frequency '{self.frequency}'. Use one of {list(REBALANCE_PERIODS)}.")
+        self.calendar = calendar or TradingCalendar()
+
+    def period_start(self, day: DateLike) -> datetime.date:
+        day = to_date(day)
+        if REBALANCE_PERIODS[self.frequency] is None:
+            return day
+        return pd.Timestamp(day).to_period(REBALANCE_PERIODS[self.frequency]).start_time.date()
+
+    def dates(self, start: DateLike, end: DateLike) -> List[datetime.date]:
+        """Rebalance sessions in [start, end], oldest first."""
+        # Start from the beginning of start's period so its first session is known
+        sessions = self.calendar.sessions(self.period_start(start), end)
+        if not sessions:
+            return []
+        rows = rebalance_rows(np.array(sessions, dtype='datetime64[D]'), self.frequency)
+        return [sessions[row] for row in rows if sessions[row] >= to_date(start)]
+
+    def is_rebalance(self, day: DateLike) -> bool:
+        return to_date(day) in self.dates(day, day)
+
+
+def drifted_composition_query(index_type: str, date: DateLike) -> Tuple[str, tuple]:
+    """
+    (query, params) for an index's weights on `date`: the last composition on or
+    before it, with each weight scaled by its constituent's price relative (latest
+    close up to `date` / close at the rebalance) and renormalised. On a rebalance
+    date this is the stored composition unchanged.
+    """
+    query = """
+        WITH rebalance AS (
+            SELECT MAX(date) AS date FROM index_composition_current
+            WHERE index_type = %s AND date <= %s
+        ), drifted AS (
+            SELECT c.ticker, c.index_type, c.date AS rebalance_date,
+                   COALESCE(last.close, c.close_price) / c.close_price AS relative,
+                   c.weight, c.market_cap, c.close_price
+            FROM index_composition_current c
+            JOIN rebalance r ON c.date = r.date
+            LEFT JOIN LATERAL (
+                SELECT sp.close FROM stock_prices sp
+                WHERE sp.ticker = c.ticker AND sp.date > r.date AND sp.date <= %s AND sp.close IS NOT NULL
+                ORDER BY sp.date DESC LIMIT 1
+            ) last ON TRUE
+            WHERE c.index_type = %s
+        )
+        SELECT %s::date AS date, rebalance_date, ticker,
+               weight * relative / SUM(weight * relative) OVER () AS weight,
+               market_cap * relative AS market_cap, close_price * relative AS close_price, index_type
+        FROM drifted
+        ORDER BY weight DESC
+    """
+    date = to_date(date)
+    return query, (index_type, date, date, index_type, date)
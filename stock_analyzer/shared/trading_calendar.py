@@ -0,0 +1,154 @@
+# shared/trading_calendar.py
+
+import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Union
+from .logger_config import setup_logger
+
+logger = setup_logger("TradingCalendar")
+
+DateLike = Union[str, datetime.date, datetime.datetime]
+
+# Unscheduled full-day NYSE closures that no holiday rule can derive
+SPECIAL_CLOSURES = {
+    datetime.date(1994, 4, 27): "National Day of Mourning (Nixon)",
+    datetime.date(2001, 9, 11): "September 11 attacks",
+    datetime.date(2001, 9, 12): "September 11 attacks",
+    datetime.date(2001, 9, 13): "September 11 attacks",
+    datetime.date(2001, 9, 14): "September 11 attacks",
+    datetime.date(2004, 6, 11): "National Day of Mourning (Reagan)",
+    datetime.date(2007, 1, 2): "National Day of Mourning (Ford)",
+    datetime.date(2012, 10, 29): "Hurricane Sandy",
+    datetime.date(2012, 10, 30): "Hurricane Sandy",
+    datetime.date(2018, 12, 5): "National Day of Mourning (G.H.W. Bush)",
+    datetime.date(2025, 1, 9): "National Day of Mourning (Carter)",
+}
+
+# Tables the gap query may inspect; all carry a `date` column
+GAP_TABLES = {"stock_prices", "index_composition", "index_composition_current"}
+
+
+def to_date(value: DateLike) -> datetime.date:
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> datetime.date:
+    """n-th (1-based) given weekday of a month; n=-1 is the last one."""
+    if n > 0:
+        first = datetime.date(year, month, 1)
+        return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+    last = next_month - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> datetime.date:
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return datetime.date(year, month, day)
+
+
+def _observed(day: datetime.date) -> datetime.date:
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday."""
+    if day.weekday() == 5:
+        return day - datetime.timedelta(days=1)
+    if day.weekday() == 6:
+        return day + datetime.timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=None)
+def holidays_for_year(year: int) -> Dict[datetime.date, str]:
+    """Full-day NYSE holidays for one year, derived from the exchange's rules."""
+    holidays = {}
+
+    new_year = datetime.date(year, 1, 1)
+    # NYSE does not observe a Saturday New Year's Day on the preceding Friday
+    if new_year.weekday() != 5:
+        holidays[_observed(new_year)] = "New Year's Day"
+    if year >= 1998:
+        holidays[_nth_weekday(year, 1, 0, 3)] = "Martin Luther King Jr. Day"
+    holidays[_nth_weekday(year, 2, 0, 3)] = "Washington's Birthday"
+    holidays[_easter(year) - datetime.timedelta(days=2)] = "Good Friday"
+    holidays[_nth_weekday(year, 5, 0, -1)] = "Memorial Day"
+    if year >= 2022:
+        holidays[_observed(datetime.date(year, 6, 19))] = "Juneteenth"
+    holidays[_observed(datetime.date(year, 7, 4))] = "Independence Day"
+    holidays[_nth_weekday(year, 9, 0, 1)] = "Labor Day"
+    holidays[_nth_weekday(year, 11, 3, 4)] = "Thanksgiving Day"
+    holidays[_observed(datetime.date(year, 12, 25))] = "Christmas Day"
+
+    holidays.update({day: reason for day, reason in SPECIAL_CLOSURES.items() if day.year == year})
+    return holidays
+
+
+class TradingCalendar:
+    """
+    Offline NYSE session calendar.
+
+    Replaces the "yesterday, skipping weekends" guesses scattered across the
+    services: it knows exchange holidays and ad-hoc closures, and can report
+    which expected sessions have no rows yet in stock_prices or index_composition,
+    so jobs process exactly the missing sessions.
+    """
+
+    def is_session(self, day: DateLike) -> bool:
+        day = to_date(day)
+        return day.weekday() < 5 and day not in holidays_for_year(day.year)
+
+    def holiday_name(self, day: DateLike) -> Optional[str]:
+        day = to_date(day)
+        return holidays_for_year(day.year).get(day)
+
+    def sessions(self, start: DateLike, end: DateLike) -> List[datetime.date]:
+        """All trading sessions in [start, end], oldest first."""
+        start, end = to_date(start), to_date(end)
+        return [
+            start + datetime.timedelta(days=offset)
+            for offset in range((end - start).days + 1)
+            if self.is_session(start + datetime.timedelta(days=offset))
+        ]
+
+    def previous_session(self, day: Optional[DateLike] = None) -> datetime.date:
+        """Most recent session strictly before `day` (default: today)."""
+        day = to_date(day or datetime.date.today()) - datetime.timedelta(days=1)
+        while not self.is_session(day):
+            day -= datetime.timedelta(days=1)
+        return day
+
+    def present_dates(self, db, table: str, start: DateLike, end: DateLike,
+                      index_type: Optional[str] = None) -> Set[datetime.date]:
+        """Distinct dates in [start, end] that already have rows in `table`."""
+        if table not in GAP_TABLES:
+            raise ValueError(f"Gap detection is not supported for table '{table}'.")
+
+        query = f"SELECT DISTINCT date FROM {table} WHERE date BETWEEN %s AND %s"
+        params = [to_date(start), to_date(end)]
+        if index_type is not None:
+            query += " AND index_type = %s"
+            params.append(index_type)
+
+        df = db.execute_query(query, tuple(params))
+        return set() if df.empty else {to_date(d) for d in df['date']}
+
+    def missing_sessions(self, db, table: str, start: DateLike, end: DateLike,
+                         index_type: Optional[str] = None) -> List[datetime.date]:
+        """Expected sessions in [start, end] with no rows in `table`, oldest first."""
+        present = self.present_dates(db, table, start, end, index_type)
+        missing = [day for day in self.sessions(start, end) if day not in present]
+        logger.info(f"{table}{f' ({index_type})' if index_type else ''}: "
+                    f"{len(missing)} missing sessions between {to_date(start)} and {to_date(end)}.")
+        return missing
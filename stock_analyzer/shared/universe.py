@@ -0,0 +1,96 @@
+# shared/universe.py
+
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .db import DatabaseManager
+from .logger_config import setup_logger
+from .market_caps import MarketCapHistory
+from .trading_calendar import to_date
+from .weighting_strategies import VOLATILITY_WINDOW
+
+logger = setup_logger("Universe")
+
+UNIVERSE_COLUMNS = ['date', 'ticker', 'market_cap', 'close_price']
+
+# Optional universe columns a weighting strategy can ask for (WeightingStrategy.requires)
+VOLATILITY_CTE = f"""
+WITH log_returns AS (
+    SELECT ticker, date,
+           LN(close / LAG(close) OVER (PARTITION BY ticker ORDER BY date)) AS log_return
+    FROM stock_prices
+    WHERE date BETWEEN %s::date - {VOLATILITY_WINDOW * 2} AND %s AND close > 0
+), volatility AS (
+    -- NULL until a third of the window is available, so a couple of returns cannot dominate
+    SELECT ticker, date,
+           CASE WHEN COUNT(log_return) OVER w >= {max(2, VOLATILITY_WINDOW // 3)}
+                THEN STDDEV_SAMP(log_return) OVER w END AS volatility
+    FROM log_returns
+    WINDOW w AS (PARTITION BY ticker ORDER BY date ROWS BETWEEN {VOLATILITY_WINDOW - 1} PRECEDING AND CURRENT ROW)
+)
+"""
+
+
+def load_universe(db: DatabaseManager, start: str, end: str, sessions: Optional[Iterable] = None,
+                  extra_columns: Iterable[str] = ()) -> pd.DataFrame:
+    """
+    Reads the (date, ticker, market_cap, close_price) panel for [start, end] in one
+    columnar COPY, optionally restricted to the given sessions. extra_columns adds
+    weighted_shares_outstanding and/or a trailing `volatility` to the same read.
+    market_cap is point-in-time (market_cap_history, as of each date); tickers
+    without history fall back to their profile's current market_cap.
+    """
+    extra_columns = tuple(extra_columns)
+    select = ["sp.date", "td.ticker", "td.market_cap as profile_market_cap", "sp.close as close_price"]
+    prefix, joins, params = "", "", []
+    if "weighted_shares_outstanding" in extra_columns:
+        select.append("td.weighted_shares_outstanding")
+    if "volatility" in extra_columns:
+        prefix = VOLATILITY_CTE
+        params += [start, end]
+        select.append("vol.volatility")
+        joins = "LEFT JOIN volatility vol ON vol.ticker = sp.ticker AND vol.date = sp.date"
+
+    query = f"""
+    {prefix}
+    SELECT {", ".join(select)}
+    FROM ticker_details td
+    JOIN stock_prices sp ON td.ticker = sp.ticker
+    {joins}
+    WHERE sp.date BETWEEN %s AND %s AND sp.close IS NOT NULL
+    """
+    params += [start, end]
+    if sessions is not None:
+        query += " AND sp.date = ANY(%s::date[])"
+        params.append([str(day) for day in sessions])
+
+    columns = UNIVERSE_COLUMNS + list(extra_columns)
+    try:
+        panel = db.fetch_columns(query, tuple(params))
+    except TypeError as e:
+        logger.error(f"Universe read failed: {e}")
+        return pd.DataFrame(columns=columns)
+    if not panel:
+        return pd.DataFrame(columns=columns)
+
+    panel = pd.DataFrame(panel)
+    panel['market_cap'] = MarketCapHistory(db).as_of(panel, fallback_column='profile_market_cap')
+    return panel.loc[panel['market_cap'].notna(), columns].reset_index(drop=True)
+
+
+def attach_volatility(db: DatabaseManager, top_stocks: pd.DataFrame) -> pd.DataFrame:
+    """Adds the trailing `volatility` column to a (date, ticker, ...) panel, computed for its tickers and dates only."""
+    query = VOLATILITY_CTE + """
+    SELECT date, ticker, volatility FROM volatility
+    WHERE ticker = ANY(%s) AND date = ANY(%s::date[])
+    """
+    dates = sorted({to_date(day) for day in top_stocks['date']})
+    volatility = db.execute_query(
+        query, (dates[0], dates[-1], top_stocks['ticker'].unique().tolist(), [str(day) for day in dates])
+    )
+    if volatility.empty:
+        return top_stocks.assign(volatility=np.nan)
+    volatility['date'] = volatility['date'].map(to_date)
+    return top_stocks.assign(date=top_stocks['date'].map(to_date)).merge(volatility, on=['date', 'ticker'], how='left')
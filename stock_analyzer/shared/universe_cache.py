@@ -0,0 +1,174 @@
+# shared/universe_cache.py
+
+import os
+import datetime
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .db import DatabaseManager
+from .logger_config import setup_logger
+from .market_caps import MARKET_CAP_MAX_AGE_DAYS
+from .trading_calendar import to_date
+from .universe import load_universe
+
+logger = setup_logger("UniverseCache")
+
+# Columns held per session; anything else a strategy needs is read for the selected rows only
+CACHED_COLUMNS = ("market_cap", "close_price", "weighted_shares_outstanding")
+GLOBAL_SCOPE = "ticker_details"
+# Sessions kept in memory; the least recently used ones are dropped past this
+UNIVERSE_CACHE_SESSIONS = int(os.getenv("UNIVERSE_CACHE_SESSIONS", "512"))
+
+
+def select_top_n(caps: np.ndarray, names: np.ndarray, top_n: int) -> np.ndarray:
+    """
+    Positions of the top_n finite `caps`, largest first, ties going to the lower name
+    (the order IndexConstructor.rank_top_n gives). argpartition finds the cut-off and
+    only the winners are sorted, so this stays linear in the universe.
+    """
+    valid = np.flatnonzero(np.isfinite(caps))
+    if top_n <= 0 or not len(valid):
+        return np.empty(0, dtype=np.int64)
+    if top_n < len(valid):
+        candidates = valid[np.argpartition(-caps[valid], top_n - 1)[:top_n]]
+        cutoff = caps[candidates].min()
+        above = valid[caps[valid] > cutoff]
+        tied = valid[caps[valid] == cutoff]
+        tied = tied[np.argsort(names[tied], kind='stable')][:top_n - len(above)]
+        valid = np.concatenate([above, tied])
+    order = np.lexsort((names[valid], -caps[valid]))
+    return valid[order]
+
+
+@dataclass
+class _Session:
+    """One session of the universe: ticker codes into the cache's dictionary, and one array per column."""
+    version: tuple
+    codes: np.ndarray
+    columns: Dict[str, np.ndarray]
+
+
+class UniverseCache:
+    """
+    In-memory cache of the priced universe, one entry per session, for long-lived
+    processes (the API gateway) that answer repeated top-N requests.
+
+    Tickers are interned once in a dictionary shared by all sessions; each session
+    keeps int32 codes plus float64 arrays of market cap, close and weighted shares
+    outstanding. universe_versions is bumped by triggers on every write (migration
+    0010). A session's market caps are as of the newest market_cap_history row up to
+    MARKET_CAP_MAX_AGE_DAYS back, so its key is the highest date version in that
+    window plus the ticker_details version: one lookup decides which sessions must
+    be reread, and all of them are reread with a single call to `loader`.
+
+    top_n() picks each session's largest caps with select_top_n, ties broken on
+    ticker like IndexConstructor.rank_top_n. At most max_sessions are kept.
+    """
+
+    def __init__(self, loader: Optional[Callable[..., pd.DataFrame]] = None, db: Optional[DatabaseManager] = None,
+                 max_sessions: int = UNIVERSE_CACHE_SESSIONS):
+        self.db = db or DatabaseManager()
+        self.loader = loader or (lambda *args, **kwargs: load_universe(self.db, *args, **kwargs))
+        self.max_sessions = max(1, max_sessions)
+        self._codes: Dict[str, int] = {}
+        self._names = np.empty(0, dtype=object)
+        self._sessions: "OrderedDict[datetime.date, _Session]" = OrderedDict()
+        # Requests are served from a thread pool; one build at a time keeps the dictionary consistent
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def top_n(self, sessions: Iterable, top_n: int) -> pd.DataFrame:
+        """The top_n tickers by market cap on each of `sessions`, as a (date, ticker, ...) panel."""
+        sessions = sorted({to_date(day) for day in sessions})
+        if not sessions:
+            return pd.DataFrame(columns=['date', 'ticker', *CACHED_COLUMNS])
+        if len(sessions) > self.max_sessions:
+            raise ValueError(f"{len(sessions)} sessions requested; the universe cache holds at most {self.max_sessions}.")
+
+        with self._lock:
+            # Mark the requested sessions used first, so making room never evicts one of them
+            for day in sessions:
+                if day in self._sessions:
+                    self._sessions.move_to_end(day)
+            self.refresh(sessions)
+            entries = [self._sessions[day] for day in sessions]
+            selected = [self._select(entry, top_n) for entry in entries]
+            codes = np.concatenate([entry.codes[rows] for entry, rows in zip(entries, selected)])
+            return pd.DataFrame({
+                'date': np.repeat(np.array(sessions, dtype=object), [len(rows) for rows in selected]),
+                'ticker': self._names[codes],
+                **{name: np.concatenate([entry.columns[name][rows] for entry, rows in zip(entries, selected)])
+                   for name in CACHED_COLUMNS},
+            })
+
+    def refresh(self, sessions: List[datetime.date]) -> List[datetime.date]:
+        """Rereads the sessions whose version changed or that are not cached yet. Returns them."""
+        versions = self._versions(sessions)
+        stale = [day for day in sessions
+                 if day not in self._sessions or self._sessions[day].version != versions[day]]
+        if not stale:
+            return []
+
+        panel = self.loader(str(stale[0]), str(stale[-1]), sessions=stale,
+                            extra_columns=("weighted_shares_outstanding",))
+        panel = panel.sort_values('date', kind='stable')
+        dates = pd.to_datetime(panel['date']).dt.date.to_numpy()
+        codes = self._intern(panel['ticker'].to_numpy(dtype=object))
+        columns = {name: panel[name].to_numpy(dtype=float) for name in CACHED_COLUMNS}
+        starts, stops = np.searchsorted(dates, stale, side='left'), np.searchsorted(dates, stale, side='right')
+        for day, start, stop in zip(stale, starts, stops):
+            self._sessions[day] = _Session(
+                versions[day], codes[start:stop], {name: values[start:stop] for name, values in columns.items()}
+            )
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        logger.info(f"Loaded {len(stale)} sessions into the universe cache ({len(self._sessions)} cached).")
+        return stale
+
+    def _versions(self, sessions: List[datetime.date]) -> Dict[datetime.date, tuple]:
+        """
+        (highest date version in [day - MARKET_CAP_MAX_AGE_DAYS, day], ticker_details
+        version) per session; 0 where nothing was written since the migration. Date
+        scopes are ISO strings, so the window is a plain range on the primary key.
+        """
+        lookback = datetime.timedelta(days=MARKET_CAP_MAX_AGE_DAYS)
+        df = self.db.execute_query(
+            "SELECT scope, version FROM universe_versions WHERE scope = %s OR scope BETWEEN %s AND %s",
+            (GLOBAL_SCOPE, str(sessions[0] - lookback), str(sessions[-1]))
+        )
+        scopes = {} if df.empty else dict(zip(df['scope'], df['version']))
+        global_version = int(scopes.pop(GLOBAL_SCOPE, 0))
+
+        written = sorted(scopes)
+        days = np.array(written, dtype='datetime64[D]')
+        versions = np.array([scopes[day] for day in written], dtype=np.int64)
+        wanted = np.array(sessions, dtype='datetime64[D]')
+        starts = np.searchsorted(days, wanted - np.timedelta64(MARKET_CAP_MAX_AGE_DAYS, 'D'), side='left')
+        stops = np.searchsorted(days, wanted, side='right')
+        return {day: (int(versions[start:stop].max(initial=0)), global_version)
+                for day, start, stop in zip(sessions, starts, stops)}
+
+    def _intern(self, tickers: np.ndarray) -> np.ndarray:
+        """Codes of `tickers` in the dictionary, adding the new ones."""
+        unique, inverse = np.unique(tickers, return_inverse=True)
+        new = [ticker for ticker in unique if ticker not in self._codes]
+        if new:
+            for ticker in new:
+                self._codes[ticker] = len(self._codes)
+            self._names = np.concatenate([self._names, np.array(new, dtype=object)])
+        return np.array([self._codes[ticker] for ticker in unique], dtype=np.int32)[inverse]
+
+    def _select(self, entry: _Session, top_n: int) -> np.ndarray:
+        """Row positions of the session's top_n caps, largest first."""
+        return select_top_n(entry.columns['market_cap'], self._names[entry.codes], top_n)
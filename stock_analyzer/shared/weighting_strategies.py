@@ -0,0 +1,114 @@
+# shared/weighting_strategies.py
+
+import os
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+# Per-constituent limit for the capped scheme; raised to 1/N when N names cannot fit under it
+WEIGHT_CAP = float(os.getenv("INDEX_WEIGHT_CAP", "0.25"))
+# Sessions of daily log returns behind the inverse-volatility scheme
+VOLATILITY_WINDOW = int(os.getenv("INDEX_VOLATILITY_WINDOW", "60"))
+
+
+@dataclass(frozen=True)
+class WeightingStrategy:
+    """
+    A weighting scheme over a long-format top-N panel: one row per (date, constituent)
+    with at least date, ticker, market_cap and close_price, plus any `requires`
+    columns. `weigh` returns one weight per row, summing to 1 within each date, and
+    must work on the whole panel at once (groupby/transform, no per-row loops).
+    """
+    name: str
+    description: str
+    weigh: Callable[[pd.DataFrame], pd.Series]
+    # Extra universe columns the engine has to load for this scheme
+    requires: Tuple[str, ...] = ()
+
+
+STRATEGIES: Dict[str, WeightingStrategy] = {}
+
+
+def register(name: str, description: str, requires: Tuple[str, ...] = ()):
+    """Decorator that adds a weighting function to the registry under `name`."""
+    def decorator(weigh: Callable[[pd.DataFrame], pd.Series]):
+        STRATEGIES[name] = WeightingStrategy(name, description, weigh, tuple(requires))
+        return weigh
+    return decorator
+
+
+def get_strategy(name: str) -> WeightingStrategy:
+    try:
+        return STRATEGIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown index type '{name}'. Available: {strategy_names()}") from None
+
+
+def strategy_names() -> List[str]:
+    return list(STRATEGIES)
+
+
+def required_columns(names) -> Tuple[str, ...]:
+    """Union of the extra columns the given strategies need, in a stable order."""
+    return tuple(dict.fromkeys(column for name in names for column in get_strategy(name).requires))
+
+
+def _normalise(scores: pd.Series, dates: pd.Series) -> pd.Series:
+    return scores / scores.groupby(dates).transform('sum')
+
+
+def _cap(weights: pd.Series, dates: pd.Series, cap: float) -> pd.Series:
+    """
+    Caps each weight at `cap` and hands the excess to the uncapped names pro rata,
+    repeating until nothing exceeds the cap. Each pass covers every date at once, so
+    the number of passes is bounded by the constituents per date, not the dates.
+    """
+    cap = np.maximum(cap, 1 / dates.map(dates.value_counts()))
+    capped = pd.Series(False, index=weights.index)
+    result = weights
+    for _ in range(int(dates.value_counts().max())):
+        free = weights.where(~capped, 0.0)
+        remaining = 1 - (cap * capped).groupby(dates).transform('sum')
+        result = pd.Series(np.where(capped, cap, _normalise(free, dates).fillna(0.0) * remaining), index=weights.index)
+        newly_capped = (result > cap + 1e-12) & ~capped
+        if not newly_capped.any():
+            break
+        capped |= newly_capped
+    return result
+
+
+@register("Equal Weighted", "Each of the top N stocks gets 1/N.")
+def equal_weighted(panel: pd.DataFrame) -> pd.Series:
+    return 1 / panel.groupby('date')['ticker'].transform('size')
+
+
+@register("Market-Cap Weighted", "Weight proportional to market capitalisation.")
+def market_cap_weighted(panel: pd.DataFrame) -> pd.Series:
+    return _normalise(panel['market_cap'], panel['date'])
+
+
+@register("Capped Market-Cap", f"Market-cap weights capped at {WEIGHT_CAP:.0%} per stock, excess redistributed pro rata.")
+def capped_market_cap(panel: pd.DataFrame) -> pd.Series:
+    return _cap(market_cap_weighted(panel), panel['date'], WEIGHT_CAP)
+
+
+@register("Float-Adjusted", "Weight proportional to close x weighted shares outstanding (market cap where unknown).",
+          requires=("weighted_shares_outstanding",))
+def float_adjusted(panel: pd.DataFrame) -> pd.Series:
+    float_cap = (panel['close_price'] * panel['weighted_shares_outstanding']).fillna(panel['market_cap'])
+    return _normalise(float_cap, panel['date'])
+
+
+@register("Square-Root Cap", "Weight proportional to the square root of market capitalisation.")
+def square_root_cap(panel: pd.DataFrame) -> pd.Series:
+    return _normalise(np.sqrt(panel['market_cap']), panel['date'])
+
+
+@register("Inverse Volatility", f"Weight proportional to 1 / volatility of the last {VOLATILITY_WINDOW} daily returns.",
+          requires=("volatility",))
+def inverse_volatility(panel: pd.DataFrame) -> pd.Series:
+    # Names without enough history take the date's median volatility
+    volatility = panel['volatility'].where(panel['volatility'] > 0)
+    volatility = volatility.fillna(volatility.groupby(panel['date']).transform('median')).fillna(1.0)
+    return _normalise(1 / volatility, panel['date'])
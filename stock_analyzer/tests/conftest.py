@@ -0,0 +1,7 @@
+# tests/conftest.py
+
+import sys
+from pathlib import Path
+
+# Import `shared` and `services` the same way the services do
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,179 @@
+# tests/test_api.py
+
+import asyncio
+import datetime
+from contextlib import asynccontextmanager
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from services.api import main as api
+from shared import async_db
+from shared.async_db import AsyncDatabaseManager
+
+
+class FakeAsyncDB:
+    """Returns canned frames per table, or raises like the real manager does when the database is down."""
+
+    def __init__(self, frames=None, error=None):
+        self.frames = frames or {}
+        self.error = error
+
+    async def execute_query(self, query, params=None):
+        if self.error:
+            raise self.error
+        for table, frame in self.frames.items():
+            if table in query:
+                return frame
+        return pd.DataFrame()
+
+
+@pytest.fixture
+def client():
+    # No `with`: the lifespan (migrations, pool) never runs
+    return TestClient(api.app)
+
+
+PERFORMANCE = pd.DataFrame({
+    "date": [datetime.date(2024, 3, 1)], "index_price": [1012.5], "daily_return": [0.0125],
+    "index_type": ["Equal Weighted"],
+})
+COMPOSITION = pd.DataFrame({
+    "date": [datetime.date(2024, 3, 1)] * 2, "rebalance_date": [datetime.date(2024, 3, 1)] * 2,
+    "ticker": ["AAA", "BBB"], "weight": [0.5, 0.5], "market_cap": [2e9, float("nan")],
+    "close_price": [10.0, 20.0], "index_type": ["Equal Weighted"] * 2,
+})
+
+
+def test_performance(client, monkeypatch):
+    monkeypatch.setattr(api, "db", FakeAsyncDB({"index_performance_current": PERFORMANCE}))
+    response = client.get("/api/v1/performance", params={"start_date": "2024-03-01", "end_date": "2024-03-01"})
+    assert response.status_code == 200
+    assert response.json() == [{"date": "2024-03-01", "index_price": 1012.5, "daily_return": 0.0125,
+                                "index_type": "Equal Weighted"}]
+
+
+def test_empty_result_is_not_an_error(client, monkeypatch):
+    monkeypatch.setattr(api, "db", FakeAsyncDB())
+    response = client.get("/api/v1/risk", params={"start_date": "2024-03-01", "end_date": "2024-03-31"})
+    assert response.status_code == 200 and response.json() == []
+
+
+def test_snapshot_combines_level_and_drifted_composition(client, monkeypatch):
+    monkeypatch.setattr(api, "db", FakeAsyncDB({"index_performance_current": PERFORMANCE,
+                                                 "index_composition_current": COMPOSITION}))
+    body = client.get("/api/v1/snapshot", params={"target_date": "2024-03-01"}).json()
+    assert body["performance"]["index_price"] == 1012.5
+    assert [c["ticker"] for c in body["composition"]] == ["AAA", "BBB"]
+    assert body["composition"][1]["market_cap"] is None
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/api/v1/performance", {"start_date": "2024-03-01", "end_date": "2024-03-31"}),
+    ("/api/v1/risk", {"start_date": "2024-03-01", "end_date": "2024-03-31"}),
+    ("/api/v1/composition", {"target_date": "2024-03-01"}),
+    ("/api/v1/snapshot", {"target_date": "2024-03-01"}),
+])
+def test_database_failure_is_a_500(client, monkeypatch, path, params):
+    monkeypatch.setattr(api, "db", FakeAsyncDB(error=RuntimeError("connection refused")))
+    response = client.get(path, params=params)
+    assert response.status_code == 500
+    assert "connection refused" in response.json()["detail"]
+
+
+def test_unknown_index_type_is_a_422(client):
+    response = client.get("/api/v1/composition", params={"target_date": "2024-03-01", "index_type": "Nope"})
+    assert response.status_code == 422
+
+
+def test_index_types_lists_the_registry(client):
+    names = [t["name"] for t in client.get("/api/v1/index-types").json()]
+    assert "Equal Weighted" in names
+
+
+def test_async_execute_query_raises_instead_of_returning_empty(monkeypatch):
+    manager = AsyncDatabaseManager()
+
+    @asynccontextmanager
+    async def broken_connection():
+        raise OSError("pool closed")
+        yield
+
+    monkeypatch.setattr(manager, "get_connection", broken_connection)
+    with pytest.raises(OSError):
+        asyncio.run(manager.execute_query("SELECT 1"))
+
+
+class FakePool:
+    def __init__(self, conninfo, **kwargs):
+        self.state = "created"
+
+    async def open(self, wait=False):
+        assert self.state == "created", "a closed pool cannot be reopened"
+        self.state = "open"
+
+    async def close(self):
+        self.state = "closed"
+
+
+def test_async_manager_can_be_reopened_after_close(monkeypatch):
+    monkeypatch.setattr(async_db, "AsyncConnectionPool", FakePool)
+    monkeypatch.setattr(AsyncDatabaseManager, "_connection_pool", None)
+    manager = AsyncDatabaseManager()
+
+    async def lifespans():
+        await manager.open()
+        first = AsyncDatabaseManager._connection_pool
+        await manager.close()
+        await manager.open()
+        return first, AsyncDatabaseManager._connection_pool
+
+    first, second = asyncio.run(lifespans())
+    assert first.state == "closed" and second.state == "open" and first is not second
+
+
+class FakeUniverseCache:
+    db = None
+
+    def __init__(self, panel=None, error=None):
+        self.panel = panel if panel is not None else pd.DataFrame()
+        self.error = error
+        self.calls = []
+
+    def top_n(self, sessions, top_n):
+        self.calls.append((list(sessions), top_n))
+        if self.error:
+            raise self.error
+        return self.panel.head(top_n)
+
+
+def test_preview_weighs_the_cached_top_n(client, monkeypatch):
+    cache = FakeUniverseCache(pd.DataFrame({
+        "date": [datetime.date(2024, 3, 1)] * 2, "ticker": ["AAA", "BBB"], "market_cap": [3e9, 1e9],
+        "close_price": [10.0, 20.0], "weighted_shares_outstanding": [3e8, 5e7],
+    }))
+    monkeypatch.setattr(api, "_universe_cache", cache)
+    response = client.get("/api/v1/preview", params={"target_date": "2024-03-01",
+                                                     "index_type": "Market-Cap Weighted", "top_n": 2})
+    assert response.status_code == 200
+    assert [(c["ticker"], c["weight"]) for c in response.json()] == [("AAA", 0.75), ("BBB", 0.25)]
+    assert cache.calls == [(["2024-03-01"], 2)]
+
+
+def test_preview_failure_is_a_500_and_top_n_must_be_positive(client, monkeypatch):
+    monkeypatch.setattr(api, "_universe_cache", FakeUniverseCache(error=RuntimeError("connection refused")))
+    response = client.get("/api/v1/preview", params={"target_date": "2024-03-01"})
+    assert response.status_code == 500 and "connection refused" in response.json()["detail"]
+    assert client.get("/api/v1/preview", params={"target_date": "2024-03-01", "top_n": 0}).status_code == 422
+
+
+def test_preview_accepts_a_large_top_n(client, monkeypatch):
+    tickers = [f"T{i:04d}" for i in range(3200)]
+    cache = FakeUniverseCache(pd.DataFrame({
+        "date": datetime.date(2024, 3, 1), "ticker": tickers, "market_cap": 1e9, "close_price": 10.0,
+    }))
+    monkeypatch.setattr(api, "_universe_cache", cache)
+    response = client.get("/api/v1/preview", params={"target_date": "2024-03-01", "top_n": 3000})
+    assert response.status_code == 200 and len(response.json()) == 3000
+    assert cache.calls == [(["2024-03-01"], 3000)]
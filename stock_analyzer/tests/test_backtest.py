@@ -0,0 +1,106 @@
+# tests/test_backtest.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.index_engine.backtest import BacktestConfig, BacktestPanel, simulate, target_weights, trailing_volatility
+from services.index_engine.main import IndexConstructor
+from shared.universe_cache import select_top_n
+from shared.weighting_strategies import VOLATILITY_WINDOW
+
+
+def sql_volatility(closes):
+    """Brute-force VOLATILITY_CTE for one ticker: {position: volatility} over its positive closes."""
+    priced = [(i, c) for i, c in enumerate(closes) if c == c and c > 0]
+    returns = [None] + [np.log(c / p) for (_, p), (_, c) in zip(priced, priced[1:])]
+    out = {}
+    for k, (i, _) in enumerate(priced):
+        window = [r for r in returns[max(0, k - VOLATILITY_WINDOW + 1):k + 1] if r is not None]
+        out[i] = np.std(window, ddof=1) if len(window) >= max(2, VOLATILITY_WINDOW // 3) else np.nan
+    return out
+
+
+def test_trailing_volatility_matches_engine_statistic():
+    rng = np.random.default_rng(3)
+    sessions, tickers = 150, 3
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (sessions, tickers)), axis=0))
+    # Gaps: a missing print and a non-positive close are skipped, not carried forward
+    close[rng.random(close.shape) < 0.15] = np.nan
+    close[40, 1] = 0.0
+
+    date_codes, ticker_codes = np.nonzero(~np.isnan(close))
+    result = trailing_volatility(ticker_codes, date_codes, close[date_codes, ticker_codes])
+
+    for t in range(tickers):
+        expected = sql_volatility(close[:, t])
+        mine = result[ticker_codes == t]
+        rows = date_codes[ticker_codes == t]
+        np.testing.assert_allclose(mine, [expected.get(i, np.nan) for i in rows], equal_nan=True)
+
+
+def test_missing_session_is_not_a_zero_return():
+    # Prices alternate, with every other session missing for half the history
+    close = np.array([100.0, 110.0] * 40)
+    close[1::4] = np.nan
+    rows = np.flatnonzero(~np.isnan(close))
+    result = trailing_volatility(np.zeros(len(rows), dtype=int), rows, close[rows])
+    filled = pd.Series(close).ffill()
+    ffilled_volatility = np.log(filled / filled.shift(1)).rolling(VOLATILITY_WINDOW, min_periods=max(2, VOLATILITY_WINDOW // 3)).std().iloc[-1]
+    assert result[-1] == pytest.approx(sql_volatility(close)[len(close) - 1])
+    assert result[-1] != pytest.approx(ffilled_volatility)
+
+
+def test_select_top_n_breaks_ties_on_name():
+    caps = np.array([5.0, 7.0, 5.0, np.nan, 5.0, 9.0])
+    names = np.array(["E", "B", "C", "A", "D", "F"], dtype=object)
+    assert select_top_n(caps, names, 3).tolist() == [5, 1, 2]
+    assert select_top_n(caps, names, 4).tolist() == [5, 1, 2, 4]
+    assert select_top_n(caps, names, 10).tolist() == [5, 1, 2, 4, 0]
+    assert select_top_n(caps, names, 0).tolist() == []
+    assert select_top_n(np.full(3, np.nan), names[:3], 2).tolist() == []
+
+
+def test_select_top_n_agrees_with_rank_top_n():
+    rng = np.random.default_rng(7)
+    names = np.array([f"T{i:03d}" for i in rng.permutation(300)], dtype=object)
+    caps = rng.integers(1, 20, 300).astype(float)  # plenty of ties
+    panel = pd.DataFrame({"date": "d", "ticker": names, "market_cap": caps})
+    for top_n in (1, 5, 37, 300):
+        expected = IndexConstructor.rank_top_n(panel, top_n)["ticker"].tolist()
+        assert names[select_top_n(caps, names, top_n)].tolist() == expected
+
+
+def make_panel(close, market_cap, tickers):
+    close = np.asarray(close, dtype=float)
+    shape = close.shape
+    return BacktestPanel(
+        pd.date_range("2024-03-01", periods=shape[0], freq="B").to_numpy(),
+        np.asarray(tickers, dtype=object),
+        {"close": close, "printed": np.ones(shape, dtype=bool),
+         "market_cap": np.asarray(market_cap, dtype=float),
+         "weighted_shares_outstanding": np.full(shape, np.nan), "volatility": np.full(shape, np.nan)},
+    )
+
+
+def test_target_weights_use_engine_tie_break():
+    # Three tickers tied on cap; the engine keeps the two lowest names
+    panel = make_panel([[10, 10, 10], [10, 10, 10]], [[5, 5, 5], [5, 5, 5]], ["CCC", "AAA", "BBB"])
+    weights = target_weights(panel, BacktestConfig("Equal Weighted", 2), np.array([0, 1]))
+    np.testing.assert_allclose(weights, [[0, 0.5, 0.5], [0, 0.5, 0.5]])
+
+
+def test_target_weights_skip_tickers_without_a_print():
+    panel = make_panel([[10, 10, 10]], [[9, 5, 1]], ["AAA", "BBB", "CCC"])
+    panel.matrices["printed"][0, 0] = False
+    weights = target_weights(panel, BacktestConfig("Market-Cap Weighted", 2), np.array([0]))
+    np.testing.assert_allclose(weights, [[0, 5 / 6, 1 / 6]])
+
+
+def test_simulate_buys_and_holds_between_rebalances():
+    close = [[10, 20], [11, 20], [12, 22]]
+    panel = make_panel(close, [[1, 1]] * 3, ["AAA", "BBB"])
+    result = simulate(panel, BacktestConfig("Equal Weighted", 2, rebalance="M"))
+    # Half in each at the first close, held: 0.5 * 12/10 + 0.5 * 22/20 - 1
+    assert result["total_return"] == pytest.approx(0.15)
+    assert result["rebalances"] == 1
@@ -0,0 +1,110 @@
+# tests/test_binary_copy.py
+
+import datetime
+import struct
+from array import array
+
+import numpy as np
+import pytest
+
+from shared import binary_copy
+from shared.binary_copy import SIGNATURE, check_supported, decode
+
+INT8, FLOAT8, DATE, BOOL, INT4, VARCHAR, TEXT, TIMESTAMP = 20, 701, 1082, 16, 23, 1043, 25, 1114
+PG_EPOCH = datetime.date(2000, 1, 1)
+
+
+def encode_field(value, oid):
+    if value is None:
+        return struct.pack(">i", -1)
+    if oid == INT8:
+        payload = struct.pack(">q", value)
+    elif oid == INT4:
+        payload = struct.pack(">i", value)
+    elif oid == FLOAT8:
+        payload = struct.pack(">d", value)
+    elif oid == BOOL:
+        payload = struct.pack("?", value)
+    elif oid == DATE:
+        payload = struct.pack(">i", (value - PG_EPOCH).days)
+    elif oid == TIMESTAMP:
+        delta = value - datetime.datetime(2000, 1, 1)
+        payload = struct.pack(">q", (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+    else:
+        payload = value.encode("utf-8")
+    return struct.pack(">i", len(payload)) + payload
+
+
+def copy_stream(rows, oids, extension=b""):
+    """A binary COPY body split into messages the way the server sends them."""
+    header = SIGNATURE + struct.pack(">ii", 0, len(extension)) + extension
+    tuples = [struct.pack(">h", len(oids)) + b"".join(encode_field(v, oid) for v, oid in zip(row, oids))
+              for row in rows]
+    trailer = struct.pack(">h", -1)
+    if tuples:
+        messages = [header + tuples[0], *tuples[1:], trailer]
+    else:
+        messages = [header + trailer]
+    return bytearray(b"".join(messages)), array("q", [len(m) for m in messages])
+
+
+def test_fixed_width_rows_take_the_structured_path(monkeypatch):
+    oids = [INT8, FLOAT8, DATE, BOOL]
+    rows = [(1, 1.5, datetime.date(2024, 3, 1), True), (-2, -0.25, datetime.date(1999, 12, 31), False)]
+    monkeypatch.setattr(binary_copy, "_decode_general", lambda *a: pytest.fail("general path used"))
+
+    columns = decode(*copy_stream(rows, oids), ["id", "x", "d", "b"], oids)
+    assert columns["id"].tolist() == [1, -2] and columns["id"].dtype == np.int64
+    assert columns["x"].tolist() == [1.5, -0.25]
+    assert columns["d"].tolist() == [datetime.date(2024, 3, 1), datetime.date(1999, 12, 31)]
+    assert columns["b"].tolist() == [True, False]
+
+
+def test_nulls_fall_back_to_general_path():
+    oids = [INT4, FLOAT8, DATE, BOOL, TIMESTAMP]
+    rows = [(1, None, datetime.date(2024, 3, 1), None, datetime.datetime(2024, 3, 1, 16, 0, 0, 5)),
+            (None, 2.0, None, True, None)]
+    columns = decode(*copy_stream(rows, oids), ["i", "f", "d", "b", "ts"], oids)
+
+    # Integers with NULLs widen to float64 like pandas
+    assert columns["i"].dtype == np.float64 and columns["i"][0] == 1 and np.isnan(columns["i"][1])
+    assert np.isnan(columns["f"][0]) and columns["f"][1] == 2.0
+    assert columns["d"][0] == np.datetime64("2024-03-01") and np.isnat(columns["d"][1])
+    assert columns["b"].tolist() == [None, True]
+    assert columns["ts"][0] == np.datetime64("2024-03-01T16:00:00.000005") and np.isnat(columns["ts"][1])
+
+
+def test_text_columns_short_and_long():
+    oids = [VARCHAR, TEXT, INT8]
+    long_text = "x" * 100 + "é"
+    rows = [("AAPL", long_text, 1), ("MSFT", None, 2), ("AAPL", "", 3), (None, "short", 4)]
+    columns = decode(*copy_stream(rows, oids), ["ticker", "description", "n"], oids)
+    assert columns["ticker"].tolist() == ["AAPL", "MSFT", "AAPL", None]
+    assert columns["description"].tolist() == [long_text, None, "", "short"]
+    assert columns["n"].tolist() == [1, 2, 3, 4]
+
+
+def test_empty_streams():
+    fixed = decode(*copy_stream([], [INT8, FLOAT8]), ["a", "b"], [INT8, FLOAT8])
+    assert [len(v) for v in fixed.values()] == [0, 0]
+    assert fixed["a"].dtype == np.int64
+
+    mixed = decode(*copy_stream([], [VARCHAR, FLOAT8]), ["t", "x"], [VARCHAR, FLOAT8])
+    assert [len(v) for v in mixed.values()] == [0, 0]
+
+
+def test_header_extension_is_skipped():
+    oids = [INT8, VARCHAR]
+    columns = decode(*copy_stream([(7, "A")], oids, extension=b"\x00" * 6), ["n", "t"], oids)
+    assert columns["n"].tolist() == [7] and columns["t"].tolist() == ["A"]
+
+
+def test_rejects_non_copy_stream():
+    with pytest.raises(ValueError):
+        decode(bytearray(b"not a copy stream at all"), array("q", [24]), ["a"], [INT8])
+
+
+def test_unsupported_types_are_named():
+    check_supported(["a", "b"], [INT8, VARCHAR])
+    with pytest.raises(TypeError, match="'price'"):
+        check_supported(["a", "price"], [INT8, 1700])  # numeric
@@ -0,0 +1,73 @@
+# tests/test_changes.py
+
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.index_engine.changes import CompositionChangeDetector
+
+D = datetime.date
+
+
+def compositions(*sessions):
+    """(date, {ticker: weight}) pairs -> long-format rows, in scrambled order like a SQL result."""
+    rows = [(day, ticker, weight) for day, members in sessions for ticker, weight in members.items()]
+    return pd.DataFrame(rows[::-1], columns=["date", "ticker", "weight"])
+
+
+class FakeDB:
+    def __init__(self, last, rows):
+        self.last = last
+        self.rows = rows
+        self.stored = None
+
+    def execute_query(self, query, params=None):
+        if "index_composition_changes" in query:
+            return pd.DataFrame({"date": [self.last]})
+        return self.rows
+
+    def execute_transaction(self, statements):
+        self.stored = statements[0][1]
+        return [len(self.stored)]
+
+
+def test_diff_reports_added_removed_and_turnover():
+    changes = CompositionChangeDetector.diff(compositions(
+        (D(2024, 3, 1), {"AAA": 0.5, "BBB": 0.5}),
+        (D(2024, 3, 4), {"AAA": 0.4, "CCC": 0.6}),
+        (D(2024, 3, 5), {"AAA": 0.4, "CCC": 0.6}),
+    ))
+    assert changes["date"].tolist() == [D(2024, 3, 1), D(2024, 3, 4), D(2024, 3, 5)]
+    assert changes["prev_date"].tolist() == [None, D(2024, 3, 1), D(2024, 3, 4)]
+    assert changes["symbols"].tolist() == ["AAA,BBB", "AAA,CCC", "AAA,CCC"]
+    assert pd.isna(changes["prev_symbols"][0])
+    assert changes["prev_symbols"][1:].tolist() == ["AAA,BBB", "AAA,CCC"]
+    assert changes["added"].tolist() == [["AAA", "BBB"], ["CCC"], []]
+    assert changes["removed"].tolist() == [[], ["BBB"], []]
+    assert np.isnan(changes["turnover"][0])
+    # |0.4 - 0.5| + |0 - 0.5| + |0.6 - 0| = 1.2, halved
+    assert changes["turnover"][1:].tolist() == pytest.approx([0.6, 0.0])
+
+
+def test_diff_single_session():
+    changes = CompositionChangeDetector.diff(compositions((D(2024, 3, 1), {"AAA": 1.0})))
+    assert changes["added"].tolist() == [["AAA"]] and changes["removed"].tolist() == [[]]
+
+
+def test_detect_uses_last_processed_date_only_as_baseline():
+    db = FakeDB(D(2024, 3, 1), compositions(
+        (D(2024, 3, 1), {"AAA": 0.5, "BBB": 0.5}),
+        (D(2024, 3, 4), {"AAA": 1.0}),
+    ))
+    changes = CompositionChangeDetector(db).detect("Equal Weighted")
+    assert changes["date"].tolist() == [D(2024, 3, 4)]
+    assert db.stored == [("Equal Weighted", D(2024, 3, 4), "AAA", D(2024, 3, 1), "AAA,BBB", [], ["BBB"],
+                          pytest.approx(0.5))]
+
+
+def test_detect_without_new_sessions_writes_nothing():
+    db = FakeDB(D(2024, 3, 1), compositions((D(2024, 3, 1), {"AAA": 1.0})))
+    assert CompositionChangeDetector(db).detect("Equal Weighted").empty
+    assert db.stored is None
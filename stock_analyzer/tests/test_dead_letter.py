@@ -0,0 +1,103 @@
+# tests/test_dead_letter.py
+
+import json
+
+import pytest
+
+from services.ingestion.dead_letter import DeadLetterQueue
+from services.ingestion.main import StockDataIngester
+
+
+def row(ticker, t=1, close=1.0):
+    return {"T": ticker, "t": t, "c": close}
+
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+
+
+@pytest.fixture
+def dlq(tmp_path):
+    return DeadLetterQueue(tmp_path / "dead_letter.jsonl", batch_size=100)
+
+
+def test_rows_are_buffered_until_flush(dlq):
+    dlq.add("2024-03-01", [row("AAA"), row("BBB")])
+    dlq.add("2024-03-01", [row("CCC")])
+    dlq.add("2024-03-04", [row("AAA")], adjusted=True)
+    assert not dlq.path.exists()
+
+    dlq.flush()
+    records = read_records(dlq.path)
+    # One record per (date, adjusted) group
+    assert [(r["date"], r["adjusted"], len(r["rows"])) for r in records] == [
+        ("2024-03-01", False, 3), ("2024-03-04", True, 1)
+    ]
+
+
+def test_batch_size_triggers_flush(tmp_path):
+    dlq = DeadLetterQueue(tmp_path / "dead_letter.jsonl", batch_size=2)
+    dlq.add("2024-03-01", [row("AAA")])
+    assert not dlq.path.exists()
+    dlq.add("2024-03-01", [row("BBB")])
+    assert len(read_records(dlq.path)[0]["rows"]) == 2
+
+
+def test_replay_compacts_written_rows_and_keeps_failures(dlq):
+    dlq.add("2024-03-01", [row("AAA"), row("BBB")])
+    dlq.add("2024-03-04", [row("CCC")])
+    dlq.flush()
+
+    calls = []
+
+    def upsert(date, rows, adjusted):
+        calls.append((date, sorted(r["T"] for r in rows), adjusted))
+        return [r for r in rows if r["T"] == "BBB"]
+
+    assert dlq.replay(upsert) == (2, 1)
+    assert calls == [("2024-03-01", ["AAA", "BBB"], False), ("2024-03-04", ["CCC"], False)]
+    records = read_records(dlq.path)
+    assert [(r["date"], [x["T"] for x in r["rows"]]) for r in records] == [("2024-03-01", ["BBB"])]
+
+    assert dlq.replay(lambda date, rows, adjusted: []) == (1, 0)
+    assert read_records(dlq.path) == []
+
+
+def test_replay_dedupes_rows_and_reads_legacy_records(dlq):
+    dlq.add("2024-03-01", [row("AAA", close=1.0)])
+    dlq.flush()
+    dlq.add("2024-03-01", [row("AAA", close=2.0)])
+    dlq.flush()
+    with open(dlq.path, "a") as f:
+        f.write(json.dumps({"date": "2024-03-01", "timestamp": "x", "data": {"ticker": "ZZZ", "payload": row("ZZZ")}}) + "\n")
+        f.write("{not json\n")
+
+    seen = {}
+    dlq.replay(lambda date, rows, adjusted: seen.update({r["T"]: r["c"] for r in rows}) or [])
+    # The later record for the same (ticker, t) wins
+    assert seen == {"AAA": 2.0, "ZZZ": 1.0}
+
+
+def test_replay_of_missing_file_is_a_noop(dlq):
+    assert dlq.replay(lambda date, rows, adjusted: rows) == (0, 0)
+
+
+def test_ingester_replay_does_not_requeue(dlq, monkeypatch):
+    ingester = object.__new__(StockDataIngester)
+    ingester.dlq = dlq
+    written = []
+
+    def failing_upsert(date, prices):
+        # The COPY transaction fails: every row comes back, the rejected one included
+        written.append((date, len(prices)))
+        return list(prices.rejected) + prices.to_dicts()
+
+    monkeypatch.setattr(ingester, "_bulk_upsert_stock_prices", failing_upsert)
+
+    dlq.add("2024-03-01", [row("AAA"), {"T": "BAD", "t": "not an int"}])
+    dlq.flush()
+    assert dlq.replay(ingester.replay_stock_prices) == (0, 2)
+    assert written == [("2024-03-01", 1)]
+    # The failures are kept once by replay's compaction, not appended again through the DLQ
+    records = read_records(dlq.path)
+    assert len(records) == 1 and sorted(r["T"] for r in records[0]["rows"]) == ["AAA", "BAD"]
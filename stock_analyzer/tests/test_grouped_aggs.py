@@ -0,0 +1,76 @@
+# tests/test_grouped_aggs.py
+
+import json
+import math
+from io import BytesIO
+
+from services.ingestion.grouped_aggs import MISSING_INT, GroupedAggregates, invalid_price_reason
+
+
+def body(rows, **header):
+    return BytesIO(json.dumps({"queryCount": len(rows), "resultsCount": len(rows), **header,
+                               "results": rows, "status": "OK"}).encode())
+
+
+GOOD = {"T": "AAA", "t": 1709326800000, "o": 1.0, "h": 2.0, "l": 0.5, "c": 1.5, "v": 100, "vw": 1.2, "n": 7}
+SPARSE = {"T": "BBB", "t": 1709326800000, "c": 10, "otc": True}
+
+
+def test_parse_fills_typed_columns():
+    aggs = GroupedAggregates.parse(body([GOOD, SPARSE], adjusted=True))
+    assert aggs.adjusted is True
+    assert aggs.results_count == 2
+    assert aggs.ticker == ["AAA", "BBB"]
+    assert list(aggs.t) == [1709326800000, 1709326800000]
+    assert list(aggs.c) == [1.5, 10.0]
+    assert math.isnan(aggs.o[1]) and math.isnan(aggs.vw[1])
+    assert list(aggs.n) == [7, MISSING_INT]
+    assert list(aggs.otc) == [0, 1]
+    assert aggs.is_complete()
+
+
+def test_malformed_rows_are_rejected_not_columnised():
+    bad = [{"t": 1}, {"T": "CCC", "t": "x"}, {"T": "DDD", "t": 1, "c": "1.5"},
+           {"T": "EEE", "t": 1, "n": 1.5}, {"T": "FFF", "t": True}]
+    aggs = GroupedAggregates.parse(body([GOOD, *bad]))
+    assert len(aggs) == 1
+    assert aggs.rejected == bad
+    assert aggs.total_rows == 6
+    assert aggs and aggs.is_complete()
+
+
+def test_invalid_price_reason():
+    assert invalid_price_reason(GOOD) is None
+    assert invalid_price_reason({"T": "", "t": 1}) == "missing ticker"
+    assert invalid_price_reason({"T": "A"}) == "missing or non-integer timestamp"
+    assert invalid_price_reason({"T": "A", "t": 1, "v": False}) == "non-numeric 'v'"
+    assert invalid_price_reason({"T": "A", "t": 1, "n": "3"}) == "non-integer 'n'"
+
+
+def test_empty_and_short_bodies_are_incomplete():
+    empty = GroupedAggregates.parse(BytesIO(b'{"queryCount": 0, "resultsCount": 0, "adjusted": true, "status": "OK"}'))
+    assert not empty and empty.total_rows == 0
+    assert not empty.is_complete()
+
+    short = GroupedAggregates.parse(body([GOOD], resultsCount=3))
+    assert short.results_count == 3 and not short.is_complete()
+
+
+def test_adjusted_defaults_to_false_and_count_may_be_absent():
+    aggs = GroupedAggregates.parse(BytesIO(json.dumps({"results": [GOOD]}).encode()))
+    assert aggs.adjusted is False
+    assert aggs.results_count is None
+    assert aggs.is_complete()
+
+
+def test_iter_rows_restores_nulls():
+    aggs = GroupedAggregates.parse(body([GOOD, SPARSE], adjusted=True))
+    rows = list(aggs.iter_rows("2024-03-01"))
+    assert rows[0] == ("AAA", 1709326800000, "2024-03-01", 1.0, 2.0, 0.5, 1.5, 100.0, 7, 1.2, False, True)
+    assert rows[1] == ("BBB", 1709326800000, "2024-03-01", None, None, None, 10.0, None, None, None, True, True)
+
+
+def test_to_dicts_round_trips_through_from_results():
+    aggs = GroupedAggregates.parse(body([GOOD, SPARSE]))
+    rebuilt = GroupedAggregates.from_results(aggs.to_dicts(), adjusted=aggs.adjusted)
+    assert list(rebuilt.iter_rows("d")) == list(aggs.iter_rows("d"))
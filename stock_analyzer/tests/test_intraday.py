@@ -0,0 +1,92 @@
+# tests/test_intraday.py
+
+import json
+
+import numpy as np
+import pytest
+
+from services.index_engine import intraday
+from services.index_engine.intraday import IntradayCalculator, LevelPublisher, mock_feed, replay_feed, run_intraday
+
+
+class FakeDB:
+    def __init__(self):
+        self.writes = []
+
+    def execute_write(self, query, params):
+        self.writes.append(params)
+        return True
+
+
+def calculator(seed=0, indices=3, tickers=200):
+    rng = np.random.default_rng(seed)
+    names = [f"T{i:03d}" for i in range(tickers)]
+    units = rng.uniform(0, 10, (indices, tickers)) * (rng.random((indices, tickers)) < 0.5)
+    prices = rng.uniform(10, 500, tickers)
+    divisors = rng.uniform(1, 5, indices)
+    return IntradayCalculator([f"I{i}" for i in range(indices)], names, units, prices.copy(), divisors)
+
+
+def test_mock_feed_levels_match_full_revaluation(monkeypatch):
+    monkeypatch.setattr(intraday, "RESUM_EVERY", 10 ** 9)  # only the incremental path
+    calc = calculator()
+    units, divisors = calc.units.copy(), calc.divisors.copy()
+    last = dict(zip(calc.columns, calc.prices))
+
+    for batch in mock_feed(calc.columns, calc.prices, batches=300, tickers_per_batch=25, start_ms=0):
+        levels = calc.apply(batch.tickers, batch.closes)
+        last.update(zip(batch.tickers, batch.closes))
+        expected = units @ np.array([last[name] for name in calc.columns]) / divisors
+        np.testing.assert_allclose(levels, expected, rtol=1e-10)
+
+
+def test_mock_feed_is_reproducible():
+    calc = calculator()
+    first = list(mock_feed(calc.columns, calc.prices, 5, 10, interval_ms=500, start_ms=1000, seed=4))
+    second = list(mock_feed(calc.columns, calc.prices, 5, 10, interval_ms=500, start_ms=1000, seed=4))
+    assert [b.timestamp for b in first] == [1500, 2000, 2500, 3000, 3500]
+    for a, b in zip(first, second):
+        assert a.tickers.tolist() == b.tickers.tolist()
+        np.testing.assert_array_equal(a.closes, b.closes)
+
+
+def test_duplicate_ticker_keeps_last_close_and_unknowns_are_ignored():
+    calc = IntradayCalculator(["I"], ["A", "B"], np.array([[1.0, 2.0]]), np.array([10.0, 20.0]), np.array([1.0]))
+    levels = calc.apply(np.array(["A", "ZZZ", "A", "B"], dtype=object), np.array([11.0, 99.0, 12.0, np.nan]))
+    assert levels.tolist() == [12.0 + 40.0]
+    assert calc.prices.tolist() == [12.0, 20.0]
+
+
+def test_periodic_resum_removes_drift(monkeypatch):
+    monkeypatch.setattr(intraday, "RESUM_EVERY", 2)
+    calc = calculator(tickers=5)
+    calc.market_values += 1.0  # simulated rounding drift
+    calc.apply(np.array([], dtype=object), np.array([]))
+    calc.apply(np.array([], dtype=object), np.array([]))
+    np.testing.assert_allclose(calc.market_values, calc.units @ calc.prices)
+
+
+def test_replay_feed_batches_by_bar_end_and_skips_bad_events(tmp_path):
+    path = tmp_path / "bars.jsonl"
+    events = [
+        [{"ev": "AM", "sym": "A", "c": 10.5, "e": 60000}, {"ev": "AM", "sym": "B", "c": 20, "e": 60000}],
+        {"ev": "status", "message": "connected"},
+        {"ev": "AM", "sym": "C", "c": "bad", "e": 60000},
+        {"ev": "AM", "sym": "A", "c": 11.0, "e": 120000},
+    ]
+    path.write_text("\n".join(json.dumps(e) for e in events) + "\n\n")
+    batches = list(replay_feed(str(path)))
+    assert [b.timestamp for b in batches] == [60000, 120000]
+    assert batches[0].tickers.tolist() == ["A", "B"] and batches[0].closes.tolist() == [10.5, 20.0]
+    assert batches[1].tickers.tolist() == ["A"]
+
+
+def test_run_intraday_publishes_on_cadence_and_at_the_end():
+    calc = calculator(tickers=20)
+    db = FakeDB()
+    feed = mock_feed(calc.columns, calc.prices, batches=10, tickers_per_batch=5, interval_ms=1000, start_ms=0)
+    stats = run_intraday(feed, calc, LevelPublisher(db, cadence=3))
+    assert stats["batches"] == 10 and stats["bars"] == 50
+    # Bar times 1..10s: published at 1, 4, 7, 10
+    assert [params[0] for params in db.writes] == [1000, 4000, 7000, 10000]
+    assert db.writes[-1][3] == pytest.approx(calc.levels().tolist())
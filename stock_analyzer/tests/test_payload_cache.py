@@ -0,0 +1,145 @@
+# tests/test_payload_cache.py
+
+import json
+import os
+import time
+
+import pytest
+
+from services.ingestion import main
+from services.ingestion.main import StockDataIngester
+from shared.payload_cache import PayloadCache
+from shared.trading_calendar import TradingCalendar
+
+
+class FakeResponse:
+    def __init__(self, body: dict, status_code: int = 200):
+        self.content = json.dumps(body).encode()
+        self.status_code = status_code
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeLimiter:
+    def acquire(self):
+        pass
+
+    def on_success(self):
+        pass
+
+
+def grouped_body(rows, results_count=None):
+    body = {"queryCount": len(rows), "resultsCount": len(rows) if results_count is None else results_count,
+            "adjusted": True, "results": rows, "status": "OK"}
+    if not rows:
+        del body["results"]
+    return body
+
+
+ROWS = [{"T": "AAA", "t": 1709326800000, "o": 1.0, "h": 2.0, "l": 0.5, "c": 1.5, "v": 100.0, "n": 3},
+        {"T": "BBB", "t": 1709326800000, "c": 10.0}]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PayloadCache(cache_dir=tmp_path, max_bytes=10 ** 6, enabled=True)
+
+
+@pytest.fixture
+def ingester(cache):
+    # Bypasses __init__ so no database pool or API key is needed
+    ingester = object.__new__(StockDataIngester)
+    ingester.api_key = "test"
+    ingester.api_base_url = "https://api.polygon.io"
+    ingester.cache = cache
+    ingester.rate_limiter = FakeLimiter()
+    return ingester
+
+
+@pytest.fixture
+def responses(monkeypatch):
+    bodies, calls = [], []
+
+    def fake_get(url, params=None):
+        calls.append(url)
+        return FakeResponse(bodies.pop(0))
+
+    monkeypatch.setattr(main.requests, "get", fake_get)
+    return bodies, calls
+
+
+def test_put_get_round_trip_ignores_api_key(cache):
+    cache.put("tickers", {"url": "u", "apiKey": "secret"}, b'{"results": []}')
+    assert cache.get("tickers", {"url": "u"}) == b'{"results": []}'
+    assert cache.get("tickers", {"url": "other"}) is None
+
+
+def test_expired_entry_is_a_miss(cache):
+    cache.put("tickers", {"url": "u"}, b"{}")
+    path = cache._path("tickers", cache.make_key("tickers", {"url": "u"}))
+    old = time.time() - 2 * 24 * 3600
+    os.utime(path, (old, old))
+    assert cache.get("tickers", {"url": "u"}) is None
+    assert cache.get("tickers", {"url": "u"}, ttl=None) == b"{}"
+
+
+def test_unreadable_entry_is_discarded(cache):
+    cache.put("tickers", {"url": "u"}, b"{}")
+    path = cache._path("tickers", cache.make_key("tickers", {"url": "u"}))
+    path.write_bytes(b"not gzip")
+    assert cache.get("tickers", {"url": "u"}) is None
+    assert not path.exists()
+
+
+def test_eviction_keeps_cache_under_budget(tmp_path):
+    cache = PayloadCache(cache_dir=tmp_path, max_bytes=2000, enabled=True)
+    for i in range(50):
+        cache.put("tickers", {"page": i}, os.urandom(200))
+    assert cache._total_bytes <= 2000
+    assert cache.get("tickers", {"page": 49}) is not None
+
+
+def test_closed_session_is_cached_permanently(ingester, responses, cache):
+    bodies, calls = responses
+    bodies.append(grouped_body(ROWS))
+    assert len(ingester.fetch_ohlcv("2024-03-01")) == 2
+
+    path = cache._path("grouped_aggs", cache.make_key("grouped_aggs", {"date": "2024-03-01", "adjusted": "true"}))
+    old = time.time() - 365 * 24 * 3600
+    os.utime(path, (old, old))
+    assert len(ingester.fetch_ohlcv("2024-03-01")) == 2
+    assert len(calls) == 1
+
+
+def test_empty_body_is_not_cached(ingester, responses):
+    bodies, calls = responses
+    bodies.extend([grouped_body([]), grouped_body(ROWS)])
+    assert len(ingester.fetch_ohlcv("2024-03-01")) == 0
+    assert len(ingester.fetch_ohlcv("2024-03-01")) == 2
+    assert len(calls) == 2
+
+
+def test_short_body_is_not_cached(ingester, responses):
+    bodies, calls = responses
+    bodies.extend([grouped_body(ROWS[:1], results_count=2), grouped_body(ROWS)])
+    aggs = ingester.fetch_ohlcv("2024-03-01")
+    assert aggs.results_count == 2 and not aggs.is_complete()
+    assert len(ingester.fetch_ohlcv("2024-03-01")) == 2
+    assert len(calls) == 2
+
+
+def test_latest_session_only_gets_short_ttl(ingester, responses, cache):
+    bodies, calls = responses
+    latest = str(TradingCalendar().previous_session())
+    bodies.extend([grouped_body(ROWS), grouped_body(ROWS)])
+    ingester.fetch_ohlcv(latest)
+    ingester.fetch_ohlcv(latest)
+    assert len(calls) == 1
+
+    path = cache._path("grouped_aggs", cache.make_key("grouped_aggs", {"date": latest, "adjusted": "true"}))
+    old = time.time() - 3600
+    os.utime(path, (old, old))
+    ingester.fetch_ohlcv(latest)
+    assert len(calls) == 2
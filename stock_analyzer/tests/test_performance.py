@@ -0,0 +1,130 @@
+# tests/test_performance.py
+
+import copy
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.index_engine.performance import BASE_LEVEL, IndexLevelTracker
+
+INDEX = "Equal Weighted"
+D = [datetime.date(2024, 3, 1) + datetime.timedelta(days=i) for i in range(4)]
+
+
+class FakeLevelDB:
+    """index_composition_current, stock_prices and the level tables as frames and dicts."""
+
+    def __init__(self, compositions, prices):
+        self.compositions = compositions
+        self.prices = prices
+        self.state = None
+        self.levels = {}
+        self.written = []
+        self.reads = []
+
+    def execute_query(self, query, params=None):
+        if "FROM index_level_state" in query:
+            if self.state is None:
+                return pd.DataFrame()
+            # A fresh copy, like a real read: the tracker mutates the holdings it loads
+            return pd.DataFrame([copy.deepcopy(self.state)])
+        if "FROM index_composition_current" in query:
+            _, after, end = params
+            self.reads.append(("compositions", after))
+            frame = self.compositions
+            return frame[(frame['date'] > after) & (frame['date'] <= end)].reset_index(drop=True)
+        if "FROM stock_prices" in query:
+            after, end, tickers = params
+            self.reads.append(("prices", after))
+            frame = self.prices
+            return frame[(frame['date'] > after) & (frame['date'] <= end)
+                         & frame['ticker'].isin(tickers)].reset_index(drop=True)
+        raise AssertionError(f"unexpected query: {query}")
+
+    def execute_transaction(self, statements):
+        for query, param_rows in statements:
+            for params in param_rows:
+                if query.strip().startswith("DELETE FROM index_level_state"):
+                    self.state = None
+                elif query.strip().startswith("DELETE FROM index_performance_current"):
+                    self.levels.clear()
+                elif "INSERT INTO index_performance_current" in query:
+                    _, dates, levels, returns = params
+                    self.written.extend(dates)
+                    self.levels.update({day: (level, ret) for day, level, ret in zip(dates, levels, returns)})
+                elif "INSERT INTO index_level_state" in query:
+                    _, day, level, divisor, holdings = params
+                    self.state = {'date': day, 'index_level': level, 'divisor': divisor,
+                                  'holdings': copy.deepcopy(holdings.obj)}
+        return True
+
+
+def frames(compositions, prices):
+    return (pd.DataFrame(compositions, columns=['date', 'ticker', 'weight', 'close_price']),
+            pd.DataFrame(prices, columns=['date', 'ticker', 'close']))
+
+
+@pytest.fixture
+def db():
+    compositions, prices = frames(
+        [(D[0], "AAA", 0.5, 10.0), (D[0], "BBB", 0.5, 20.0),
+         (D[2], "AAA", 0.2, 12.0), (D[2], "BBB", 0.8, 22.0)],
+        [(D[0], "AAA", 10.0), (D[0], "BBB", 20.0), (D[1], "AAA", 11.0), (D[1], "BBB", 20.0),
+         (D[2], "AAA", 12.0), (D[2], "BBB", 22.0), (D[3], "AAA", 12.0), (D[3], "BBB", 24.2)],
+    )
+    return FakeLevelDB(compositions, prices)
+
+
+def test_rebalance_keeps_the_level_continuous(db):
+    tracker = IndexLevelTracker(db)
+    levels = tracker.update(INDEX).set_index('date')['index_price']
+    assert levels[D[0]] == BASE_LEVEL
+    assert levels[D[1]] == pytest.approx(105.0)
+    # D[2] is priced on the old holdings, then rebalanced at that close without a jump
+    assert levels[D[2]] == pytest.approx(115.0)
+    state = tracker.load_state(INDEX)
+    assert state.market_value() / state.divisor == pytest.approx(levels[D[2]] * 1.08)
+    assert levels[D[3]] == pytest.approx(115.0 * (0.2 * 1.0 + 0.8 * 1.1))
+
+
+def test_incremental_run_reads_and_writes_only_new_sessions(db):
+    tracker = IndexLevelTracker(db)
+    tracker.update(INDEX, end=str(D[1]))
+    db.reads.clear()
+    db.written.clear()
+
+    new = tracker.update(INDEX)
+    assert new['date'].tolist() == D[2:]
+    assert db.reads == [("compositions", D[1]), ("prices", D[1])]
+    assert db.written == D[2:]
+    assert tracker.update(INDEX).empty
+
+
+def test_incremental_runs_match_a_full_rebuild():
+    rng = np.random.default_rng(17)
+    days = [datetime.date(2024, 1, 1) + datetime.timedelta(days=i) for i in range(60)]
+    tickers = ["AAA", "BBB", "CCC", "DDD"]
+    closes = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, (len(days), len(tickers))), axis=0))
+    prices = [(day, ticker, closes[i, j]) for i, day in enumerate(days) for j, ticker in enumerate(tickers)
+              if rng.random() > 0.1]  # some tickers miss a print now and then
+    compositions = []
+    for i in range(0, len(days), 15):
+        held = rng.choice(tickers, 3, replace=False)
+        weights = rng.dirichlet(np.ones(3))
+        compositions += [(days[i], ticker, weight, closes[i, tickers.index(ticker)])
+                         for ticker, weight in zip(held, weights)]
+    compositions, prices = frames(compositions, prices)
+
+    full = FakeLevelDB(compositions, prices)
+    IndexLevelTracker(full).rebuild(INDEX)
+
+    incremental = FakeLevelDB(compositions, prices)
+    tracker = IndexLevelTracker(incremental)
+    for end in (days[0], days[7], days[15], days[16], days[44], days[-1]):
+        tracker.update(INDEX, end=str(end))
+
+    assert incremental.levels.keys() == full.levels.keys()
+    for day, (level, daily_return) in full.levels.items():
+        assert incremental.levels[day] == pytest.approx((level, daily_return))
@@ -0,0 +1,89 @@
+# tests/test_rate_limiter.py
+
+import pytest
+
+from services.ingestion import rate_limiter
+from services.ingestion.rate_limiter import TokenBucketRateLimiter
+
+
+class FakeClock:
+    """Stands in for time.monotonic/time.sleep so waits advance a counter instead of blocking."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_limiter.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_first_call_is_immediate_then_waits_one_interval(clock):
+    limiter = TokenBucketRateLimiter(requests_per_minute=60)
+    limiter.acquire()
+    assert clock.sleeps == []
+    limiter.acquire()
+    assert sum(clock.sleeps) == pytest.approx(1.0)
+
+
+def test_burst_allows_back_to_back_calls(clock):
+    limiter = TokenBucketRateLimiter(requests_per_minute=60, burst=3)
+    for _ in range(3):
+        limiter.acquire()
+    assert clock.sleeps == []
+
+
+def test_rate_limit_halves_rate_and_honours_retry_after(clock):
+    limiter = TokenBucketRateLimiter(requests_per_minute=60)
+    limiter.acquire()
+    limiter.on_rate_limited(retry_after=10)
+    assert limiter.rate == pytest.approx(0.5)
+
+    limiter.acquire()
+    # 10s pause, then a full token at the halved rate
+    assert sum(clock.sleeps) == pytest.approx(12.0)
+
+
+def test_no_tokens_accrue_during_pause(clock):
+    limiter = TokenBucketRateLimiter(requests_per_minute=60, burst=5)
+    for _ in range(5):
+        limiter.acquire()
+    limiter.on_rate_limited(retry_after=30)
+
+    clock.now += 30
+    limiter.acquire()
+    # The 30s pause banked nothing, so the first call after it still waits for a token
+    assert sum(clock.sleeps) == pytest.approx(2.0)
+    limiter.acquire()
+    assert sum(clock.sleeps) == pytest.approx(4.0)
+
+
+def test_success_recovers_rate_up_to_ceiling(clock):
+    limiter = TokenBucketRateLimiter(requests_per_minute=60)
+    limiter.on_rate_limited()
+    limiter.on_rate_limited()
+    assert limiter.rate == pytest.approx(0.25)
+
+    limiter.on_success()
+    assert limiter.rate == pytest.approx(0.35)
+    for _ in range(20):
+        limiter.on_success()
+    assert limiter.rate == pytest.approx(limiter.max_rate)
+
+
+def test_rate_never_drops_below_floor(clock):
+    limiter = TokenBucketRateLimiter(requests_per_minute=60)
+    for _ in range(10):
+        limiter.on_rate_limited()
+    assert limiter.rate == pytest.approx(limiter.min_rate)
@@ -0,0 +1,65 @@
+# tests/test_rebalance.py
+
+import datetime
+
+import numpy as np
+import pytest
+
+from shared.rebalance import RebalanceSchedule, drifted_composition_query, rebalance_rows
+
+D = datetime.date
+
+
+def test_monthly_dates_are_first_sessions():
+    # 2024-01-01 and 2024-09-02 are holidays, 2024-06-01 a Saturday
+    assert RebalanceSchedule("M").dates("2024-01-01", "2024-12-31") == [
+        D(2024, 1, 2), D(2024, 2, 1), D(2024, 3, 1), D(2024, 4, 1), D(2024, 5, 1), D(2024, 6, 3),
+        D(2024, 7, 1), D(2024, 8, 1), D(2024, 9, 3), D(2024, 10, 1), D(2024, 11, 1), D(2024, 12, 2),
+    ]
+
+
+def test_quarterly_and_weekly_dates():
+    assert RebalanceSchedule("Q").dates("2024-01-01", "2024-12-31") == [
+        D(2024, 1, 2), D(2024, 4, 1), D(2024, 7, 1), D(2024, 10, 1)
+    ]
+    # The week of 2024-01-15 (MLK Day) starts on Tuesday
+    assert RebalanceSchedule("W").dates("2024-01-08", "2024-01-21") == [D(2024, 1, 8), D(2024, 1, 16)]
+
+
+def test_daily_is_every_session():
+    assert RebalanceSchedule("D").dates("2024-03-27", "2024-04-02") == [
+        D(2024, 3, 27), D(2024, 3, 28), D(2024, 4, 1), D(2024, 4, 2)
+    ]
+
+
+def test_range_starting_mid_period_skips_that_period():
+    schedule = RebalanceSchedule("M")
+    assert schedule.dates("2024-03-05", "2024-04-30") == [D(2024, 4, 1)]
+    assert schedule.period_start("2024-03-05") == D(2024, 3, 1)
+
+
+def test_is_rebalance():
+    schedule = RebalanceSchedule("M")
+    assert schedule.is_rebalance("2024-06-03")
+    assert not schedule.is_rebalance("2024-06-04")
+    assert not schedule.is_rebalance("2024-06-01")
+
+
+def test_unknown_frequency_is_rejected():
+    with pytest.raises(ValueError):
+        RebalanceSchedule("Y")
+    with pytest.raises(ValueError):
+        rebalance_rows(np.array(["2024-01-02"], dtype="datetime64[D]"), "Y")
+
+
+def test_rebalance_rows_over_session_arrays():
+    dates = np.array(["2024-01-30", "2024-01-31", "2024-02-01", "2024-02-02", "2024-03-01"], dtype="datetime64[D]")
+    assert rebalance_rows(dates, "M").tolist() == [0, 2, 4]
+    assert rebalance_rows(dates, "Q").tolist() == [0]
+    assert rebalance_rows(dates, "D").tolist() == [0, 1, 2, 3, 4]
+
+
+def test_drifted_query_binds_the_date_everywhere():
+    query, params = drifted_composition_query("Equal Weighted", "2024-03-05")
+    assert query.count("%s") == len(params)
+    assert params == ("Equal Weighted", D(2024, 3, 5), D(2024, 3, 5), "Equal Weighted", D(2024, 3, 5))
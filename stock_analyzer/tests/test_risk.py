@@ -0,0 +1,83 @@
+# tests/test_risk.py
+
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.index_engine.risk import (
+    BETA_WINDOW, SHARPE_WINDOW, TRADING_DAYS, VOLATILITY_WINDOWS, RiskAnalytics
+)
+
+LOOKBACK = max(VOLATILITY_WINDOWS + (SHARPE_WINDOW, BETA_WINDOW))
+
+
+def performance(returns, start=datetime.date(2023, 1, 2)):
+    returns = np.asarray(returns, dtype=float)
+    return pd.DataFrame({
+        "date": [start + datetime.timedelta(days=i) for i in range(len(returns))],
+        "index_price": 1000 * np.cumprod(1 + returns),
+        "daily_return": returns,
+    })
+
+
+@pytest.fixture
+def risk():
+    # compute() never touches the database
+    return RiskAnalytics(db=object(), benchmark="Benchmark")
+
+
+@pytest.fixture
+def returns():
+    return np.random.default_rng(11).normal(0.0004, 0.01, 400)
+
+
+def test_rolling_volatility_and_sharpe(risk, returns):
+    metrics = risk.compute(performance(returns))
+    for window in VOLATILITY_WINDOWS:
+        column = metrics[f"volatility_{window}"]
+        assert column[:window - 1].isna().all()
+        assert column.iloc[-1] == pytest.approx(returns[-window:].std(ddof=1) * np.sqrt(TRADING_DAYS))
+    last = returns[-SHARPE_WINDOW:]
+    assert metrics["sharpe_252"].iloc[-1] == pytest.approx(last.mean() / last.std(ddof=1) * np.sqrt(TRADING_DAYS))
+
+
+def test_beta_against_benchmark(risk, returns):
+    data = performance(2 * returns + 0.0001)
+    metrics = risk.compute(data, benchmark=performance(returns))
+    assert metrics["beta"][:BETA_WINDOW - 1].isna().all()
+    np.testing.assert_allclose(metrics["beta"][BETA_WINDOW:], 2.0)
+    assert (metrics["benchmark"] == "Benchmark").all()
+
+
+def test_benchmark_has_unit_beta_once_window_is_full(risk, returns):
+    metrics = risk.compute(performance(returns))
+    assert metrics["beta"][:BETA_WINDOW - 1].isna().all()
+    assert (metrics["beta"][BETA_WINDOW - 1:] == 1.0).all()
+
+
+def test_drawdown_and_max_drawdown(risk):
+    metrics = risk.compute(performance([0.0, 0.1, -0.2, 0.05, 0.2]))
+    levels = 1000 * np.cumprod([1.0, 1.1, 0.8, 1.05, 1.2])
+    peak = np.maximum.accumulate(levels)
+    np.testing.assert_allclose(metrics["peak_level"], peak)
+    np.testing.assert_allclose(metrics["drawdown"], levels / peak - 1)
+    np.testing.assert_allclose(metrics["max_drawdown"], np.minimum.accumulate(levels / peak - 1))
+    assert metrics["max_drawdown"].iloc[-1] == pytest.approx(-0.2)
+
+
+def test_incremental_run_matches_full_run(risk, returns):
+    data = performance(returns)
+    benchmark = performance(returns[::-1])
+    full = risk.compute(data, benchmark)
+
+    # Stored through row 299; the next run rereads the longest window before it
+    stored = full.iloc[299]
+    start = 299 - LOOKBACK
+    incremental = risk.compute(
+        data.iloc[start:].reset_index(drop=True), benchmark, history_rows=300 - start,
+        peak_level=stored["peak_level"], max_drawdown=stored["max_drawdown"],
+    )
+    expected = full.iloc[300:].reset_index(drop=True)
+    pd.testing.assert_frame_equal(incremental, expected, check_exact=False, rtol=1e-9)
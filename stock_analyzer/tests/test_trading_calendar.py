@@ -0,0 +1,93 @@
+# tests/test_trading_calendar.py
+
+import datetime
+
+import pandas as pd
+import pytest
+
+from shared.trading_calendar import TradingCalendar, holidays_for_year, to_date
+
+D = datetime.date
+
+
+class FakeDB:
+    def __init__(self, dates):
+        self.dates = dates
+        self.queries = []
+
+    def execute_query(self, query, params=None):
+        self.queries.append((query, params))
+        return pd.DataFrame({"date": self.dates}) if self.dates else pd.DataFrame()
+
+
+@pytest.fixture
+def calendar():
+    return TradingCalendar()
+
+
+def test_holidays_2024():
+    assert set(holidays_for_year(2024)) == {
+        D(2024, 1, 1), D(2024, 1, 15), D(2024, 2, 19), D(2024, 3, 29), D(2024, 5, 27),
+        D(2024, 6, 19), D(2024, 7, 4), D(2024, 9, 2), D(2024, 11, 28), D(2024, 12, 25),
+    }
+
+
+@pytest.mark.parametrize("day, name", [
+    # Sunday July 4th observed on Monday, Saturday Christmas on Friday
+    (D(2021, 7, 5), "Independence Day"),
+    (D(2021, 12, 24), "Christmas Day"),
+    (D(2027, 6, 18), "Juneteenth"),
+    (D(2025, 1, 9), "National Day of Mourning (Carter)"),
+    (D(2012, 10, 29), "Hurricane Sandy"),
+])
+def test_observed_and_special_closures(calendar, day, name):
+    assert calendar.holiday_name(day) == name
+    assert not calendar.is_session(day)
+
+
+def test_saturday_new_year_is_not_moved_to_friday(calendar):
+    # 2022-01-01 was a Saturday; the exchange opened on Friday 2021-12-31
+    assert calendar.is_session(D(2021, 12, 31))
+    assert D(2021, 12, 31) not in holidays_for_year(2021) and D(2021, 12, 31) not in holidays_for_year(2022)
+
+
+def test_rules_that_start_in_later_years():
+    assert D(2021, 6, 18) not in holidays_for_year(2021)
+    assert "Martin Luther King Jr. Day" not in holidays_for_year(1997).values()
+
+
+def test_sessions_skip_weekends_and_holidays(calendar):
+    assert calendar.sessions("2024-03-27", "2024-04-02") == [
+        D(2024, 3, 27), D(2024, 3, 28), D(2024, 4, 1), D(2024, 4, 2)
+    ]
+    assert calendar.sessions("2024-03-30", "2024-03-31") == []
+
+
+def test_previous_session_is_strictly_before(calendar):
+    assert calendar.previous_session("2024-04-01") == D(2024, 3, 28)
+    assert calendar.previous_session(D(2024, 4, 2)) == D(2024, 4, 1)
+
+
+def test_to_date_accepts_strings_dates_and_datetimes():
+    assert to_date("2024-03-01") == to_date(D(2024, 3, 1)) == to_date(datetime.datetime(2024, 3, 1, 16)) == D(2024, 3, 1)
+
+
+def test_missing_sessions(calendar):
+    db = FakeDB([D(2024, 3, 27), pd.Timestamp("2024-04-01")])
+    assert calendar.missing_sessions(db, "stock_prices", "2024-03-27", "2024-04-02") == [D(2024, 3, 28), D(2024, 4, 2)]
+    query, params = db.queries[0]
+    assert "FROM stock_prices" in query and params == (D(2024, 3, 27), D(2024, 4, 2))
+
+
+def test_missing_sessions_filters_by_index_type(calendar):
+    db = FakeDB([])
+    assert calendar.missing_sessions(db, "index_composition", "2024-03-28", "2024-04-01", "equal_weight") == [
+        D(2024, 3, 28), D(2024, 4, 1)
+    ]
+    query, params = db.queries[0]
+    assert "index_type = %s" in query and params[-1] == "equal_weight"
+
+
+def test_unknown_gap_table_is_refused(calendar):
+    with pytest.raises(ValueError):
+        calendar.missing_sessions(FakeDB([]), "ticker_details", "2024-01-01", "2024-01-31")
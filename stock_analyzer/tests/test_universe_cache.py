@@ -0,0 +1,134 @@
+# tests/test_universe_cache.py
+
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.index_engine.main import IndexConstructor
+from shared.market_caps import MARKET_CAP_MAX_AGE_DAYS
+from shared.universe_cache import GLOBAL_SCOPE, UniverseCache, select_top_n
+
+DAY = datetime.date(2024, 3, 4)
+
+
+class FakeVersionsDB:
+    """universe_versions as a dict; answers the cache's range lookup like the real table."""
+
+    def __init__(self):
+        self.versions = {}
+
+    def bump(self, scope):
+        self.versions[scope] = self.versions.get(scope, 0) + 1
+
+    def execute_query(self, query, params=None):
+        scope, low, high = params
+        rows = [(s, v) for s, v in self.versions.items() if s == scope or (s != GLOBAL_SCOPE and low <= s <= high)]
+        return pd.DataFrame(rows, columns=['scope', 'version'])
+
+
+class FakeLoader:
+    """Serves a fixed universe for any session and records which sessions were read."""
+
+    def __init__(self, caps=None):
+        self.caps = caps or {"AAA": 3e9, "BBB": 2e9, "CCC": 1e9}
+        self.reads = []
+
+    def __call__(self, start, end, sessions=None, extra_columns=()):
+        self.reads.append(list(sessions))
+        rows = [(day, ticker, cap, 10.0, cap / 10.0) for day in sessions for ticker, cap in self.caps.items()]
+        return pd.DataFrame(rows, columns=['date', 'ticker', 'market_cap', 'close_price', 'weighted_shares_outstanding'])
+
+
+@pytest.fixture
+def db():
+    return FakeVersionsDB()
+
+
+def test_unchanged_sessions_are_served_from_memory(db):
+    loader = FakeLoader()
+    cache = UniverseCache(loader, db)
+    first = cache.top_n([DAY], 2)
+    second = cache.top_n([DAY], 2)
+    assert loader.reads == [[DAY]]
+    assert first['ticker'].tolist() == second['ticker'].tolist() == ["AAA", "BBB"]
+
+
+def test_write_within_the_as_of_window_invalidates(db):
+    loader = FakeLoader()
+    cache = UniverseCache(loader, db)
+    cache.top_n([DAY], 2)
+    # A market_cap_history row dated up to MARKET_CAP_MAX_AGE_DAYS back is still this session's cap
+    db.bump(str(DAY - datetime.timedelta(days=MARKET_CAP_MAX_AGE_DAYS)))
+    cache.top_n([DAY], 2)
+    db.bump(str(DAY - datetime.timedelta(days=MARKET_CAP_MAX_AGE_DAYS + 1)))
+    db.bump(str(DAY + datetime.timedelta(days=1)))
+    cache.top_n([DAY], 2)
+    assert loader.reads == [[DAY], [DAY]]
+
+
+def test_ticker_details_write_invalidates_every_session(db):
+    loader = FakeLoader()
+    cache = UniverseCache(loader, db)
+    later = DAY + datetime.timedelta(days=1)
+    cache.top_n([DAY, later], 1)
+    db.bump(GLOBAL_SCOPE)
+    cache.top_n([DAY, later], 1)
+    assert loader.reads == [[DAY, later], [DAY, later]]
+
+
+def test_least_recently_used_sessions_are_evicted(db):
+    loader = FakeLoader()
+    cache = UniverseCache(loader, db, max_sessions=2)
+    days = [DAY + datetime.timedelta(days=i) for i in range(3)]
+    cache.top_n(days[:2], 1)
+    cache.top_n([days[0]], 1)
+    cache.top_n([days[2]], 1)
+    assert len(cache) == 2
+    cache.top_n([days[0]], 1)
+    assert loader.reads == [days[:2], [days[2]]]
+    with pytest.raises(ValueError):
+        cache.top_n(days, 1)
+
+
+def test_ties_go_to_the_lower_ticker(db):
+    cache = UniverseCache(FakeLoader({"DDD": 2e9, "BBB": 2e9, "AAA": 1e9, "CCC": 2e9}), db)
+    assert cache.top_n([DAY], 2)['ticker'].tolist() == ["BBB", "CCC"]
+
+
+def test_select_top_n_matches_a_full_sort():
+    rng = np.random.default_rng(7)
+    caps = rng.integers(1, 20, 200).astype(float)
+    caps[rng.random(200) < 0.1] = np.nan
+    names = np.array([f"T{i:03d}" for i in rng.permutation(200)], dtype=object)
+    finite = [i for i in range(200) if np.isfinite(caps[i])]
+    expected = sorted(finite, key=lambda i: (-caps[i], names[i]))[:25]
+    assert select_top_n(caps, names, 25).tolist() == expected
+    assert len(select_top_n(caps, names, 1000)) == len(finite)
+
+
+def test_large_top_n_is_served_from_one_read(db):
+    rng = np.random.default_rng(11)
+    loader = FakeLoader({f"T{i:04d}": float(cap) for i, cap in enumerate(rng.integers(1, 1000, 5000))})
+    cache = UniverseCache(loader, db)
+    top = cache.top_n([DAY], 3500)
+    expected = sorted(loader.caps, key=lambda ticker: (-loader.caps[ticker], ticker))[:3500]
+    assert top['ticker'].tolist() == expected
+    assert cache.top_n([DAY], 4000)['ticker'].tolist()[:3500] == expected
+    assert loader.reads == [[DAY]]
+
+
+def test_engine_rank_top_n_matches_a_full_sort():
+    rng = np.random.default_rng(5)
+    panel = pd.DataFrame({
+        "date": np.repeat([datetime.date(2024, 3, d) for d in (6, 4, 5)], 400),
+        "ticker": [f"T{i:03d}" for i in rng.permutation(400)] * 3,
+        "market_cap": rng.integers(1, 30, 1200).astype(float),  # plenty of ties
+        "close_price": 10.0,
+    })
+    for top_n in (1, 25, 3000):
+        expected = (panel.sort_values(['date', 'market_cap', 'ticker'], ascending=[True, False, True])
+                    .groupby('date', sort=False).head(top_n).reset_index(drop=True))
+        pd.testing.assert_frame_equal(IndexConstructor.rank_top_n(panel, top_n), expected)
+    assert IndexConstructor.rank_top_n(panel.iloc[:0], 5).empty
@@ -0,0 +1,95 @@
+# tests/test_universe_sync.py
+
+import datetime
+
+import pandas as pd
+
+from services.ingestion.universe_sync import TICKER_DETAIL_COLUMNS, TickerUniverseSync, flatten_ticker_details
+
+
+class FakeDB:
+    def __init__(self, local: pd.DataFrame):
+        self.local = local
+        self.upserts = []
+        self.writes = []
+
+    def execute_query(self, query, params=None):
+        return self.local
+
+    def copy_upsert(self, table, columns, rows, conflict_columns=()):
+        rows = list(rows)
+        self.upserts.append([row[0] for row in rows])
+        return len(rows)
+
+    def execute_write(self, query, params=None):
+        self.writes.append(params)
+        return True
+
+
+class FakeIngester:
+    def __init__(self, db, symbols, failing=()):
+        self.db = db
+        self.symbols = symbols
+        self.failing = set(failing)
+        self.calls = []
+
+    def fetch_symbols(self):
+        return self.symbols
+
+    def fetch_ticker_details(self, ticker):
+        self.calls.append(ticker)
+        if ticker in self.failing:
+            raise RuntimeError("retries exhausted")
+        return {"ticker": ticker, "active": True, "market_cap": 1e9}
+
+
+def local_details():
+    now = datetime.datetime.now()
+    return pd.DataFrame({
+        "ticker": ["OLD", "GONE", "FRESH"],
+        "active": [True, True, True],
+        "last_refreshed": [now - datetime.timedelta(days=90), now, now],
+    })
+
+
+def test_plan_splits_new_delisted_and_stale():
+    sync = TickerUniverseSync(FakeIngester(FakeDB(local_details()), []))
+    diff = sync.plan(["NEW", "OLD", "FRESH"])
+    assert diff.new == ["NEW"]
+    assert diff.delisted == ["GONE"]
+    assert diff.stale == ["OLD"]
+    assert diff.to_refresh == ["NEW", "GONE", "OLD"]
+
+
+def test_empty_listing_marks_nothing_delisted():
+    db = FakeDB(local_details())
+    diff = TickerUniverseSync(FakeIngester(db, [])).run()
+    assert diff.to_refresh == [] and db.writes == []
+
+
+def test_failed_detail_call_is_deferred_not_fatal():
+    db = FakeDB(local_details())
+    ingester = FakeIngester(db, ["NEW", "OLD", "FRESH"], failing={"NEW"})
+    diff = TickerUniverseSync(ingester, batch_size=1).run()
+
+    assert ingester.calls == ["NEW", "GONE", "OLD"]
+    assert db.upserts == [["GONE"], ["OLD"]]
+    # The delisting UPDATE still runs after the failure
+    assert db.writes == [(["GONE"],)]
+    assert diff.new == ["NEW"]
+
+
+def test_max_detail_calls_caps_the_run():
+    db = FakeDB(local_details())
+    ingester = FakeIngester(db, ["NEW", "OLD", "FRESH"])
+    TickerUniverseSync(ingester).run(max_detail_calls=1)
+    assert ingester.calls == ["NEW"]
+    assert db.writes == [(["GONE"],)]
+
+
+def test_flatten_matches_columns():
+    row = flatten_ticker_details({"ticker": "AAA", "address": {"city": "X"}, "branding": {"logo_url": "u"}},
+                                 datetime.datetime(2024, 1, 1))
+    values = dict(zip(TICKER_DETAIL_COLUMNS, row))
+    assert len(row) == len(TICKER_DETAIL_COLUMNS)
+    assert values["ticker"] == "AAA" and values["city"] == "X" and values["branding_logo_url"] == "u"
@@ -0,0 +1,80 @@
+# tests/test_weighting_strategies.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from shared.weighting_strategies import (
+    STRATEGIES, _cap, get_strategy, required_columns, strategy_names
+)
+
+
+def panel(seed=0, dates=3, per_date=12):
+    rng = np.random.default_rng(seed)
+    rows = dates * per_date
+    return pd.DataFrame({
+        "date": np.repeat(pd.date_range("2024-03-01", periods=dates).date, per_date),
+        "ticker": [f"T{i:02d}" for i in range(per_date)] * dates,
+        "market_cap": rng.lognormal(22, 1.5, rows),
+        "close_price": rng.uniform(5, 500, rows),
+        "weighted_shares_outstanding": np.where(rng.random(rows) < 0.2, np.nan, rng.uniform(1e6, 1e9, rows)),
+        "volatility": np.where(rng.random(rows) < 0.2, np.nan, rng.uniform(0.1, 0.8, rows)),
+    })
+
+
+@pytest.mark.parametrize("name", strategy_names())
+def test_every_strategy_sums_to_one_per_date(name):
+    data = panel()
+    weights = get_strategy(name).weigh(data)
+    assert len(weights) == len(data)
+    assert (weights >= 0).all()
+    np.testing.assert_allclose(weights.groupby(data["date"]).sum(), 1.0)
+
+
+def test_cap_redistributes_excess_pro_rata():
+    dates = pd.Series(["d"] * 5)
+    weights = pd.Series([0.6, 0.2, 0.1, 0.06, 0.04])
+    capped = _cap(weights, dates, 0.25)
+    assert capped.sum() == pytest.approx(1.0)
+    assert capped.max() <= 0.25 + 1e-12
+    # The second name is pushed over the cap by the first one's excess, so it is capped too
+    assert capped[0] == pytest.approx(0.25) and capped[1] == pytest.approx(0.25)
+    # The rest keep their relative sizes
+    assert capped[2] / capped[3] == pytest.approx(0.1 / 0.06)
+
+
+def test_cap_rises_to_one_over_n_when_names_cannot_fit():
+    dates = pd.Series(["d"] * 3)
+    capped = _cap(pd.Series([0.7, 0.2, 0.1]), dates, 0.25)
+    np.testing.assert_allclose(capped, [1 / 3] * 3)
+
+
+def test_cap_is_applied_per_date():
+    dates = pd.Series(["a", "a", "a", "a", "b", "b", "b", "b", "b"])
+    weights = pd.Series([0.7, 0.1, 0.1, 0.1, 0.2, 0.2, 0.2, 0.2, 0.2])
+    capped = _cap(weights, dates, 0.3)
+    np.testing.assert_allclose(capped.groupby(dates).sum(), [1.0, 1.0])
+    np.testing.assert_allclose(capped[:4], [0.3, 0.7 / 3, 0.7 / 3, 0.7 / 3])
+    np.testing.assert_allclose(capped[4:], [0.2] * 5)
+
+
+def test_inverse_volatility_fills_missing_with_date_median():
+    data = pd.DataFrame({"date": ["d"] * 3, "ticker": ["A", "B", "C"], "market_cap": [1.0, 1.0, 1.0],
+                         "close_price": [1.0, 1.0, 1.0], "volatility": [0.2, 0.4, np.nan]})
+    weights = get_strategy("Inverse Volatility").weigh(data)
+    np.testing.assert_allclose(weights, np.array([5, 2.5, 1 / 0.3]) / (5 + 2.5 + 1 / 0.3))
+
+
+def test_float_adjusted_falls_back_to_market_cap():
+    data = pd.DataFrame({"date": ["d", "d"], "ticker": ["A", "B"], "market_cap": [100.0, 300.0],
+                         "close_price": [10.0, 10.0], "weighted_shares_outstanding": [10.0, np.nan]})
+    np.testing.assert_allclose(get_strategy("Float-Adjusted").weigh(data), [0.25, 0.75])
+
+
+def test_registry_lookup():
+    assert "Inverse Volatility" in STRATEGIES
+    assert required_columns(["Equal Weighted", "Float-Adjusted", "Inverse Volatility"]) == (
+        "weighted_shares_outstanding", "volatility"
+    )
+    with pytest.raises(ValueError):
+        get_strategy("Nope")